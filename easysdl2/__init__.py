@@ -6,12 +6,28 @@ Note:
     このパッケージを利用したスクリプトを実行するには、
     SDL2の動作に必要なライブラリのインストールが必要です。
 """
+from . import animation
+from . import async_loop
+from . import atlas_compiler
+from . import camera
 from . import draw
 from . import fps
+from . import pipeline
+from . import profiler
+from . import render_queue
+from . import runner
+from . import texture_cache
+from . import texture_state
+from . import vsync
+from .camera import Camera
 from .font import *
 from .functions import *
 from .joystick import *
+from .layer import *
 from .music import *
 from .sound import *
 from .texture import *
 from .sprite_sheet import *
+from .tilemap import *
+from . import loader  # 各クラスを使うので最後に読み込む
+from . import texture_packer  # SpriteSheetを使うので最後に読み込む
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+コンパイル済みのテクスチャアトラス、スプライトシートのバイナリファイルを読み書きする内部モジュール
+
+Note:
+    ファイルの構成(リトルエンディアン):
+        ヘッダ: HEADERの形式
+        フレームテーブル: _frame_table.FrameDataの配列(メモリ上と同じ配置)
+        名前のオフセット: uint32 * (フレーム数 + 1)
+        名前: utf-8の文字列を連結したもの
+        名前のハッシュ表: uint32のハッシュ値 * スロット数、int32のフレーム番号(空きは-1) * スロット数
+        テクスチャ: 画像ファイルのパス(ファイルのディレクトリからの相対パス)を\\0で区切ったもの
+    読み込みはmmapしたメモリをそのままフレームテーブルとハッシュ表として参照するので、
+    フレーム数に関係なくPythonでの処理はほぼ一定になる。
+"""
+
+import ctypes
+import mmap
+import os
+import struct
+import sys
+
+from . import _frame_table
+
+MAGIC = b"ESAT"
+VERSION = 1
+# magic, version, FrameDataのサイズ, フレーム数, テクスチャ数, ハッシュ表のスロット数,
+# フレームテーブル, 名前のオフセット, 名前, ハッシュ表, テクスチャの各オフセット
+HEADER = struct.Struct("<4sHHIIIIIIII")
+
+_FNV_OFFSET = 0x811c9dc5
+_FNV_PRIME = 0x01000193
+
+
+def name_hash(name):
+    """
+    名前のハッシュ値を求める(FNV-1a 32bit)
+
+    Args:
+        name (bytes): utf-8の名前
+    """
+    h = _FNV_OFFSET
+    for c in name:
+        h = ((h ^ c) * _FNV_PRIME) & 0xffffffff
+    return h
+
+
+def _align(offset, n=8):
+    return (offset + n - 1) // n * n
+
+
+class NameIndex:
+    """
+    名前からフレーム番号を引くハッシュ表
+
+    Note:
+        ファイルのハッシュ表を参照し、読み込んだあとに追加された名前は辞書に入れる。
+    """
+
+    def __init__(self, buffer, header):
+        magic, version, frame_size, count, texture_count, slots, \
+            frames_offset, names_offset, blob_offset, hash_offset, textures_offset = header
+        view = memoryview(buffer)
+        self.__count = count
+        self.__offsets = view[names_offset:names_offset + 4 * (count + 1)].cast("I")
+        self.__blob = view[blob_offset:hash_offset]
+        self.__hashes = view[hash_offset:hash_offset + 4 * slots].cast("I")
+        self.__indices = view[hash_offset + 4 * slots:hash_offset + 8 * slots].cast("i")
+        self.__mask = slots - 1
+        self.__added = {}
+
+    def __name(self, index):
+        return bytes(self.__blob[self.__offsets[index]:self.__offsets[index + 1]])
+
+    def find(self, name):
+        """
+        名前からフレーム番号を引く
+
+        Returns:
+            int: フレーム番号。見つからなければ-1
+        """
+        index = self.__added.get(name)
+        if index is not None:
+            return index
+        key = name.encode("utf-8")
+        h = name_hash(key)
+        slot = h & self.__mask
+        for _ in range(self.__mask + 1):
+            index = self.__indices[slot]
+            if index < 0:
+                return -1
+            if self.__hashes[slot] == h and self.__name(index) == key:
+                return index
+            slot = (slot + 1) & self.__mask
+        return -1
+
+    def get_name(self, index):
+        """
+        フレーム番号から名前を取得する
+        """
+        if index < self.__count:
+            return self.__name(index).decode("utf-8")
+        for name, i in self.__added.items():
+            if i == index:
+                return name
+        return ""
+
+    def add(self, name, index):
+        """
+        読み込んだあとに追加されたフレームの名前を登録する
+        """
+        if self.find(name) < 0:
+            self.__added[name] = index
+
+
+def write(filename, table, names, texture_files):
+    """
+    フレームテーブルと名前をバイナリファイルに書き出す
+
+    Args:
+        filename (str): 出力するファイルのパス
+        table (FrameTable): フレームテーブル
+        names (list): フレームの名前のリスト(テーブルと同じ順)
+        texture_files (list): 画像ファイルのパスのリスト(texture_indexの順)
+    """
+    count = len(table)
+    frame_size = ctypes.sizeof(_frame_table.FrameData)
+    frames = table.to_bytes()
+
+    encoded = [name.encode("utf-8") for name in names]
+    offsets = [0]
+    for key in encoded:
+        offsets.append(offsets[-1] + len(key))
+    blob = b"".join(encoded)
+
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    hashes = [0] * slots
+    indices = [-1] * slots
+    for i, key in enumerate(encoded):
+        h = name_hash(key)
+        slot = h & (slots - 1)
+        while indices[slot] >= 0:
+            if hashes[slot] == h and encoded[indices[slot]] == key:
+                break  # 同じ名前は最初のフレームを使う(get_indexと同じ)
+            slot = (slot + 1) & (slots - 1)
+        else:
+            hashes[slot] = h
+            indices[slot] = i
+
+    base = os.path.dirname(os.path.abspath(filename))
+    textures = "\0".join(os.path.relpath(os.path.abspath(fn), base) for fn in texture_files).encode("utf-8")
+
+    frames_offset = _align(HEADER.size)
+    names_offset = _align(frames_offset + len(frames))
+    blob_offset = names_offset + 4 * (count + 1)
+    hash_offset = _align(blob_offset + len(blob))
+    textures_offset = hash_offset + 8 * slots
+    header = HEADER.pack(MAGIC, VERSION, frame_size, count, len(texture_files), slots,
+                         frames_offset, names_offset, blob_offset, hash_offset, textures_offset)
+
+    with open(filename, "wb") as fo:
+        fo.write(header)
+        fo.write(b"\0" * (frames_offset - HEADER.size))
+        fo.write(frames)
+        fo.write(b"\0" * (names_offset - frames_offset - len(frames)))
+        fo.write(struct.pack("<{}I".format(count + 1), *offsets))
+        fo.write(blob)
+        fo.write(b"\0" * (hash_offset - blob_offset - len(blob)))
+        fo.write(struct.pack("<{}I".format(slots), *hashes))
+        fo.write(struct.pack("<{}i".format(slots), *indices))
+        fo.write(textures)
+
+
+def is_compiled(filename):
+    """
+    コンパイル済みのファイルか調べる
+    """
+    try:
+        with open(filename, "rb") as fi:
+            return fi.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def read(filename):
+    """
+    コンパイル済みのファイルを読み込む
+
+    Returns:
+        tuple: (mmapしたバッファ, ヘッダ, NameIndex, 画像ファイルのパスのリスト)
+
+    Raises:
+        ValueError: 形式が違う
+    """
+    if sys.byteorder != "little":
+        raise ValueError("compiled atlas requires a little endian machine")
+    with open(filename, "rb") as fi:
+        # ACCESS_COPYならctypesの配列としてコピーせずに参照できる(書き込んでもファイルは変わらない)
+        buffer = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(buffer) < HEADER.size:
+        raise ValueError("file is too small")
+    header = HEADER.unpack_from(buffer, 0)
+    magic, version, frame_size, count, texture_count, slots, \
+        frames_offset, names_offset, blob_offset, hash_offset, textures_offset = header
+    if magic != MAGIC or version != VERSION or frame_size != ctypes.sizeof(_frame_table.FrameData):
+        raise ValueError("unsupported format")
+    # 空きスロットがないと見つからない名前の探索が終わらないので、スロット数はフレーム数より多くなければならない
+    if textures_offset > len(buffer) or slots & (slots - 1) or slots <= count:
+        raise ValueError("broken file")
+    base = os.path.dirname(filename)
+    textures = buffer[textures_offset:].decode("utf-8")
+    texture_files = [os.path.join(base, fn) for fn in textures.split("\0")] if texture_count > 0 else []
+    if len(texture_files) != texture_count:
+        raise ValueError("broken file")
+    return buffer, header, NameIndex(buffer, header), texture_files
+
+
+def frames_offset(header):
+    """
+    ヘッダからフレームテーブルの位置とフレーム数を取得する
+
+    Returns:
+        tuple (int, int): (オフセット, フレーム数)
+    """
+    return header[6], header[3]
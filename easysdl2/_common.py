@@ -12,11 +12,24 @@ DEFAULT_NUM_CHANNEL = 10  # 効果音再生時のデフォルトのチャンネ
 
 # 初期化フラグ
 sdl_init_flags = SDL_INIT_EVERYTHING
+headless_init_flags = SDL_INIT_VIDEO | SDL_INIT_AUDIO | SDL_INIT_TIMER | SDL_INIT_EVENTS  # ヘッドレスモードで初期化するもの
+headless = False  # ヘッドレスモード(init(headless=True)で設定する)
 
 # メインウィンドウの描画に関係するもの
 main_window = None
 main_window_renderer = None
 current_renderer = None  # 描画に使用するレンダラ
+render_queue_enabled = False  # 遅延描画モード(render_queue.enable()で設定する)
+profiler_enabled = False  # フレームの計測(profiler.enable()で設定する)
+camera = None  # 描画に使うカメラ(camera.set_camera()で設定する)
+
+# バックグラウンド読み込み(loaderモジュールが読み込み中だけ設定する)
+loader_update = None
+loader_shutdown = None
+
+# 更新と描画を別のスレッドで行うループ(pipelineモジュールがループ中だけ設定する)
+pipeline_thread = None  # 描画を行うメインスレッドのident
+pipeline_tasks = []  # ワーカーから頼まれた、メインスレッドでワーカーが止まっている間に行う処理
 
 # イベント処理系
 event_hooker = None  # SDL_Eventを独自処理するためのフック関数
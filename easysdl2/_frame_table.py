@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+TextureAtlas、SpriteSheetのフレーム情報をctypesの構造体の配列にまとめて持つための内部モジュール
+
+Note:
+    描画のたびにRectからSDL_Rectを作ったり、pivotの計算をしたりしないように、
+    フレームを追加した時点で描画に必要な値を計算して連続したメモリに格納しておく。
+    numpyがあればバッチ描画用に同じメモリをnumpyの配列として参照する。
+"""
+
+import ctypes
+
+from sdl2 import *
+
+from . import _geometry
+
+
+class FrameData(ctypes.Structure):
+    """
+    1フレーム分の描画情報
+
+    Note:
+        src: テクスチャ内での切り取り範囲(rotatedなら幅と高さが入れ替わった範囲)
+        w, h: 表示サイズ(回転前のフレームのサイズ)
+        pivot_x, pivot_y: pivotの位置(0.0〜1.0)
+        offset_x, offset_y: 表示範囲の左上からpivotまでのピクセル数
+        rotated: テクスチャ内で時計回りに90度回転して格納されているか
+        texture_index: テクスチャ番号(SpriteSheet用)
+    """
+    _fields_ = [("src", SDL_Rect),
+                ("w", ctypes.c_int),
+                ("h", ctypes.c_int),
+                ("pivot_x", ctypes.c_float),
+                ("pivot_y", ctypes.c_float),
+                ("offset_x", ctypes.c_float),
+                ("offset_y", ctypes.c_float),
+                ("rotated", ctypes.c_int),
+                ("texture_index", ctypes.c_int)]
+
+
+class FrameTable:
+    """
+    FrameDataの配列。追加されると容量を倍々で増やす
+    """
+
+    def __init__(self):
+        self.__array = (FrameData * 0)()
+        self.__count = 0
+        self.__columns = None
+        self.__extent = None
+        self.__buffer = None  # map_buffer()で参照しているバッファ
+        # 描画時に使い回す構造体
+        self.__dstrect = SDL_Rect()
+        self.__center = SDL_Point()
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, index):
+        """
+        フレームを取得する
+
+        Note:
+            返り値は配列のメモリを直接参照するので、テーブルに追加したあとは使わないこと。
+        """
+        if index < 0 or index >= self.__count:
+            raise IndexError("frame index out of range")
+        return self.__array[index]
+
+    def clear(self):
+        """
+        すべてのフレームを削除する
+        """
+        self.__array = (FrameData * 0)()
+        self.__count = 0
+        self.__columns = None
+        self.__extent = None
+        self.__buffer = None
+
+    def map_buffer(self, buffer, offset, count):
+        """
+        バッファ(mmapなど)のメモリをコピーせずにフレームの配列として参照する
+
+        Note:
+            コンパイル済みのアトラスの読み込み用。バッファは書き込み可能であること。
+            参照している間はバッファを保持しておく。あとでappend()すると配列はコピーされる。
+
+        Args:
+            buffer: FrameDataの配列が格納されたバッファ
+            offset (int): 配列の先頭のバイト位置
+            count (int): フレーム数
+        """
+        self.__array = (FrameData * count).from_buffer(buffer, offset)
+        self.__count = count
+        self.__columns = None
+        self.__extent = None
+        self.__buffer = buffer
+
+    def to_bytes(self):
+        """
+        フレームの配列のメモリをそのままバイト列にする(コンパイル用)
+
+        Returns:
+            bytes: FrameData * フレーム数のバイト列
+        """
+        return ctypes.string_at(self.__array, ctypes.sizeof(FrameData) * self.__count)
+
+    def reserve(self, capacity):
+        """
+        容量を確保する
+
+        Args:
+            capacity (int): フレーム数
+        """
+        if capacity <= len(self.__array):
+            return
+        array = (FrameData * capacity)()
+        ctypes.memmove(array, self.__array, ctypes.sizeof(FrameData) * self.__count)
+        self.__array = array
+        self.__buffer = None
+
+    def append(self, x, y, w, h, pivot_x=0.5, pivot_y=0.5, rotated=False, texture_index=0):
+        """
+        フレームを追加する
+
+        Args:
+            x, y, w, h (int): 回転前のフレームのテクスチャ内での位置とサイズ
+            pivot_x, pivot_y (float): pivotの位置(0.0〜1.0)
+            rotated (bool): テクスチャ内で時計回りに90度回転して格納されているか
+            texture_index (int): テクスチャ番号
+
+        Returns:
+            int: 追加したフレームのインデックス
+        """
+        if self.__count >= len(self.__array):
+            self.reserve(max(16, len(self.__array) * 2))
+        fd = self.__array[self.__count]
+        if rotated:
+            fd.src.x, fd.src.y, fd.src.w, fd.src.h = int(x), int(y), int(h), int(w)
+        else:
+            fd.src.x, fd.src.y, fd.src.w, fd.src.h = int(x), int(y), int(w), int(h)
+        fd.w = int(w)
+        fd.h = int(h)
+        fd.pivot_x = pivot_x
+        fd.pivot_y = pivot_y
+        fd.offset_x = w * pivot_x
+        fd.offset_y = h * pivot_y
+        fd.rotated = 1 if rotated else 0
+        fd.texture_index = int(texture_index)
+        self.__count += 1
+        self.__columns = None
+        self.__extent = None
+        return self.__count - 1
+
+    def draw(self, renderer, texture, index, x, y):
+        """
+        フレームを描画する
+
+        Note:
+            指定座標はpivotの位置になる。
+            rotatedのフレームはSDL_RenderCopyExで-90度回転して描画する。
+
+        Args:
+            renderer (SDL_Renderer): 描画先のレンダラ
+            texture (SDL_Texture): フレームのテクスチャ
+            index (int): フレームのインデックス
+            x (int): X座標
+            y (int): Y座標
+
+        Returns:
+            int: SDL_RenderCopy(Ex)の戻り値
+        """
+        fd = self.__array[index]
+        dst = self.__dstrect
+        if fd.rotated:
+            # テクスチャ内の範囲でのpivotの位置
+            cx = fd.h - fd.offset_y
+            cy = fd.offset_x
+            dst.x = int(x - cx)
+            dst.y = int(y - cy)
+            dst.w = fd.src.w
+            dst.h = fd.src.h
+            center = self.__center
+            center.x = int(cx)
+            center.y = int(cy)
+            return SDL_RenderCopyEx(renderer, texture, fd.src, dst, -90, center, SDL_FLIP_NONE)
+        dst.x = int(x - fd.offset_x)
+        dst.y = int(y - fd.offset_y)
+        dst.w = fd.w
+        dst.h = fd.h
+        return SDL_RenderCopy(renderer, texture, fd.src, dst)
+
+    def draw_ex(self, renderer, texture, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False):
+        """
+        フレームを拡大縮小回転反転描画する
+
+        Note:
+            指定座標はpivotの位置になり、pivotを中心に回転する。
+
+        Args:
+            renderer (SDL_Renderer): 描画先のレンダラ
+            texture (SDL_Texture): フレームのテクスチャ
+            index (int): フレームのインデックス
+            x (int): X座標
+            y (int): Y座標
+            ex_x (float): X軸方向の拡大率
+            ex_y (float): Y軸方向の拡大率
+            angle (float): 回転量(度数法)
+            flip_h (bool): 左右反転フラグ
+            flip_v (bool): 上下反転フラグ
+
+        Returns:
+            int: SDL_RenderCopyExの戻り値
+        """
+        fd = self.__array[index]
+        dst = self.__dstrect
+        center = self.__center
+        if fd.rotated:
+            # テクスチャ内の範囲はフレームの縦横が入れ替わっているので、反転の向きも入れ替える
+            flip = 0
+            if flip_h:
+                flip |= SDL_FLIP_VERTICAL
+            if flip_v:
+                flip |= SDL_FLIP_HORIZONTAL
+            cx = (fd.h - fd.offset_y) * ex_y
+            cy = fd.offset_x * ex_x
+            dst.w = int(fd.src.w * ex_y)
+            dst.h = int(fd.src.h * ex_x)
+            angle -= 90
+        else:
+            flip = 0
+            if flip_h:
+                flip |= SDL_FLIP_HORIZONTAL
+            if flip_v:
+                flip |= SDL_FLIP_VERTICAL
+            cx = fd.offset_x * ex_x
+            cy = fd.offset_y * ex_y
+            dst.w = int(fd.w * ex_x)
+            dst.h = int(fd.h * ex_y)
+        dst.x = int(x - cx)
+        dst.y = int(y - cy)
+        center.x = int(cx)
+        center.y = int(cy)
+        return SDL_RenderCopyEx(renderer, texture, fd.src, dst, angle, center, flip)
+
+    def radius(self, index):
+        """
+        pivotからフレームの端までの距離の上限を求める(カメラのカリング用)
+
+        Args:
+            index (int): フレームのインデックス。Noneなら全フレームの最大値
+
+        Returns:
+            float: 距離(回転しても収まる大きさ)
+        """
+        if index is not None:
+            fd = self.__array[index]
+            return float(fd.w + fd.h)
+        if self.__extent is None:
+            frames = self.__array[:self.__count]
+            self.__extent = float(max(f.w for f in frames) + max(f.h for f in frames)) if frames else 0.0
+        return self.__extent
+
+    def quad(self, index, ex_x=1.0, ex_y=1.0):
+        """
+        フレームを四角形として描画するためのパラメータを求める(遅延描画用)
+
+        Returns:
+            tuple: _geometry.render_quadsに渡す(src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated)
+        """
+        fd = self.__array[index]
+        src = fd.src
+        return (src.x, src.y, src.w, src.h, fd.w * ex_x, fd.h * ex_y,
+                fd.offset_x * ex_x, fd.offset_y * ex_y, fd.rotated)
+
+    def columns(self):
+        """
+        バッチ描画用に列ごとの配列を取得する
+
+        Note:
+            numpyがあればテーブルのメモリをそのまま参照する配列になる(コピーしない)。
+            numpyがなければリストを作ってキャッシュしておく。
+
+        Returns:
+            dict: 列名(src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated, texture_index)をキーにした配列の辞書
+        """
+        if self.__columns is not None:
+            return self.__columns
+        if _geometry.np is not None:
+            if self.__count == 0:
+                arr = _geometry.np.zeros(0, dtype=_geometry.np.dtype(FrameData))
+            else:
+                arr = _geometry.np.ctypeslib.as_array(self.__array)[:self.__count]
+            src = arr["src"]
+            self.__columns = {"src_x": src["x"], "src_y": src["y"], "src_w": src["w"], "src_h": src["h"],
+                              "w": arr["w"], "h": arr["h"], "pivot_x": arr["pivot_x"], "pivot_y": arr["pivot_y"],
+                              "rotated": arr["rotated"], "texture_index": arr["texture_index"]}
+        else:
+            frames = self.__array[:self.__count]
+            self.__columns = {"src_x": [f.src.x for f in frames], "src_y": [f.src.y for f in frames],
+                              "src_w": [f.src.w for f in frames], "src_h": [f.src.h for f in frames],
+                              "w": [f.w for f in frames], "h": [f.h for f in frames],
+                              "pivot_x": [f.pivot_x for f in frames], "pivot_y": [f.pivot_y for f in frames],
+                              "rotated": [f.rotated for f in frames],
+                              "texture_index": [f.texture_index for f in frames]}
+        return self.__columns
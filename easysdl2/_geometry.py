@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+SDL_RenderGeometryを使ってスプライトをまとめて描画(バッチ描画)するための内部モジュール
+
+Note:
+    numpyがインストールされていれば頂点の計算をベクトル化する。
+    インストールされていなければpythonのループで頂点配列を組み立てる。
+    どちらの場合もSDLの呼び出しは1回になる。
+    頂点配列とインデックス配列は_scratchの配列を使い回す。
+"""
+
+import ctypes
+import math
+
+from sdl2 import *
+from sdl2 import dll
+
+from . import _scratch
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 四角形1つ分のインデックス(左上、右上、右下、左下の順の頂点で三角形2つ)
+QUAD_INDICES = (0, 1, 2, 0, 2, 3)
+# rotatedのフレーム用のインデックス
+# Note: ソフトウェアレンダラは軸に平行な四角形をSDL_RenderCopyに置き換えるが、
+#       UVが90度回転していると正しく描画されないので対角線を変えて置き換えを避ける
+ROTATED_QUAD_INDICES = (0, 1, 3, 1, 2, 3)
+
+# 四角形の頂点の順番とスプライト空間での位置(s, t)
+_CORNERS = ((0, 0), (1, 0), (1, 1), (0, 1))
+
+if np is not None:
+    # SDL_Vertexと同じメモリ配置のnumpyの構造体
+    VERTEX_DTYPE = np.dtype([("x", np.float32), ("y", np.float32),
+                             ("color", np.uint8, (4,)),
+                             ("u", np.float32), ("v", np.float32)])
+else:
+    VERTEX_DTYPE = None
+
+
+def is_available():
+    """
+    SDL_RenderGeometryが使えるかどうか
+
+    Returns:
+        bool: True:使える(SDL 2.0.18以降) False:使えない
+    """
+    return dll.version >= 2018
+
+
+def is_sequence(value):
+    """
+    インスタンスごとの値(配列)かどうかを調べる
+
+    Note:
+        文字列以外でlen()が使えるものを配列とみなす。
+        0次元のnumpy配列はスカラーとして扱う。
+    """
+    if isinstance(value, (str, bytes)):
+        return False
+    if np is not None and isinstance(value, np.ndarray):
+        return value.ndim > 0
+    return hasattr(value, "__len__")
+
+
+def count(*values):
+    """
+    インスタンス数を求める
+
+    Returns:
+        int: 最初に見つかった配列の長さ。配列がなければ1
+    """
+    for v in values:
+        if is_sequence(v):
+            return len(v)
+    return 1
+
+
+def multiply(a, b):
+    """
+    スカラーまたは配列どうしを要素ごとに掛ける
+
+    Returns:
+        スカラー、numpy配列(numpyがある場合)、またはリスト
+    """
+    if not is_sequence(a) and not is_sequence(b):
+        return a * b
+    if np is not None:
+        return np.multiply(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    n = count(a, b)
+    return [va * vb for va, vb in iterate(n, a, b)]
+
+
+def gather(column, index):
+    """
+    フレームテーブルの列からインデックスの配列に対応する値を取り出す
+    """
+    if not is_sequence(index):
+        return column[int(index)]
+    if np is not None:
+        return column[np.asarray(index, dtype=np.intp)]
+    return [column[int(i)] for i in index]
+
+
+def in_range(index, n):
+    """
+    インデックス(スカラーまたは配列)がすべて0以上n未満か調べる
+    """
+    if not is_sequence(index):
+        return 0 <= index < n
+    if len(index) == 0:
+        return True
+    if np is not None:
+        index = np.asarray(index)
+        return 0 <= index.min() and index.max() < n
+    return 0 <= min(index) and max(index) < n
+
+
+def select(value, sel):
+    """
+    インスタンスごとの値から一部を取り出す。スカラーはそのまま返す
+
+    Args:
+        value: スカラーまたは配列
+        sel: numpyならブール配列、そうでなければインデックスのリスト。Noneなら全部
+    """
+    if sel is None or not is_sequence(value):
+        return value
+    if np is not None:
+        return np.asarray(value)[sel]
+    return [value[i] for i in sel]
+
+
+def max_abs(value):
+    """
+    スカラーまたは配列の絶対値の最大値を求める(カリングの外接円の半径用)
+    """
+    if not is_sequence(value):
+        return abs(value)
+    if len(value) == 0:
+        return 0.0
+    if np is not None:
+        return float(np.abs(np.asarray(value)).max())
+    return max(abs(v) for v in value)
+
+
+def select_color(color, sel):
+    """
+    色の指定から一部を取り出す。(red, green, blue)の1色指定ならそのまま返す
+    """
+    if color is None or not is_sequence(color[0]):
+        return color
+    return select(color, sel)
+
+
+def split_by(keys):
+    """
+    キー(テクスチャ番号など)ごとにインスタンスを分ける
+
+    Returns:
+        list: (キー, select()に渡す選択子)のリスト
+    """
+    if not is_sequence(keys):
+        return [(int(keys), None)]
+    if np is not None:
+        keys = np.asarray(keys)
+        return [(int(k), keys == k) for k in np.unique(keys)]
+    groups = {}
+    for i, k in enumerate(keys):
+        groups.setdefault(int(k), []).append(i)
+    return sorted(groups.items())
+
+
+def iterate(n, *values):
+    """
+    スカラーと配列が混在する引数をインスタンスごとのタプルにして返す
+
+    Note:
+        numpyがない場合や、SDL_RenderGeometryが使えない場合のループで使う。
+    """
+    seqs = [v if is_sequence(v) else None for v in values]
+    for i in range(n):
+        yield tuple(v[i] if s is not None else v for v, s in zip(values, seqs))
+
+
+def _fill_indices(indices, pattern):
+    """
+    インデックス配列に入るだけの四角形のインデックスを書き込む
+    """
+    n = len(indices) // 6
+    if np is not None:
+        base = np.arange(n, dtype=np.int32)[:, None] * 4
+        np.frombuffer(indices, dtype=np.int32, count=n * 6).reshape(n, 6)[:] = \
+            base + np.array(pattern, dtype=np.int32)
+        return
+    for i in range(n):
+        b = i * 4
+        j = i * 6
+        for k in range(6):
+            indices[j + k] = b + pattern[k]
+
+
+def _fill_quad_indices(indices):
+    _fill_indices(indices, QUAD_INDICES)
+
+
+def _fill_rotated_quad_indices(indices):
+    _fill_indices(indices, ROTATED_QUAD_INDICES)
+
+
+def quad_indices(renderer, n, rotated=False):
+    """
+    四角形n個分のインデックス配列を取得する
+
+    Note:
+        rotatedがスカラーなら、レンダラごとに作っておいた配列をそのまま使う
+        (四角形n個分のインデックスは、それより多い四角形のインデックスの先頭と同じ)。
+
+    Args:
+        renderer (SDL_Renderer): 描画に使うレンダラ
+        n (int): 四角形の数
+        rotated (bool or array): rotatedのフレームかどうか(ROTATED_QUAD_INDICESを使う)
+
+    Returns:
+        ctypes.Array: c_intの配列(長さはn * 6以上)
+    """
+    if not is_sequence(rotated):
+        if rotated:
+            return _scratch.get(renderer, ctypes.c_int, n * 6, "rotated_quads", _fill_rotated_quad_indices)
+        return _scratch.get(renderer, ctypes.c_int, n * 6, "quads", _fill_quad_indices)
+    indices = _scratch.get(renderer, ctypes.c_int, n * 6)
+    if np is not None:
+        base = np.arange(n, dtype=np.int32)[:, None] * 4
+        pattern = np.where(np.asarray(rotated, dtype=bool)[..., None],
+                           np.array(ROTATED_QUAD_INDICES, dtype=np.int32),
+                           np.array(QUAD_INDICES, dtype=np.int32))
+        np.frombuffer(indices, dtype=np.int32, count=n * 6).reshape(n, 6)[:] = base + pattern
+        return indices
+    for i, (rot,) in enumerate(iterate(n, rotated)):
+        pattern = ROTATED_QUAD_INDICES if rot else QUAD_INDICES
+        b = i * 4
+        j = i * 6
+        for k in range(6):
+            indices[j + k] = b + pattern[k]
+    return indices
+
+
+def _colors_np(n, color, alpha, mod):
+    """
+    頂点色の配列(n, 4)を求める。テクスチャのカラーモッドも乗算する
+    """
+    cols = np.empty((n, 4), dtype=np.uint16)
+    if color is None:
+        cols[:, :3] = 255
+    else:
+        c = np.asarray(color, dtype=np.uint16)
+        cols[:, :3] = c[..., :3]
+    cols[:, 3] = 255 if alpha is None else np.asarray(alpha, dtype=np.uint16)
+    cols *= np.asarray(mod, dtype=np.uint16)
+    cols //= 255
+    return cols.astype(np.uint8)
+
+
+def build_quads_np(vertices, n, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                   angle, flip_h, flip_v, rotated, color, alpha, mod):
+    """
+    四角形n個分の頂点をnumpyで頂点配列に書き込む
+
+    Args:
+        vertices (ctypes.Array): 書き込むSDL_Vertexの配列(長さn * 4以上)
+    """
+    f = np.float64
+    x = np.asarray(x, dtype=f)
+    y = np.asarray(y, dtype=f)
+    w = np.asarray(w, dtype=f)
+    h = np.asarray(h, dtype=f)
+    pivot_x = np.asarray(pivot_x, dtype=f)
+    pivot_y = np.asarray(pivot_y, dtype=f)
+    rad = np.radians(np.asarray(angle, dtype=f))
+    cos = np.cos(rad)
+    sin = np.sin(rad)
+    u0 = np.asarray(src_x, dtype=f) / tex_w
+    v0 = np.asarray(src_y, dtype=f) / tex_h
+    uw = np.asarray(src_w, dtype=f) / tex_w
+    vh = np.asarray(src_h, dtype=f) / tex_h
+    flip_h = np.asarray(flip_h, dtype=bool)
+    flip_v = np.asarray(flip_v, dtype=bool)
+    rotated = np.asarray(rotated, dtype=bool)
+
+    vertices = np.frombuffer(vertices, dtype=VERTEX_DTYPE, count=n * 4).reshape(n, 4)
+    for k, (cs, ct) in enumerate(_CORNERS):
+        lx = cs * w - pivot_x
+        ly = ct * h - pivot_y
+        vertices["x"][:, k] = x + lx * cos - ly * sin
+        vertices["y"][:, k] = y + lx * sin + ly * cos
+        s = np.where(flip_h, 1 - cs, cs)
+        t = np.where(flip_v, 1 - ct, ct)
+        # rotatedのフレームはテクスチャ内で時計回りに90度回転して格納されている
+        vertices["u"][:, k] = u0 + np.where(rotated, 1 - t, s) * uw
+        vertices["v"][:, k] = v0 + np.where(rotated, s, t) * vh
+    vertices["color"] = _colors_np(n, color, alpha, mod)[:, None, :]
+
+
+def build_quads_py(vertices, n, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                   angle, flip_h, flip_v, rotated, color, alpha, mod):
+    """
+    四角形n個分の頂点をpythonのループで頂点配列に書き込む(numpyがない場合)
+
+    Args:
+        vertices (ctypes.Array): 書き込むSDL_Vertexの配列(長さn * 4以上)
+    """
+    mr, mg, mb, ma = mod
+    if color is not None and not is_sequence(color[0]):
+        color = (color,)
+        color_seq = False
+    else:
+        color_seq = True
+    args = iterate(n, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                   angle, flip_h, flip_v, rotated, alpha)
+    for i, (px, py, sx, sy, sw, sh, dw, dh, pvx, pvy, deg, fh, fv, rot, a) in enumerate(args):
+        rad = math.radians(deg)
+        cos = math.cos(rad)
+        sin = math.sin(rad)
+        u0 = sx / tex_w
+        v0 = sy / tex_h
+        uw = sw / tex_w
+        vh = sh / tex_h
+        if color is None:
+            r = g = b = 255
+        else:
+            r, g, b = color[i if color_seq else 0][:3]
+        if a is None:
+            a = 255
+        col = SDL_Color(int(r) * mr // 255, int(g) * mg // 255, int(b) * mb // 255, int(a) * ma // 255)
+        j = i * 4
+        for k, (cs, ct) in enumerate(_CORNERS):
+            lx = cs * dw - pvx
+            ly = ct * dh - pvy
+            s = 1 - cs if fh else cs
+            t = 1 - ct if fv else ct
+            v = vertices[j + k]
+            v.position.x = px + lx * cos - ly * sin
+            v.position.y = py + lx * sin + ly * cos
+            v.color = col
+            if rot:
+                v.tex_coord.x = u0 + (1 - t) * uw
+                v.tex_coord.y = v0 + s * vh
+            else:
+                v.tex_coord.x = u0 + s * uw
+                v.tex_coord.y = v0 + t * vh
+
+
+def render_quads(renderer, texture, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                 angle=0.0, flip_h=False, flip_v=False, rotated=False, color=None, alpha=None,
+                 mod=(255, 255, 255, 255)):
+    """
+    テクスチャを切り取った四角形を複数まとめて1回のSDL_RenderGeometryで描画する
+
+    Note:
+        引数はスカラー(全インスタンス共通)かインスタンスごとの配列のどちらでもよい。
+        座標(x, y)はpivotの位置になり、回転もpivotを中心に行う。
+        SDL_RenderGeometryはテクスチャのカラーモッド、アルファモッドを無視するので、
+        modを頂点色に乗算してSDL_RenderCopyと同じ見た目にする。
+
+    Args:
+        renderer (SDL_Renderer): 描画先のレンダラ
+        texture (SDL_Texture): 描画するテクスチャ
+        tex_w (int): テクスチャの幅
+        tex_h (int): テクスチャの高さ
+        x, y (float): 描画位置(pivotの位置)
+        src_x, src_y, src_w, src_h (int): 切り取る範囲(rotatedならテクスチャ内での範囲)
+        w, h (float): 描画サイズ(拡大率適用後)
+        pivot_x, pivot_y (float): 描画範囲の左上からpivotまでのピクセル数
+        angle (float): 回転量(度数法)
+        flip_h (bool): 左右反転フラグ
+        flip_v (bool): 上下反転フラグ
+        rotated (bool): テクスチャ内で時計回りに90度回転して格納されているフレームか
+        color (tuple): 乗算する色(red, green, blue)、またはその配列
+        alpha (int): 不透明度(0〜255)、またはその配列
+        mod (tuple): テクスチャのカラーモッドとアルファモッド(red, green, blue, alpha)
+
+    Returns:
+        int: SDL_RenderGeometryの戻り値(0:成功 負:失敗)
+    """
+    n = count(x, y, angle, w, h, src_x)
+    if n == 0:
+        return 0
+    vertices = _scratch.get(renderer, SDL_Vertex, n * 4)
+    build = build_quads_np if np is not None else build_quads_py
+    build(vertices, n, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+          angle, flip_h, flip_v, rotated, color, alpha, mod)
+    indices = quad_indices(renderer, n, rotated)
+    return SDL_RenderGeometry(renderer, texture, vertices, n * 4, indices, n * 6)
+
+
+def draw_each(draw_ex, set_mod, mod, values, color=None, alpha=None):
+    """
+    SDL_RenderGeometryが使えない場合に1つずつ描画する
+
+    Note:
+        colorやalphaが指定された場合は描画ごとにset_modでモッドを変更し、最後に元に戻す。
+
+    Args:
+        draw_ex (function): 1つ分を描画する関数
+        set_mod (function): (red, green, blue, alpha)を受け取ってモッドを設定する関数
+        mod (tuple): 元のモッド(red, green, blue, alpha)
+        values (tuple): draw_exに渡す引数(スカラーまたは配列)のタプル
+        color (tuple or array): 乗算する色
+        alpha (int or array): 不透明度
+
+    Returns:
+        bool: True
+    """
+    n = count(*values)
+    per_color = color is not None or alpha is not None
+    if color is not None and not is_sequence(color[0]):
+        color = [color] * n
+    mr, mg, mb, ma = mod
+    for i, args in enumerate(iterate(n, *values, alpha)):
+        if per_color:
+            r, g, b = color[i][:3] if color is not None else (255, 255, 255)
+            a = args[-1]
+            a = 255 if a is None else a
+            set_mod(int(r) * mr // 255, int(g) * mg // 255, int(b) * mb // 255, int(a) * ma // 255)
+        draw_ex(*args[:-1])
+    if per_color:
+        set_mod(mr, mg, mb, ma)
+    return True
+
+
+def frame_quads(table, index, ex_x=1.0, ex_y=1.0):
+    """
+    フレームテーブルのインデックスから四角形のパラメータを求める
+
+    Note:
+        tableは_frame_table.FrameTable.columns()で取得した列ごとの配列の辞書。
+
+    Returns:
+        tuple: render_quadsに渡す(src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated)
+    """
+    w = multiply(gather(table["w"], index), ex_x)
+    h = multiply(gather(table["h"], index), ex_y)
+    return (gather(table["src_x"], index), gather(table["src_y"], index),
+            gather(table["src_w"], index), gather(table["src_h"], index),
+            w, h, multiply(gather(table["pivot_x"], index), w), multiply(gather(table["pivot_y"], index), h),
+            gather(table["rotated"], index))
+
+
+def render_frames(renderer, texture, tex_w, tex_h, table, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0,
+                  flip_h=False, flip_v=False, color=None, alpha=None, mod=(255, 255, 255, 255)):
+    """
+    フレームテーブルのインデックスを指定して複数まとめて描画する
+
+    Note:
+        座標(x, y)はフレームのpivotの位置になる。
+        同じテクスチャのフレームしか描画できない。
+
+    Returns:
+        int: SDL_RenderGeometryの戻り値(0:成功 負:失敗)
+    """
+    src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated = frame_quads(table, index, ex_x, ex_y)
+    return render_quads(renderer, texture, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h,
+                        pivot_x, pivot_y, angle, flip_h, flip_v, rotated, color, alpha, mod)
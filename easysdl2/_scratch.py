@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+SDLの描画関数に渡す配列を使い回すための内部モジュール
+
+Note:
+    SDL_Point、SDL_FPoint、SDL_Rect、SDL_FRect、SDL_Vertex、頂点インデックス(c_int)などの配列を
+    レンダラごと、用途ごとに1つずつ持ち、足りなくなったら2倍ずつ大きくする。小さくするのはshrink()を呼んだときだけ。
+    毎フレーム同じくらいの数を描画していれば、配列(ctypesの配列の型とバッファ)を新しく作らない。
+    drawモジュールの図形と、_geometryのバッチ描画(Texture.draw_batch、TextureAtlas、SpriteSheet、
+    遅延描画モードのまとめた描画)が同じ配列を使う。
+
+    get()で取得した配列は同じレンダラ、同じ用途で次にget()を呼ぶまでしか使えない。
+    SDLの関数に渡したらすぐに使い終えること(遅延描画モードで命令として記録するものには使わない)。
+    メインスレッド(描画するスレッド)からだけ使う。
+"""
+
+import ctypes
+
+MIN_CAPACITY = 64  # 最初に確保する要素数
+
+_pools = {}  # レンダラのキー -> {(型, 用途): 配列}
+_allocations = 0  # 配列を確保した回数の合計
+
+
+def _key(renderer):
+    return ctypes.cast(renderer, ctypes.c_void_p).value or 0
+
+
+def get(renderer, item_type, length, name=None, fill=None):
+    """
+    length個以上の要素を持つ配列を取得する
+
+    Note:
+        配列の長さはlengthより大きいことがあるので、SDLの関数には要素数を別に渡す。
+        前回の中身は残っている(大きくしたときは消える)。
+
+    Args:
+        renderer (SDL_Renderer): 描画に使うレンダラ
+        item_type (type): 要素の型(SDL_Point、SDL_Vertex、ctypes.c_intなど)
+        length (int): 必要な要素数
+        name (str): 同じ型の配列を別々に持ちたいときの用途の名前
+        fill (function): 配列を確保したときに中身を書き込む関数。fill(配列)の形。中身も使い回す配列用
+
+    Returns:
+        ctypes.Array: item_typeの配列
+    """
+    global _allocations
+    pool = _pools.get(_key(renderer))
+    if pool is None:
+        pool = _pools[_key(renderer)] = {}
+    buf = pool.get((item_type, name))
+    if buf is not None and len(buf) >= length:
+        return buf
+    capacity = max(length, MIN_CAPACITY, len(buf) * 2 if buf is not None else 0)
+    buf = (item_type * capacity)()
+    pool[(item_type, name)] = buf
+    _allocations += 1
+    if fill is not None:
+        fill(buf)
+    return buf
+
+
+def shrink(renderer=None):
+    """
+    配列を開放する
+
+    Args:
+        renderer (SDL_Renderer): このレンダラの配列を開放する。Noneなら全部
+    """
+    if renderer is None:
+        _pools.clear()
+    else:
+        _pools.pop(_key(renderer), None)
+
+
+def get_stats():
+    """
+    配列の確保の状況を取得する
+
+    Returns:
+        dict: allocations(確保した回数の合計), buffers(今持っている配列の数), bytes(今持っている配列の合計サイズ)
+    """
+    buffers = [buf for pool in _pools.values() for buf in pool.values()]
+    return {
+        "allocations": _allocations,
+        "buffers": len(buffers),
+        "bytes": sum(ctypes.sizeof(buf) for buf in buffers),
+    }
@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""
+TextureAtlas、SpriteSheetのフレームを切り替えるアニメーション
+
+Note:
+    AnimationClipはフレームのインデックスの並びと各フレームの表示時間。
+    名前はロード時に一度だけインデックスに変換するので、描画のたびにget_index()を呼ばなくてよい。
+    Animatorは多数のアニメーションの再生状態を配列で持ち、update()で全部の時間をまとめて進めて、
+    現在のフレームのインデックスの配列を求める(numpyがあれば1回の配列演算で済む)。
+    求めたインデックスはそのままdraw_batch()に渡せる。
+
+    例:
+        clips = animation.clips_from_atlas(atlas, 0.1)  # "walk0", "walk1", ... -> clips["walk"]
+        animator = animation.Animator()
+        ids = [animator.add(clips["walk"], time=random.random()) for i in range(1000)]
+        while process_events():
+            animator.update()
+            animator.draw(atlas, xs, ys)
+"""
+
+import bisect
+import re
+from array import array
+
+from sdl2 import *
+
+from . import _geometry
+from . import log
+
+_NAME_PATTERN = re.compile(r"^(.*?)(\d+)(\.\w+)?$")
+
+
+class AnimationClip:
+    """
+    アニメーション1つ分のフレームの並び
+    """
+
+    def __init__(self, frames, duration=0.1, loop=True, name=""):
+        """
+        コンストラクタ
+
+        Args:
+            frames (list): TextureAtlas、SpriteSheetのインデックスのリスト
+            duration (float or list): 1フレームの表示時間(秒)。リストならフレームごとの表示時間
+            loop (bool): 最後のフレームの後に最初に戻るか
+            name (str): 名前
+        """
+        self.__frames = array("i", frames)
+        if hasattr(duration, "__len__"):
+            durations = [float(d) for d in duration]
+        else:
+            durations = [float(duration)] * len(self.__frames)
+        if len(durations) != len(self.__frames):
+            log.error_log("size mismatch", "__init__", "AnimationClip", name)
+            durations = (durations + [0.1] * len(self.__frames))[:len(self.__frames)]
+        # 各フレームの終了時刻
+        self.__ends = array("d")
+        t = 0.0
+        for d in durations:
+            t += max(d, 0.0)
+            self.__ends.append(t)
+        self.__loop = bool(loop)
+        self.__name = name
+
+    @classmethod
+    def from_names(cls, atlas, names, duration=0.1, loop=True, name=""):
+        """
+        フレームの名前のリストからクリップを作る
+
+        Args:
+            atlas (TextureAtlas or SpriteSheet): フレームを持っているアトラス
+            names (list): フレームの名前(get_index()に渡す名前)のリスト
+            duration (float or list): 1フレームの表示時間(秒)
+            loop (bool): ループするか
+            name (str): クリップの名前
+
+        Returns:
+            AnimationClip: クリップ。見つからない名前があればNone
+        """
+        frames = []
+        for frame_name in names:
+            index = atlas.get_index(frame_name)
+            if index < 0:
+                log.error_log("frame not found", "from_names", "AnimationClip", frame_name)
+                return None
+            frames.append(index)
+        return cls(frames, duration, loop, name)
+
+    def get_name(self):
+        """
+        名前を取得する
+
+        Returns:
+            str: 名前
+        """
+        return self.__name
+
+    def get_frames(self):
+        """
+        フレームのインデックスの配列を取得する
+
+        Returns:
+            array: インデックスの配列
+        """
+        return self.__frames
+
+    def get_ends(self):
+        """
+        各フレームの終了時刻の配列を取得する
+
+        Returns:
+            array: 秒の配列
+        """
+        return self.__ends
+
+    def get_length(self):
+        """
+        1回分の再生時間を取得する
+
+        Returns:
+            float: 秒
+        """
+        return self.__ends[-1] if self.__ends else 0.0
+
+    def is_loop(self):
+        """
+        ループするか調べる
+
+        Returns:
+            bool: True:ループする False:最後のフレームで止まる
+        """
+        return self.__loop
+
+    def get_frame(self, time):
+        """
+        再生時間からフレームのインデックスを求める
+
+        Args:
+            time (float): 再生開始からの時間(秒)
+
+        Returns:
+            int: インデックス。フレームがなければ-1
+        """
+        if not self.__frames:
+            return -1
+        length = self.get_length()
+        if length <= 0:
+            return self.__frames[0]
+        if self.__loop:
+            time %= length
+        i = bisect.bisect_right(self.__ends, time)
+        return self.__frames[min(i, len(self.__frames) - 1)]
+
+
+def clips_from_atlas(atlas, duration=0.1, loop=True):
+    """
+    フレームの名前の連番からクリップを作る
+
+    Note:
+        "walk0", "walk1", "walk_02.png"のように、名前の末尾(拡張子の前)が数字のフレームを、
+        数字を除いた部分(末尾の"_"、"-"、空白も除く)ごとにまとめて、数字の順に並べる。
+
+    Args:
+        atlas (TextureAtlas or SpriteSheet): アトラス
+        duration (float): 1フレームの表示時間(秒)
+        loop (bool): ループするか
+
+    Returns:
+        dict: クリップの名前 -> AnimationClip
+    """
+    groups = {}
+    for index, frame_name in enumerate(atlas._get_names()):
+        m = _NAME_PATTERN.match(frame_name)
+        if m is None:
+            continue
+        key = m.group(1).rstrip("_- ")
+        groups.setdefault(key, []).append((int(m.group(2)), index))
+    clips = {}
+    for key, frames in groups.items():
+        frames.sort()
+        clips[key] = AnimationClip([index for number, index in frames], duration, loop, key)
+    return clips
+
+
+class Animator:
+    """
+    多数のアニメーションの再生状態をまとめて進めるクラス
+
+    Note:
+        add()で追加すると番号(スロット)が返り、各配列のその位置が再生状態になる。
+        draw()のx、yなどの配列もスロットの番号の順に並べる。remove()したスロットは描画されず、次のadd()で再利用される。
+        全部のクリップを1本の時間軸に並べたテーブルを持ち、
+        update()では各スロットの時間をクリップの範囲に収めてからテーブルを二分探索してフレームを求める。
+    """
+
+    def __init__(self):
+        """
+        コンストラクタ
+        """
+        self.__clips = []  # 登録したクリップ
+        self.__clip_ids = {}  # id(クリップ) -> クリップ番号
+        self.__clip_columns = None  # クリップごとの(開始時刻, 長さ, ループ, 最初のフレーム位置, フレーム数)
+        self.__timeline_ends = None  # 全クリップのフレームの終了時刻(1本の時間軸)
+        self.__timeline_frames = None  # 全クリップのフレームのインデックス
+
+        self.__clip = array("i")  # スロットのクリップ番号(-1は空き)
+        self.__time = array("d")  # スロットの再生時間
+        self.__speed = array("d")  # スロットの再生速度
+        self.__indices = array("i")  # スロットの現在のフレームのインデックス
+        self.__finished = array("b")  # ループしないクリップが最後まで再生されたか
+        self.__free = []
+        self.__count = 0  # 使っているスロットの数
+        self.__prev_counter = 0
+
+    def __register(self, clip):
+        clip_id = self.__clip_ids.get(id(clip))
+        if clip_id is not None and self.__clips[clip_id] is clip:
+            return clip_id
+        clip_id = len(self.__clips)
+        self.__clips.append(clip)
+        self.__clip_ids[id(clip)] = clip_id
+        self.__timeline_ends = None
+        return clip_id
+
+    def __build_timeline(self):
+        """
+        全部のクリップのフレームを1本の時間軸に並べる
+        """
+        starts = []
+        lengths = []
+        loops = []
+        firsts = []
+        counts = []
+        ends = []
+        frames = []
+        t = 0.0
+        for clip in self.__clips:
+            length = clip.get_length()
+            starts.append(t)
+            lengths.append(length)
+            loops.append(1 if clip.is_loop() else 0)
+            firsts.append(len(frames))
+            counts.append(len(clip.get_frames()))
+            ends.extend(t + end for end in clip.get_ends())
+            frames.extend(clip.get_frames())
+            # 次のクリップと重ならないように間を空ける
+            t += length + 1.0
+        np = _geometry.np
+        if np is not None:
+            self.__clip_columns = (np.array(starts), np.array(lengths), np.array(loops, dtype=bool),
+                                   np.array(firsts, dtype=np.intp), np.array(counts, dtype=np.intp))
+            self.__timeline_ends = np.array(ends)
+            self.__timeline_frames = np.array(frames, dtype=np.int32)
+        else:
+            self.__clip_columns = (starts, lengths, loops, firsts, counts)
+            self.__timeline_ends = ends
+            self.__timeline_frames = frames
+
+    def add(self, clip, time=0.0, speed=1.0):
+        """
+        アニメーションを追加する
+
+        Args:
+            clip (AnimationClip): 再生するクリップ
+            time (float): 再生開始からの時間(秒)。ずらすと同じクリップでもばらばらに動く
+            speed (float): 再生速度(1.0で等速)
+
+        Returns:
+            int: スロットの番号。失敗時は-1
+        """
+        if not clip.get_frames():
+            log.error_log("empty clip", "add", "Animator", clip.get_name())
+            return -1
+        clip_id = self.__register(clip)
+        if self.__free:
+            slot = self.__free.pop()
+            self.__clip[slot] = clip_id
+            self.__time[slot] = time
+            self.__speed[slot] = speed
+            self.__finished[slot] = 0
+        else:
+            slot = len(self.__clip)
+            # 途中で失敗して列の長さがずれないように、フレームのインデックスから追加する
+            self.__indices.append(-1)
+            self.__clip.append(clip_id)
+            self.__time.append(time)
+            self.__speed.append(speed)
+            self.__finished.append(0)
+        self.__indices[slot] = clip.get_frame(time)
+        self.__count += 1
+        return slot
+
+    def remove(self, slot):
+        """
+        アニメーションを削除する
+
+        Args:
+            slot (int): スロットの番号
+        """
+        if slot < 0 or slot >= len(self.__clip) or self.__clip[slot] < 0:
+            log.error_log("invalid slot", "remove", "Animator")
+            return
+        self.__clip[slot] = -1
+        self.__indices[slot] = -1
+        self.__free.append(slot)
+        self.__count -= 1
+
+    def play(self, slot, clip, restart=True):
+        """
+        スロットのクリップを切り替える
+
+        Args:
+            slot (int): スロットの番号
+            clip (AnimationClip): 再生するクリップ
+            restart (bool): 最初から再生するか。Falseなら再生時間を引き継ぐ
+        """
+        if slot < 0 or slot >= len(self.__clip) or self.__clip[slot] < 0:
+            log.error_log("invalid slot", "play", "Animator")
+            return
+        if not clip.get_frames():
+            log.error_log("empty clip", "play", "Animator", clip.get_name())
+            return
+        self.__clip[slot] = self.__register(clip)
+        if restart:
+            self.__time[slot] = 0.0
+        self.__finished[slot] = 0
+        self.__indices[slot] = clip.get_frame(self.__time[slot])
+
+    def set_speed(self, slot, speed):
+        """
+        再生速度を設定する
+
+        Args:
+            slot (int): スロットの番号
+            speed (float): 再生速度(1.0で等速、0で停止)
+        """
+        self.__speed[slot] = speed
+
+    def get_frame(self, slot):
+        """
+        スロットの現在のフレームのインデックスを取得する
+
+        Returns:
+            int: インデックス。空きスロットは-1
+        """
+        return self.__indices[slot]
+
+    def is_finished(self, slot):
+        """
+        ループしないクリップが最後まで再生されたか調べる
+
+        Returns:
+            bool: True:終わった False:再生中
+        """
+        return bool(self.__finished[slot])
+
+    def get_count(self):
+        """
+        再生中のアニメーションの数を取得する
+
+        Returns:
+            int: 数
+        """
+        return self.__count
+
+    def get_slot_count(self):
+        """
+        スロットの数(空きスロットを含む)を取得する
+
+        Note:
+            draw()に渡す配列はこの長さにする。
+
+        Returns:
+            int: 数
+        """
+        return len(self.__clip)
+
+    def get_indices(self):
+        """
+        各スロットの現在のフレームのインデックスを取得する
+
+        Note:
+            取得した時点の値のコピー(numpyがあればnumpy配列)。空きスロットは-1。
+            スロットの配列を参照したままにするとadd()でスロットを増やせなくなるのでコピーを返す。
+
+        Returns:
+            array: インデックスの配列
+        """
+        if _geometry.np is not None:
+            return _geometry.np.array(self.__indices, dtype=_geometry.np.int32)
+        return array("i", self.__indices)
+
+    def update(self, dt=None):
+        """
+        すべてのアニメーションの時間を進めて、現在のフレームを求める
+
+        Args:
+            dt (float): 進める時間(秒)。Noneなら前回のupdate()からの経過時間
+        """
+        counter = SDL_GetPerformanceCounter()
+        if dt is None:
+            dt = (counter - self.__prev_counter) / SDL_GetPerformanceFrequency() if self.__prev_counter else 0.0
+        self.__prev_counter = counter
+        if self.__count == 0:
+            return
+        if self.__timeline_ends is None:
+            self.__build_timeline()
+        if _geometry.np is not None:
+            self.__update_np(dt)
+        else:
+            self.__update_py(dt)
+
+    def __update_np(self, dt):
+        np = _geometry.np
+        starts, lengths, loops, firsts, counts = self.__clip_columns
+        clip = np.frombuffer(self.__clip, dtype=np.int32)
+        time = np.frombuffer(self.__time, dtype=np.float64)
+        speed = np.frombuffer(self.__speed, dtype=np.float64)
+        indices = np.frombuffer(self.__indices, dtype=np.int32)
+        finished = np.frombuffer(self.__finished, dtype=np.int8)
+
+        active = clip >= 0
+        c = np.where(active, clip, 0)
+        time += speed * dt
+        length = lengths[c]
+        loop = loops[c]
+        # ループするものは長さで割った余り、しないものは最後のフレームで止める
+        safe = np.where(length > 0, length, 1.0)
+        local = np.where(loop, np.mod(time, safe), np.clip(time, 0.0, length))
+        finished[:] = (~loop & (time >= length)) & active
+        pos = np.searchsorted(self.__timeline_ends, starts[c] + local, side="right")
+        first = firsts[c]
+        pos = np.clip(pos, first, first + counts[c] - 1)
+        indices[:] = np.where(active, self.__timeline_frames[pos], -1)
+
+    def __update_py(self, dt):
+        starts, lengths, loops, firsts, counts = self.__clip_columns
+        ends = self.__timeline_ends
+        frames = self.__timeline_frames
+        clip = self.__clip
+        time = self.__time
+        speed = self.__speed
+        indices = self.__indices
+        finished = self.__finished
+        for slot in range(len(clip)):
+            c = clip[slot]
+            if c < 0:
+                continue
+            t = time[slot] + speed[slot] * dt
+            time[slot] = t
+            length = lengths[c]
+            if loops[c]:
+                local = t % length if length > 0 else 0.0
+            else:
+                local = min(max(t, 0.0), length)
+                finished[slot] = 1 if t >= length else 0
+            first = firsts[c]
+            pos = bisect.bisect_right(ends, starts[c] + local, first, first + counts[c])
+            indices[slot] = frames[min(pos, first + counts[c] - 1)]
+
+    def draw(self, atlas, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False, color=None, alpha=None):
+        """
+        すべてのアニメーションの現在のフレームをdraw_batch()で描画する
+
+        Note:
+            x、yなどの配列はスロットの番号の順に並べる(空きスロットの値は使われない)。
+
+        Args:
+            atlas (TextureAtlas or SpriteSheet): 描画に使うアトラス
+            x (array): X座標の配列
+            y (array): Y座標の配列
+            ex_x, ex_y, angle, flip_h, flip_v, color, alpha: draw_batch()と同じ
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if self.__count == 0:
+            return True
+        indices = self.get_indices()
+        if self.__count == len(self.__clip):
+            return atlas.draw_batch(indices, x, y, ex_x, ex_y, angle, flip_h, flip_v, color, alpha)
+        np = _geometry.np
+        if np is not None:
+            sel = indices >= 0
+        else:
+            sel = [slot for slot in range(len(indices)) if indices[slot] >= 0]
+        return atlas.draw_batch(_geometry.select(indices, sel), _geometry.select(x, sel), _geometry.select(y, sel),
+                                _geometry.select(ex_x, sel), _geometry.select(ex_y, sel),
+                                _geometry.select(angle, sel), _geometry.select(flip_h, sel),
+                                _geometry.select(flip_v, sel), _geometry.select_color(color, sel),
+                                _geometry.select(alpha, sel))
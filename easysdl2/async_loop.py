@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+asyncioのイベントループで動かすメインループ
+
+Note:
+    run()はフレームごとにprocess_events()、update、next_frame()を待っているコルーチンの再開、update_screen()を行い、
+    次のフレームまでの空き時間はawait asyncio.sleep()でイベントループに返す
+    (その間にソケットやサブプロセスなどの処理が進む)。
+    締め切りの直前だけビジーループで待つ(time.sleep()でイベントループを止めない)ので、フレームの間隔は保たれる。
+    asyncio.sleep()の寝過ごし(他のコールバックの実行時間を含む)は毎回測り、どれだけ手前で起きるかを調整する。
+
+    コルーチンはawait next_frame()で次のフレームまで待てる。再開されたコルーチンの描画はそのフレームに描画される
+    (next_frame()の後、次のawaitまでに描画すること)。
+
+    例:
+        async def player():
+            while True:
+                dt = await async_loop.next_frame()
+                tex.draw(x, y)
+
+        async def main():
+            asyncio.ensure_future(player())
+            asyncio.ensure_future(server())
+            await async_loop.run(max_fps=60)
+
+        asyncio.run(main())
+"""
+
+import asyncio
+
+from sdl2 import *
+
+from . import fps
+from .functions import clear_screen, process_events, update_screen
+
+DEFAULT_TOLERANCE_MS = 1.0  # asyncio.sleep()から締め切りを過ぎて戻ってもよい時間(ミリ秒)
+_MIN_SLEEP_MS = 0.5  # これより短いときはイベントループに返さない
+_INITIAL_OVERSHOOT_MS = 2.0  # 寝過ごしの見積もりの初期値(ミリ秒)
+_RATE = 0.1  # 統計の平均の更新の割合
+
+_waiters = []  # next_frame()で待っているFuture
+_running = False
+_frame = 0
+_overshoot_ms = _INITIAL_OVERSHOOT_MS
+_overshoot_dev_ms = _INITIAL_OVERSHOOT_MS / 2
+# 平均(ミリ秒)
+_slack_ms = 0.0  # イベントループに返した時間
+_busy_ms = 0.0  # フレームの処理の時間
+_late_frames = 0  # asyncio.sleep()から締め切りを過ぎて戻ったフレームの数
+
+
+async def run(update=None, max_fps=60, clear=True, tolerance_ms=DEFAULT_TOLERANCE_MS):
+    """
+    メインループを実行する
+
+    Note:
+        process_events()がFalseを返すか、updateがFalseを返すか、stop()が呼ばれるまで終わらない。
+        終わるときにnext_frame()で待っているコルーチンはキャンセルされる。
+
+    Args:
+        update (function): 毎フレーム呼ぶ関数(コルーチン関数でもよい)。update(dt)の形で、dtは前のフレームからの時間(秒)
+        max_fps (int): 1秒あたりのフレーム数の上限。0なら制限しない(それでも毎フレームイベントループに返す)
+        clear (bool): 毎フレームclear_screen()を呼ぶか
+        tolerance_ms (float): asyncio.sleep()から締め切りを過ぎて戻ってもよい時間(ミリ秒)。
+            大きくするとビジーループが減るが、フレームの間隔のばらつきが大きくなる
+
+    Returns:
+        int: 実行したフレーム数
+    """
+    global _running, _frame, _busy_ms
+    _running = True
+    frames = 0
+    pf = SDL_GetPerformanceFrequency()
+    prev = SDL_GetPerformanceCounter()
+    try:
+        while _running:
+            if not process_events():
+                break
+            start = SDL_GetPerformanceCounter()
+            dt = (start - prev) / pf
+            prev = start
+            if clear:
+                clear_screen()
+            if update is not None:
+                res = update(dt)
+                if asyncio.iscoroutine(res):
+                    res = await res
+                if res is False:
+                    break
+            # next_frame()で待っているコルーチンを再開し、描画が終わるまで待つ
+            if _wake(dt):
+                await asyncio.sleep(0)
+            update_screen()
+            _frame += 1
+            frames += 1
+            _busy_ms += _RATE * ((SDL_GetPerformanceCounter() - start) * 1000.0 / pf - _busy_ms)
+            await _idle(max_fps, tolerance_ms, pf)
+            fps._wait_spin(max_fps)
+    finally:
+        _running = False
+        waiters = _waiters[:]
+        del _waiters[:]
+        for future in waiters:
+            future.cancel()
+    return frames
+
+
+def stop():
+    """
+    run()を止める
+    """
+    global _running
+    _running = False
+
+
+def is_running():
+    """
+    run()の実行中か調べる
+
+    Returns:
+        bool: True:実行中 False:止まっている
+    """
+    return _running
+
+
+async def next_frame():
+    """
+    次のフレームまで待つ
+
+    Returns:
+        float: 前のフレームからの時間(秒)
+    """
+    future = asyncio.get_event_loop().create_future()
+    _waiters.append(future)
+    return await future
+
+
+def get_frame():
+    """
+    表示したフレームの数を取得する
+
+    Returns:
+        int: フレーム数
+    """
+    return _frame
+
+
+def get_stats():
+    """
+    メインループの統計を取得する
+
+    Note:
+        時間は最近のフレームの平均(ミリ秒)。
+        slackはasyncio.sleep()でイベントループに返した時間、busyはフレームの処理の時間。
+        overshootはasyncio.sleep()の寝過ごしの見積もりで、締め切りのこれだけ手前で起きるようにしている。
+
+    Returns:
+        dict: frame, slack, busy, overshoot, overshoot_dev, late_frames
+    """
+    return {
+        "frame": _frame,
+        "slack": _slack_ms,
+        "busy": _busy_ms,
+        "overshoot": _overshoot_ms,
+        "overshoot_dev": _overshoot_dev_ms,
+        "late_frames": _late_frames,
+    }
+
+
+def _wake(dt):
+    """
+    next_frame()で待っているコルーチンを再開する
+
+    Returns:
+        bool: 再開したものがあればTrue
+    """
+    if not _waiters:
+        return False
+    waiters = _waiters[:]
+    del _waiters[:]
+    for future in waiters:
+        if not future.done():
+            future.set_result(dt)
+    return True
+
+
+async def _idle(max_fps, tolerance_ms, pf):
+    """
+    締め切りの少し前までイベントループに返す
+    """
+    global _overshoot_ms, _overshoot_dev_ms, _slack_ms, _late_frames
+    deadline = fps._deadline(max_fps)
+    now = SDL_GetPerformanceCounter()
+    if deadline is None:
+        await asyncio.sleep(0)
+        return
+    margin_ms = max(0.0, _overshoot_ms + 2 * _overshoot_dev_ms - tolerance_ms)
+    request_ms = (deadline - now) * 1000.0 / pf - margin_ms
+    if request_ms < _MIN_SLEEP_MS:
+        await asyncio.sleep(0)
+        _slack_ms += _RATE * (-_slack_ms)
+        return
+    await asyncio.sleep(request_ms / 1000.0)
+    after = SDL_GetPerformanceCounter()
+    slept_ms = (after - now) * 1000.0 / pf
+    overshoot = slept_ms - request_ms
+    # 寝過ごしが増えたときはすぐに、減ったときはゆっくり見積もりを合わせる
+    rate = 0.25 if overshoot > _overshoot_ms else 0.05
+    _overshoot_dev_ms += rate * (abs(overshoot - _overshoot_ms) - _overshoot_dev_ms)
+    _overshoot_ms += rate * (overshoot - _overshoot_ms)
+    _slack_ms += _RATE * (slept_ms - _slack_ms)
+    if (after - deadline) * 1000.0 > tolerance_ms * pf:
+        _late_frames += 1
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+テクスチャアトラスとスプライトシートをバイナリファイルにコンパイルする
+
+Note:
+    TextureAtlas.load()はjsonを読み込んでフレームごとにオブジェクトを作るので、
+    フレーム数が多いと起動に時間がかかる。
+    コンパイルしたファイルはヘッダ、フレームテーブル、名前のハッシュ表だけでできていて、
+    TextureAtlas.load()、SpriteSheet.load()はmmapしたメモリをそのままフレームテーブルとして使う。
+    名前の検索(get_index())もハッシュ表で行う。
+
+    例:
+        atlas_compiler.compile_texture_atlas("sprite.json", "sprite.atlas")  # 開発時に1回だけ
+        atlas = TextureAtlas("sprite.atlas")
+"""
+
+import json
+import os
+
+from . import _atlas_file
+from . import _frame_table
+from . import log
+
+
+def compile_texture_atlas(json_file, out_file):
+    """
+    TexturePackerのjson(array)をコンパイルする
+
+    Args:
+        json_file (str): jsonファイルのパス(utf-8)
+        out_file (str): 出力するファイルのパス(utf-8)
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    table = _frame_table.FrameTable()
+    names = []
+    try:
+        with open(json_file) as fi:
+            data = json.load(fi)
+        path, fn = os.path.split(json_file)
+        texture_file = path + os.path.sep + data["meta"]["image"]
+        frames = data["frames"]
+        table.reserve(len(frames))
+        for frm in frames:
+            rect = frm["frame"]
+            pt = frm["pivot"]
+            table.append(int(rect["x"]), int(rect["y"]), int(rect["w"]), int(rect["h"]),
+                         float(pt["x"]), float(pt["y"]), frm["rotated"])
+            names.append(str(frm["filename"]))
+    except Exception:
+        log.error_log("Invalid json file", "compile_texture_atlas", "atlas_compiler", json_file)
+        return False
+    return _write(out_file, table, names, [texture_file])
+
+
+def compile_sprite_sheet(sheet, out_file):
+    """
+    SpriteSheetをコンパイルする
+
+    Note:
+        add_texture()、add_sprite()で組み立てたスプライトシートを保存し、次回からSpriteSheet.load()で読み込む。
+        texture_packer.TexturePacker.save()した後のスプライトシートも同じように保存できる。
+
+    Args:
+        sheet (SpriteSheet): スプライトシート
+        out_file (str): 出力するファイルのパス(utf-8)
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    texture_files = sheet._get_texture_files()
+    if not all(isinstance(fn, str) for fn in texture_files):
+        # texture_packerのメモリ上のページは画像ファイルがない
+        log.error_log("texture is not saved to a file", "compile_sprite_sheet", "atlas_compiler", out_file)
+        return False
+    return _write(out_file, sheet._get_frame_table(), sheet._get_names(), texture_files)
+
+
+def compile_file(json_file, out_file=None):
+    """
+    jsonファイルが出力ファイルより新しいときだけコンパイルする
+
+    Args:
+        json_file (str): TexturePackerのjsonファイルのパス(utf-8)
+        out_file (str): 出力するファイルのパス。Noneなら拡張子を.atlasにしたもの
+
+    Returns:
+        str: 出力したファイルのパス。失敗時はNone
+    """
+    if out_file is None:
+        out_file = os.path.splitext(json_file)[0] + ".atlas"
+    try:
+        if os.path.getmtime(out_file) >= os.path.getmtime(json_file) and _atlas_file.is_compiled(out_file):
+            return out_file
+    except OSError:
+        pass
+    return out_file if compile_texture_atlas(json_file, out_file) else None
+
+
+def is_compiled(filename):
+    """
+    コンパイル済みのファイルか調べる
+
+    Args:
+        filename (str): ファイルのパス
+
+    Returns:
+        bool: True:コンパイル済み False:それ以外
+    """
+    return _atlas_file.is_compiled(filename)
+
+
+def _write(out_file, table, names, texture_files):
+    try:
+        _atlas_file.write(out_file, table, names, texture_files)
+    except (IOError, OSError) as e:
+        log.error_log(e, "compile", "atlas_compiler", out_file)
+        return False
+    return True
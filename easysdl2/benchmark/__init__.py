@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+描画のベンチマーク
+
+Note:
+    ヘッドレスモード(ソフトウェアレンダラ)で描画の各経路のシナリオを実行し、
+    1秒あたりの描画数(items_per_sec)と1フレームの時間のパーセンタイルを計測する。
+    結果はjsonに保存し、保存しておいたベースラインと比べて遅くなっていないか調べられる。
+
+    コマンドラインから:
+        python -m easysdl2.benchmark --output result.json --baseline baseline.json --threshold 0.1
+
+    Pythonから:
+        results = benchmark.run(frames=100)
+        benchmark.save(results, "result.json")
+        regressions = benchmark.compare(results, benchmark.load("baseline.json"))
+"""
+
+import json
+import platform
+import random
+import time
+
+from sdl2 import SDL_GetPerformanceCounter, SDL_GetPerformanceFrequency, SDL_GetRendererInfo, SDL_GetVersion, \
+    SDL_RendererInfo, SDL_version
+
+from .. import _common as g
+from .. import render_queue
+from ..functions import create_window, init, update_screen, clear_screen
+
+FORMAT_VERSION = 1
+DEFAULT_FRAMES = 100  # 計測するフレーム数
+DEFAULT_WARMUP = 10  # 計測前に捨てるフレーム数
+DEFAULT_THRESHOLD = 0.1  # これ以上遅くなったら回帰とみなす割合
+SCREEN_W = 640
+SCREEN_H = 480
+
+_scenarios = {}  # 名前 -> Scenario(登録順)
+
+
+class Scenario:
+    """
+    ベンチマークのシナリオ
+
+    Note:
+        setup(assets, rng)は1フレーム分の描画を行う関数を返す(描画できなければNone)。
+        screenがTrueなら、各フレームの前後でclear_screen()とupdate_screen()を呼び、その時間も含めて計測する。
+    """
+
+    def __init__(self, name, setup, items, screen=True, group=""):
+        self.name = name
+        self.setup = setup
+        self.items = items  # 1フレームの描画数
+        self.screen = screen
+        self.group = group
+
+
+def register(name, items, screen=True, group=""):
+    """
+    シナリオを登録するデコレータ
+
+    Args:
+        name (str): シナリオの名前
+        items (int): 1フレームの描画数
+        screen (bool): 画面のクリアと表示を含めるか
+        group (str): 分類(texture、draw、fontなど)
+    """
+    def decorator(setup):
+        _scenarios[name] = Scenario(name, setup, items, screen, group)
+        return setup
+    return decorator
+
+
+def get_scenarios():
+    """
+    登録されているシナリオの名前を取得する
+
+    Returns:
+        list: 名前のリスト(登録順)
+    """
+    return list(_scenarios)
+
+
+def percentile(sorted_values, p):
+    """
+    パーセンタイルを求める(最近傍順位法)
+
+    Args:
+        sorted_values (list): 昇順に並べた値
+        p (float): 0〜100
+
+    Returns:
+        float: 値
+    """
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def _summary(times, items):
+    """
+    フレームごとの時間(秒)から結果をまとめる
+    """
+    total = sum(times)
+    ms = sorted(t * 1000.0 for t in times)
+    return {
+        "items": items,
+        "frames": len(times),
+        "items_per_sec": items * len(times) / total if total > 0 else 0.0,
+        "frame_ms": {
+            "mean": total * 1000.0 / len(times) if times else 0.0,
+            "p50": percentile(ms, 50),
+            "p90": percentile(ms, 90),
+            "p99": percentile(ms, 99),
+            "max": ms[-1] if ms else 0.0,
+        },
+    }
+
+
+def run_scenario(name, assets, frames=DEFAULT_FRAMES, warmup=DEFAULT_WARMUP, seed=0):
+    """
+    シナリオを1つ実行する
+
+    Returns:
+        dict: 結果。実行できなければ{"skipped": 理由}
+    """
+    scenario = _scenarios[name]
+    frame_func = scenario.setup(assets, random.Random(seed))
+    if frame_func is None:
+        return {"skipped": "not available"}
+    counter = SDL_GetPerformanceCounter
+    freq = SDL_GetPerformanceFrequency()
+    times = []
+    for frame in range(warmup + frames):
+        start = counter()
+        if scenario.screen:
+            clear_screen()
+            frame_func(frame)
+            update_screen()
+        else:
+            frame_func(frame)
+        if frame >= warmup:
+            times.append((counter() - start) / freq)
+    return _summary(times, scenario.items)
+
+
+def run(names=None, frames=DEFAULT_FRAMES, warmup=DEFAULT_WARMUP, font_file=None, deferred=False, seed=0,
+        progress=None):
+    """
+    シナリオを実行する
+
+    Note:
+        init()、create_window()がまだならヘッドレスモードで初期化する。
+        同じseedなら毎回同じ描画内容になる。
+
+    Args:
+        names (list): 実行するシナリオの名前。Noneなら全部
+        frames (int): 計測するフレーム数
+        warmup (int): 計測前に捨てるフレーム数
+        font_file (str): Fontのシナリオで使うttfファイルのパス。Noneならfontのシナリオは飛ばす
+        deferred (bool): 遅延描画モード(render_queue)で実行するか
+        seed (int): 乱数の種
+        progress (function): シナリオが終わるたびに(名前, 結果)を引数に呼ばれる関数
+
+    Returns:
+        dict: 結果("meta"と"scenarios")
+    """
+    from . import scenarios
+
+    if not g.main_window_renderer:
+        init(headless=True)
+        create_window(SCREEN_W, SCREEN_H)
+
+    info = SDL_RendererInfo()
+    SDL_GetRendererInfo(g.main_window_renderer, info)
+    version = SDL_version()
+    SDL_GetVersion(version)
+    results = {
+        "meta": {
+            "version": FORMAT_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sdl": "{}.{}.{}".format(version.major, version.minor, version.patch),
+            "renderer": info.name.decode("utf-8", "replace"),
+            "headless": g.headless,
+            "deferred": deferred,
+            "frames": frames,
+            "warmup": warmup,
+            "seed": seed,
+        },
+        "scenarios": {},
+    }
+
+    assets = scenarios.Assets(font_file)
+    prev_deferred = g.render_queue_enabled
+    render_queue.enable(deferred)
+    try:
+        for name in (names if names is not None else get_scenarios()):
+            if name not in _scenarios:
+                result = {"skipped": "unknown scenario"}
+            else:
+                result = run_scenario(name, assets, frames, warmup, seed)
+            results["scenarios"][name] = result
+            if progress is not None:
+                progress(name, result)
+    finally:
+        render_queue.enable(prev_deferred)
+        assets.release()
+    return results
+
+
+def save(results, filename):
+    """
+    結果をjsonファイルに保存する
+
+    Args:
+        results (dict): run()の結果
+        filename (str): ファイルのパス
+    """
+    with open(filename, "w") as fo:
+        json.dump(results, fo, indent=2, sort_keys=True)
+
+
+def load(filename):
+    """
+    保存した結果を読み込む
+
+    Args:
+        filename (str): ファイルのパス
+
+    Returns:
+        dict: 結果
+    """
+    with open(filename) as fi:
+        return json.load(fi)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, thresholds=None):
+    """
+    ベースラインと比べて遅くなったシナリオを探す
+
+    Note:
+        items_per_secが(1 - threshold)倍より小さいか、
+        1フレームの時間の中央値(p50)が(1 + threshold)倍より大きければ回帰とみなす。
+        どちらかで飛ばされたシナリオは比べない。
+
+    Args:
+        results (dict): run()の結果
+        baseline (dict): ベースラインの結果
+        threshold (float): 許容する割合(0.1なら10%まで)
+        thresholds (dict): シナリオごとの許容する割合(名前 -> 割合)
+
+    Returns:
+        list: 回帰したシナリオの(名前, 指標, ベースラインの値, 今回の値)のリスト
+    """
+    thresholds = thresholds or {}
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = results.get("scenarios", {}).get(name)
+        if current is None or "skipped" in current or "skipped" in base:
+            continue
+        limit = thresholds.get(name, threshold)
+        if current["items_per_sec"] < base["items_per_sec"] * (1.0 - limit):
+            regressions.append((name, "items_per_sec", base["items_per_sec"], current["items_per_sec"]))
+        if current["frame_ms"]["p50"] > base["frame_ms"]["p50"] * (1.0 + limit):
+            regressions.append((name, "frame_ms.p50", base["frame_ms"]["p50"], current["frame_ms"]["p50"]))
+    return regressions
+
+
+def format_result(name, result, base=None):
+    """
+    結果を1行の文字列にする
+
+    Args:
+        name (str): シナリオの名前
+        result (dict): シナリオの結果
+        base (dict): ベースラインのシナリオの結果(あれば比率も表示する)
+
+    Returns:
+        str: 文字列
+    """
+    if "skipped" in result:
+        return "{:<28} skipped ({})".format(name, result["skipped"])
+    ms = result["frame_ms"]
+    line = "{:<28} {:>12.0f} items/s  p50 {:7.3f}ms  p90 {:7.3f}ms  p99 {:7.3f}ms".format(
+        name, result["items_per_sec"], ms["p50"], ms["p90"], ms["p99"])
+    if base is not None and "skipped" not in base and base["items_per_sec"] > 0:
+        line += "  x{:.2f}".format(result["items_per_sec"] / base["items_per_sec"])
+    return line
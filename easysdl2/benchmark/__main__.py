@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマークをコマンドラインから実行する
+
+Note:
+    python -m easysdl2.benchmark --output result.json --baseline baseline.json
+    ベースラインより遅くなったシナリオがあれば終了コード1で終わる。
+"""
+
+import argparse
+import sys
+
+from . import DEFAULT_FRAMES, DEFAULT_THRESHOLD, DEFAULT_WARMUP, compare, format_result, get_scenarios, load, \
+    run, save
+from . import scenarios
+from ..functions import quit
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m easysdl2.benchmark", description="easysdl2 rendering benchmark")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="discarded frames per scenario")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="scenarios to run (prefix match)")
+    parser.add_argument("--font", help="ttf file for the font scenarios")
+    parser.add_argument("--deferred", action="store_true", help="run with render_queue enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--baseline", help="compare against this json file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown ratio (default %(default)s)")
+    parser.add_argument("--scenario-threshold", nargs=2, action="append", default=[], metavar=("NAME", "RATIO"),
+                        help="allowed slowdown ratio for one scenario")
+    parser.add_argument("--list", action="store_true", help="list scenarios and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in get_scenarios():
+            print(name)
+        return 0
+
+    names = get_scenarios()
+    if args.only:
+        names = [name for name in names if any(name.startswith(prefix) for prefix in args.only)]
+
+    baseline = load(args.baseline) if args.baseline else None
+    base_scenarios = baseline["scenarios"] if baseline else {}
+    if baseline is not None and baseline["meta"].get("deferred") != args.deferred:
+        print("warning: baseline was recorded with deferred={}".format(baseline["meta"].get("deferred")))
+
+    def progress(name, result):
+        print(format_result(name, result, base_scenarios.get(name)))
+        sys.stdout.flush()
+
+    results = run(names, args.frames, args.warmup, args.font, args.deferred, args.seed, progress)
+    quit()
+    if baseline is not None and baseline["meta"].get("renderer") != results["meta"]["renderer"]:
+        print("warning: baseline was recorded with the {} renderer".format(baseline["meta"].get("renderer")))
+    if args.output:
+        save(results, args.output)
+
+    if baseline is None:
+        return 0
+    thresholds = {name: float(ratio) for name, ratio in args.scenario_threshold}
+    regressions = compare(results, baseline, args.threshold, thresholds)
+    for name, metric, base, current in regressions:
+        print("REGRESSION {} {}: {:.3f} -> {:.3f}".format(name, metric, base, current))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
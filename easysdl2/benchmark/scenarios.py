@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマークのシナリオ
+
+Note:
+    画像ファイルを用意しなくてよいように、テクスチャやアトラスはAssetsがその場で作る。
+    各シナリオは乱数で座標などを決めてから、1フレーム分の描画を行う関数を返す。
+"""
+
+import ctypes
+import os
+import shutil
+import tempfile
+
+from sdl2 import *
+from sdl2.sdlimage import *
+
+from . import register, SCREEN_W, SCREEN_H
+from .. import draw
+from .. import texture_packer
+from ..font import Font
+from ..functions import process_events
+from ..sprite_sheet import SpriteSheet
+from ..texture import Rect, Texture, TextureAtlas
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SPRITES = 1000  # スプライトのシナリオの1フレームの描画数
+PRIMITIVES = 2000  # 図形のシナリオの1フレームの描画数
+TEXTS = 50  # 文字列のシナリオの1フレームの描画数
+EVENTS = 2000  # イベントのシナリオの1フレームのイベント数
+NUM_FRAMES = 8  # アトラスのフレーム数
+SPRITE_SIZE = 32
+
+
+def _make_surface(seed, w=SPRITE_SIZE, h=SPRITE_SIZE):
+    """
+    円と縁取りの模様のサーフェスを作る
+    """
+    surface = SDL_CreateRGBSurfaceWithFormat(0, w, h, 32, SDL_PIXELFORMAT_ARGB8888)
+    pixels = ctypes.cast(surface.contents.pixels, ctypes.POINTER(ctypes.c_uint32))
+    pitch = surface.contents.pitch // 4
+    color = (0x40 + seed * 0x25 & 0xff) << 16 | (0x80 + seed * 0x49 & 0xff) << 8 | (0xc0 + seed * 0x13 & 0xff)
+    for y in range(h):
+        for x in range(w):
+            dx = x - w / 2 + 0.5
+            dy = y - h / 2 + 0.5
+            inside = dx * dx + dy * dy < (w / 2) * (h / 2)
+            edge = x == 0 or y == 0 or x == w - 1 or y == h - 1
+            pixels[y * pitch + x] = (0xff000000 | color) if inside else (0x80ffffff if edge else 0)
+    return surface
+
+
+class Assets:
+    """
+    シナリオで使うテクスチャなど
+    """
+
+    def __init__(self, font_file=None):
+        self.temp_dir = tempfile.mkdtemp(prefix="easysdl2_benchmark_")
+        self.files = []
+        packer = texture_packer.TexturePacker(512)
+        for i in range(NUM_FRAMES):
+            surface = _make_surface(i)
+            filename = os.path.join(self.temp_dir, "sprite{}.png".format(i))
+            IMG_SavePNG(surface, filename.encode("utf-8"))
+            packer.add_surface("sprite{}".format(i), surface)
+            SDL_FreeSurface(surface)
+            self.files.append(filename)
+        packer.pack()
+        atlas_file = os.path.join(self.temp_dir, "atlas.json")
+        packer.save(atlas_file)
+
+        self.texture = Texture(self.files[0])
+        self.atlas = TextureAtlas(atlas_file)
+        # 画像ファイルごとにテクスチャがあるスプライトシート(テクスチャの切り替えが多い)
+        self.sprite_sheet = SpriteSheet()
+        for i, filename in enumerate(self.files):
+            self.sprite_sheet.add_sprite("sprite{}".format(i), self.sprite_sheet.add_texture(filename),
+                                         Rect(0, 0, SPRITE_SIZE, SPRITE_SIZE))
+        # 1枚のページに詰め込んだスプライトシート
+        self.packed_sheet = packer.create_sprite_sheet()
+        self.font = None
+        if font_file:
+            font = Font()
+            if font.load(font_file, 16):
+                self.font = font
+
+    def release(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+def _positions(rng, n, margin=0):
+    xs = [rng.uniform(-margin, SCREEN_W + margin) for i in range(n)]
+    ys = [rng.uniform(-margin, SCREEN_H + margin) for i in range(n)]
+    return xs, ys
+
+
+# Texture
+
+@register("texture_draw", SPRITES, group="texture")
+def _texture_draw(assets, rng):
+    tex = assets.texture
+    pos = list(zip(*_positions(rng, SPRITES)))
+
+    def frame(n):
+        for x, y in pos:
+            tex.draw(x, y)
+    return frame
+
+
+@register("texture_draw_center", SPRITES, group="texture")
+def _texture_draw_center(assets, rng):
+    tex = assets.texture
+    pos = list(zip(*_positions(rng, SPRITES)))
+
+    def frame(n):
+        for x, y in pos:
+            tex.draw_center(x, y)
+    return frame
+
+
+@register("texture_draw_ex", SPRITES, group="texture")
+def _texture_draw_ex(assets, rng):
+    tex = assets.texture
+    args = [(x, y, rng.uniform(0.5, 2.0), rng.uniform(0, 360)) for x, y in zip(*_positions(rng, SPRITES))]
+
+    def frame(n):
+        for x, y, ex, angle in args:
+            tex.draw_ex(x, y, ex, ex, angle + n)
+    return frame
+
+
+@register("texture_draw_crop_ex", SPRITES, group="texture")
+def _texture_draw_crop_ex(assets, rng):
+    tex = assets.texture
+    rect = Rect(4, 4, SPRITE_SIZE - 8, SPRITE_SIZE - 8)
+    args = [(x, y, rng.uniform(0.5, 2.0), rng.uniform(0, 360)) for x, y in zip(*_positions(rng, SPRITES))]
+
+    def frame(n):
+        for x, y, ex, angle in args:
+            tex.draw_crop_ex(rect, x, y, ex, ex, angle + n)
+    return frame
+
+
+@register("texture_draw_batch", SPRITES, group="texture")
+def _texture_draw_batch(assets, rng):
+    tex = assets.texture
+    xs, ys = _positions(rng, SPRITES)
+    angles = [rng.uniform(0, 360) for i in range(SPRITES)]
+
+    def frame(n):
+        tex.draw_batch(xs, ys, 1.0, 1.0, angles)
+    return frame
+
+
+# TextureAtlas / SpriteSheet
+
+def _frame_args(rng, n):
+    xs, ys = _positions(rng, n)
+    return [rng.randrange(NUM_FRAMES) for i in range(n)], xs, ys
+
+
+def _register_frames(prefix, attr):
+    """
+    TextureAtlas、SpriteSheetのdraw、draw_ex、draw_batchのシナリオを登録する
+    """
+    @register(prefix + "_draw", SPRITES, group=prefix)
+    def _draw(assets, rng):
+        target = getattr(assets, attr)
+        args = list(zip(*_frame_args(rng, SPRITES)))
+
+        def frame(n):
+            for index, x, y in args:
+                target.draw(index, x, y)
+        return frame
+
+    @register(prefix + "_draw_ex", SPRITES, group=prefix)
+    def _draw_ex(assets, rng):
+        target = getattr(assets, attr)
+        args = [(index, x, y, rng.uniform(0, 360)) for index, x, y in zip(*_frame_args(rng, SPRITES))]
+
+        def frame(n):
+            for index, x, y, angle in args:
+                target.draw_ex(index, x, y, 1.0, 1.0, angle + n)
+        return frame
+
+    @register(prefix + "_draw_batch", SPRITES, group=prefix)
+    def _draw_batch(assets, rng):
+        target = getattr(assets, attr)
+        indices, xs, ys = _frame_args(rng, SPRITES)
+
+        def frame(n):
+            target.draw_batch(indices, xs, ys)
+        return frame
+
+
+_register_frames("atlas", "atlas")
+_register_frames("sprite_sheet", "sprite_sheet")
+_register_frames("packed_sheet", "packed_sheet")
+
+
+# drawモジュール
+
+def _random_rects(rng, n):
+    return [(int(rng.uniform(0, SCREEN_W)), int(rng.uniform(0, SCREEN_H)), rng.randint(4, 40), rng.randint(4, 40))
+            for i in range(n)]
+
+
+@register("draw_point", PRIMITIVES, group="draw")
+def _draw_point(assets, rng):
+    pos = [(int(x), int(y)) for x, y in zip(*_positions(rng, PRIMITIVES))]
+
+    def frame(n):
+        draw.color(255, 255, 255)
+        for x, y in pos:
+            draw.point(x, y)
+    return frame
+
+
+@register("draw_points", PRIMITIVES, group="draw")
+def _draw_points(assets, rng):
+    pos = [(int(x), int(y)) for x, y in zip(*_positions(rng, PRIMITIVES))]
+
+    def frame(n):
+        draw.color(255, 255, 255)
+        draw.points(pos)
+    return frame
+
+
+@register("draw_line", PRIMITIVES, group="draw")
+def _draw_line(assets, rng):
+    rects = _random_rects(rng, PRIMITIVES)
+
+    def frame(n):
+        draw.color(255, 255, 0)
+        for x, y, w, h in rects:
+            draw.line(x, y, x + w, y + h)
+    return frame
+
+
+@register("draw_lines", PRIMITIVES, group="draw")
+def _draw_lines(assets, rng):
+    pos = [(int(x), int(y)) for x, y in zip(*_positions(rng, PRIMITIVES))]
+
+    def frame(n):
+        draw.color(255, 255, 0)
+        draw.lines(pos)
+    return frame
+
+
+@register("draw_rect", PRIMITIVES, group="draw")
+def _draw_rect(assets, rng):
+    rects = _random_rects(rng, PRIMITIVES)
+
+    def frame(n):
+        draw.color(0, 255, 255)
+        for x, y, w, h in rects:
+            draw.rect(x, y, w, h)
+    return frame
+
+
+@register("draw_rects", PRIMITIVES, group="draw")
+def _draw_rects(assets, rng):
+    rects = _random_rects(rng, PRIMITIVES)
+
+    def frame(n):
+        draw.color(0, 255, 255)
+        draw.rects(rects)
+    return frame
+
+
+@register("draw_fill_rect", PRIMITIVES, group="draw")
+def _draw_fill_rect(assets, rng):
+    rects = _random_rects(rng, PRIMITIVES)
+
+    def frame(n):
+        draw.color(255, 0, 255)
+        for x, y, w, h in rects:
+            draw.fill_rect(x, y, w, h)
+    return frame
+
+
+@register("draw_fill_rects", PRIMITIVES, group="draw")
+def _draw_fill_rects(assets, rng):
+    rects = _random_rects(rng, PRIMITIVES)
+
+    def frame(n):
+        draw.color(255, 0, 255)
+        draw.fill_rects(rects)
+    return frame
+
+
+@register("draw_points_array", PRIMITIVES, group="draw")
+def _draw_points_array(assets, rng):
+    if np is None:
+        return None
+    pos = np.array([(int(x), int(y)) for x, y in zip(*_positions(rng, PRIMITIVES))], dtype=np.int32)
+
+    def frame(n):
+        draw.color(255, 255, 255)
+        draw.points(pos)
+    return frame
+
+
+@register("draw_fill_rects_array", PRIMITIVES, group="draw")
+def _draw_fill_rects_array(assets, rng):
+    if np is None:
+        return None
+    rects = np.array(_random_rects(rng, PRIMITIVES), dtype=np.int32)
+
+    def frame(n):
+        draw.color(255, 0, 255)
+        draw.fill_rects(rects)
+    return frame
+
+
+# Font
+
+@register("font_draw", TEXTS, group="font")
+def _font_draw(assets, rng):
+    font = assets.font
+    if font is None:
+        return None
+    args = [(x, y, "score {}".format(rng.randrange(100000))) for x, y in zip(*_positions(rng, TEXTS))]
+
+    def frame(n):
+        for x, y, text in args:
+            font.draw(x, y, text)
+    return frame
+
+
+@register("font_get_texture", TEXTS, group="font")
+def _font_get_texture(assets, rng):
+    font = assets.font
+    if font is None:
+        return None
+    texts = ["score {}".format(rng.randrange(100000)) for i in range(TEXTS)]
+
+    def frame(n):
+        for text in texts:
+            font.get_texture(text, (255, 255, 255), font.BLENDED)
+    return frame
+
+
+# イベント処理
+
+@register("process_events_flood", EVENTS, screen=False, group="events")
+def _process_events_flood(assets, rng):
+    events = []
+    for i in range(EVENTS):
+        event = SDL_Event()
+        if i % 2:
+            event.type = SDL_MOUSEMOTION
+            event.motion.x = rng.randrange(SCREEN_W)
+            event.motion.y = rng.randrange(SCREEN_H)
+        else:
+            event.type = SDL_KEYDOWN if i % 4 == 0 else SDL_KEYUP
+            event.key.keysym.sym = SDLK_a + rng.randrange(26)
+        events.append(event)
+
+    def frame(n):
+        for event in events:
+            SDL_PushEvent(ctypes.byref(event))
+        process_events()
+    return frame
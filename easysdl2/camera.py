@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+カメラ(スクロールとズーム)と画面外の描画の除外(カリング)
+
+Note:
+    set_camera()でカメラを設定すると、Texture、TextureAtlas、SpriteSheet(とworld=TrueのFont.draw)の描画座標はワールド座標とみなされ、
+    カメラの位置とズームで画面座標に変換される。
+    変換の前に外接矩形で画面外かどうかを判定し、画面外ならSDLの構造体も作らずに描画をやめる。
+    バッチ描画では配列のまま判定して、画面内のものだけを描画する。
+    drawモジュールの図形とTexture.target()の中の描画はカメラの影響を受けない。
+    HUDなど画面に固定するものは、with camera.use(None):の中で描画する。
+"""
+
+import contextlib
+import ctypes
+
+from sdl2 import *
+
+from . import _common as g
+from . import _geometry
+
+_STAT_KEYS = ("culled", "submitted")
+_culled = 0
+_submitted = 0
+_last_stats = dict.fromkeys(_STAT_KEYS, 0)
+
+
+class Camera:
+    """
+    ワールド座標を画面座標に変換するカメラ
+
+    Note:
+        カメラの位置は表示範囲の左上のワールド座標。
+        画面座標 = (ワールド座標 - カメラの位置) * ズーム + 表示範囲の左上
+    """
+
+    def __init__(self, x=0.0, y=0.0, zoom=1.0, view_x=0, view_y=0, view_w=0, view_h=0):
+        """
+        コンストラクタ
+
+        Args:
+            x (float): カメラのX座標(表示範囲の左上のワールド座標)
+            y (float): カメラのY座標
+            zoom (float): ズーム(1.0で等倍)
+            view_x (int): 画面上の表示範囲の左上のX座標
+            view_y (int): 画面上の表示範囲の左上のY座標
+            view_w (int): 表示範囲の幅。0なら描画先の幅
+            view_h (int): 表示範囲の高さ。0なら描画先の高さ
+        """
+        self.__x = float(x)
+        self.__y = float(y)
+        self.__zoom = float(zoom)
+        self.__bounds = None
+        self.__view = [view_x, view_y, view_w, view_h]
+        self.__auto_size = view_w <= 0 or view_h <= 0
+        # 判定用の表示範囲(画面座標)
+        self.__left = 0
+        self.__top = 0
+        self.__right = 0
+        self.__bottom = 0
+        self._update_view()
+
+    def _update_view(self):
+        """
+        表示範囲を更新する(描画先のサイズが変わったときのため、フレームごとに呼ばれる)
+        """
+        vx, vy, vw, vh = self.__view
+        if self.__auto_size and g.current_renderer:
+            w = ctypes.c_int()
+            h = ctypes.c_int()
+            SDL_GetRendererOutputSize(g.current_renderer, ctypes.byref(w), ctypes.byref(h))
+            vw = w.value - vx if self.__view[2] <= 0 else vw
+            vh = h.value - vy if self.__view[3] <= 0 else vh
+        self.__left = vx
+        self.__top = vy
+        self.__right = vx + vw
+        self.__bottom = vy + vh
+
+    def set_view(self, x, y, w=0, h=0):
+        """
+        画面上の表示範囲を設定する
+
+        Args:
+            x (int): 左上のX座標
+            y (int): 左上のY座標
+            w (int): 幅。0なら描画先の幅
+            h (int): 高さ。0なら描画先の高さ
+        """
+        self.__view = [x, y, w, h]
+        self.__auto_size = w <= 0 or h <= 0
+        self._update_view()
+        self.__clamp()
+
+    def get_view(self):
+        """
+        画面上の表示範囲を取得する
+
+        Returns:
+            tuple (int, int, int, int): (x, y, 幅, 高さ)
+        """
+        return self.__left, self.__top, self.__right - self.__left, self.__bottom - self.__top
+
+    def set_position(self, x, y):
+        """
+        カメラの位置を設定する
+
+        Note:
+            set_bounds()で範囲を設定していれば範囲内に収める。
+
+        Args:
+            x (float): 表示範囲の左上のワールドX座標
+            y (float): 表示範囲の左上のワールドY座標
+        """
+        self.__x = float(x)
+        self.__y = float(y)
+        self.__clamp()
+
+    def get_position(self):
+        """
+        カメラの位置を取得する
+
+        Returns:
+            tuple (float, float): (x, y)
+        """
+        return self.__x, self.__y
+
+    def move(self, dx, dy):
+        """
+        カメラを移動する
+
+        Args:
+            dx (float): X方向の移動量(ワールド座標)
+            dy (float): Y方向の移動量(ワールド座標)
+        """
+        self.set_position(self.__x + dx, self.__y + dy)
+
+    def look_at(self, x, y):
+        """
+        ワールド座標の点が表示範囲の中心に来るようにする
+
+        Args:
+            x (float): ワールドX座標
+            y (float): ワールドY座標
+        """
+        self.set_position(x - (self.__right - self.__left) / 2 / self.__zoom,
+                          y - (self.__bottom - self.__top) / 2 / self.__zoom)
+
+    def set_zoom(self, zoom):
+        """
+        ズームを設定する
+
+        Args:
+            zoom (float): ズーム(1.0で等倍)
+        """
+        if zoom <= 0:
+            return
+        self.__zoom = float(zoom)
+        self.__clamp()
+
+    def get_zoom(self):
+        """
+        ズームを取得する
+
+        Returns:
+            float: ズーム
+        """
+        return self.__zoom
+
+    def set_bounds(self, left, top, right, bottom):
+        """
+        カメラが表示できるワールドの範囲を設定する
+
+        Note:
+            表示範囲がこの範囲からはみ出さないようにカメラの位置を制限する。
+
+        Args:
+            left, top, right, bottom (float): ワールド座標の範囲
+        """
+        self.__bounds = (left, top, right, bottom)
+        self.__clamp()
+
+    def clear_bounds(self):
+        """
+        カメラの移動範囲の制限をなくす
+        """
+        self.__bounds = None
+
+    def __clamp(self):
+        if self.__bounds is None:
+            return
+        left, top, right, bottom = self.__bounds
+        w = (self.__right - self.__left) / self.__zoom
+        h = (self.__bottom - self.__top) / self.__zoom
+        self.__x = max(left, min(self.__x, right - w)) if right - left > w else left
+        self.__y = max(top, min(self.__y, bottom - h)) if bottom - top > h else top
+
+    def get_world_rect(self):
+        """
+        表示範囲に入るワールド座標の範囲を取得する
+
+        Returns:
+            tuple (float, float, float, float): (left, top, right, bottom)
+        """
+        z = self.__zoom
+        return (self.__x, self.__y,
+                self.__x + (self.__right - self.__left) / z, self.__y + (self.__bottom - self.__top) / z)
+
+    def to_screen(self, x, y):
+        """
+        ワールド座標を画面座標に変換する
+
+        Returns:
+            tuple (float, float): 画面座標
+        """
+        return (x - self.__x) * self.__zoom + self.__left, (y - self.__y) * self.__zoom + self.__top
+
+    def to_world(self, x, y):
+        """
+        画面座標(マウスの座標など)をワールド座標に変換する
+
+        Returns:
+            tuple (float, float): ワールド座標
+        """
+        return (x - self.__left) / self.__zoom + self.__x, (y - self.__top) / self.__zoom + self.__y
+
+    def _rect(self, x, y, w, h):
+        """
+        ワールド座標の矩形を画面座標に変換する(描画用)
+
+        Returns:
+            tuple: (x, y, w, h)。画面外ならNone
+        """
+        global _culled, _submitted
+        z = self.__zoom
+        sx = (x - self.__x) * z + self.__left
+        sy = (y - self.__y) * z + self.__top
+        sw = w * z
+        sh = h * z
+        if sx >= self.__right or sy >= self.__bottom or sx + sw <= self.__left or sy + sh <= self.__top:
+            _culled += 1
+            return None
+        _submitted += 1
+        return sx, sy, sw, sh
+
+    def _point(self, x, y, radius):
+        """
+        ワールド座標の点を画面座標に変換する(回転する描画用)
+
+        Args:
+            radius (float): 点から描画範囲の端までの最大距離(ワールド座標)
+
+        Returns:
+            tuple: (x, y, zoom)。画面外ならNone
+        """
+        global _culled, _submitted
+        z = self.__zoom
+        sx = (x - self.__x) * z + self.__left
+        sy = (y - self.__y) * z + self.__top
+        r = radius * z
+        if sx - r >= self.__right or sy - r >= self.__bottom or sx + r <= self.__left or sy + r <= self.__top:
+            _culled += 1
+            return None
+        _submitted += 1
+        return sx, sy, z
+
+    def _batch(self, x, y, radius):
+        """
+        ワールド座標の点の配列を画面座標に変換する(バッチ描画用)
+
+        Args:
+            radius (float): 点から描画範囲の端までの最大距離(全インスタンス共通)
+
+        Returns:
+            tuple: (x, y, sel)。selは画面内のものの選択(numpyならブール配列、そうでなければインデックスのリスト)。
+                   全部画面内ならNone
+        """
+        global _culled, _submitted
+        z = self.__zoom
+        r = radius * z
+        cx, cy = self.__x, self.__y
+        left, top, right, bottom = self.__left, self.__top, self.__right, self.__bottom
+        np = _geometry.np
+        if np is not None:
+            sx = (np.asarray(x, dtype=np.float64) - cx) * z + left
+            sy = (np.asarray(y, dtype=np.float64) - cy) * z + top
+            sx, sy = np.broadcast_arrays(np.atleast_1d(sx), np.atleast_1d(sy))
+            sel = (sx - r < right) & (sy - r < bottom) & (sx + r > left) & (sy + r > top)
+            n = sel.size
+            visible = int(np.count_nonzero(sel))
+            if visible == n:
+                sel = None
+            else:
+                sx = sx[sel]
+                sy = sy[sel]
+        else:
+            n = _geometry.count(x, y)
+            sel = []
+            sx = []
+            sy = []
+            for i, (vx, vy) in enumerate(_geometry.iterate(n, x, y)):
+                px = (vx - cx) * z + left
+                py = (vy - cy) * z + top
+                if px - r < right and py - r < bottom and px + r > left and py + r > top:
+                    sel.append(i)
+                    sx.append(px)
+                    sy.append(py)
+            visible = len(sel)
+            if visible == n:
+                sel = None
+        _submitted += visible
+        _culled += n - visible
+        return sx, sy, sel
+
+
+def set_camera(camera):
+    """
+    描画に使うカメラを設定する
+
+    Args:
+        camera (Camera): カメラ。Noneならカメラを使わない(画面座標で描画する)
+    """
+    g.camera = camera
+    if camera is not None:
+        camera._update_view()
+
+
+def get_camera():
+    """
+    描画に使っているカメラを取得する
+
+    Returns:
+        Camera: カメラ。使っていなければNone
+    """
+    return g.camera
+
+
+@contextlib.contextmanager
+def use(camera):
+    """
+    withの中だけカメラを切り替える
+
+    Note:
+        with camera.use(None):の中ではカメラを使わずに画面座標で描画する。
+
+    Args:
+        camera (Camera): カメラ。Noneならカメラを使わない
+    """
+    prev = g.camera
+    set_camera(camera)
+    try:
+        yield camera
+    finally:
+        g.camera = prev
+
+
+def get_stats():
+    """
+    直前のフレームの統計を取得する
+
+    Note:
+        culled: 画面外なので描画しなかった数
+        submitted: 描画した数
+        カメラを設定しているときの描画だけを数える。
+
+    Returns:
+        dict: 統計の辞書
+    """
+    return dict(_last_stats)
+
+
+def _end_frame():
+    """
+    フレームの統計を確定する(update_screen()から呼ばれる)
+    """
+    global _culled, _submitted, _last_stats
+    _last_stats = {"culled": _culled, "submitted": _submitted}
+    _culled = 0
+    _submitted = 0
+    if g.camera is not None:
+        g.camera._update_view()
@@ -1,13 +1,103 @@
 # -*- coding: utf-8 -*-
 """
 sdl_gfxを使わない図形描画関数を定義します
+
+Note:
+    points、lines、rects、fill_rectsはタプルのリストのほかに、C連続のint32かfloat32のnumpy配列
+    (形は(n, 2)か(n, 4))や、同じ並びのバッファ(array.array("i")、SDL_Pointなどのctypesの配列など)を受け取る。
+    int32の配列はコピーせずにそのままSDL_RenderDrawPointsなどに渡し、float32の配列はSDL_RenderDrawPointsFなどに渡す。
+    それ以外の型のnumpy配列は1回の変換でint32かfloat32にする(要素ごとのpythonのオブジェクトは作らない)。
+    遅延描画モードでは、描画するまでに呼び出し元が配列を書き換えてもよいように1回だけコピーする。
+
+    リストから作る配列やバッチ描画の頂点配列はレンダラごとに使い回し、足りないときだけ大きくする。
+    大きな描画の後でメモリを返したいときはshrink_buffers()を呼ぶ。
 """
 
+import ctypes
+from array import array
+from itertools import chain
+
 from . import _common as gl
+from . import _geometry
+from . import _scratch
 from . import log
+from . import render_queue
 from .functions import *
 
 
+def _to_array(name, values, item_type, float_type, components):
+    """
+    座標の並びをSDLの関数に渡す配列にする
+
+    Note:
+        すぐに描画するときは、リストから作る配列に_scratchの配列を使い回す。
+
+    Args:
+        name (str): エラーメッセージに使う関数名
+        values: タプルのリスト、numpy配列、バッファ、ctypesの配列
+        item_type (type): 整数の要素の型(SDL_Point、SDL_Rect)
+        float_type (type): 浮動小数点数の要素の型(SDL_FPoint、SDL_FRect)
+        components (int): 要素あたりの値の数
+
+    Returns:
+        tuple: (配列かポインタ, 要素数, 浮動小数点数か)。変換できなければ配列がNone
+    """
+    copy = gl.render_queue_enabled
+    np = _geometry.np
+    if isinstance(values, ctypes.Array) and values._type_ in (item_type, float_type):
+        if copy:
+            values = type(values).from_buffer_copy(values)
+        return values, len(values), values._type_ is float_type
+
+    if not isinstance(values, (list, tuple)) and (np is None or not isinstance(values, np.ndarray)):
+        try:
+            view = memoryview(values)
+        except TypeError:
+            view = None
+        if view is not None:
+            fmt = view.format.lstrip("@=<")
+            if view.itemsize != 4 or fmt not in ("i", "l", "f") or not view.c_contiguous or \
+                    view.nbytes % (4 * components):
+                log.write("{} failed. unsupported buffer. format={}".format(name, view.format))
+                return None, 0, False
+            is_float = fmt == "f"
+            if np is not None:
+                # numpy配列にすれば配列の型を作らずにポインタを渡せる
+                values = np.frombuffer(view, dtype=np.float32 if is_float else np.int32)
+            else:
+                length = view.nbytes // (4 * components)
+                arr_type = (float_type if is_float else item_type) * length
+                if copy or view.readonly:
+                    return arr_type.from_buffer_copy(view), length, is_float
+                return arr_type.from_buffer(view), length, is_float
+
+    if np is not None and isinstance(values, np.ndarray):
+        kind = values.dtype.kind
+        if kind not in "biuf" or (values.ndim > 1 and values.shape[-1] != components) or \
+                values.size % components:
+            log.write("{} failed. unsupported array. dtype={} shape={}".format(name, values.dtype, values.shape))
+            return None, 0, False
+        is_float = kind == "f"
+        dtype = np.float32 if is_float else np.int32
+        if copy:
+            values = np.array(values, dtype=dtype, order="C")
+        else:
+            values = np.ascontiguousarray(values, dtype=dtype)
+        ptr_type = ctypes.POINTER(float_type if is_float else item_type)
+        return values.ctypes.data_as(ptr_type), values.size // components, is_float
+
+    flat = array("i", map(int, chain.from_iterable(values)))
+    length = len(values)
+    if len(flat) != length * components:
+        log.write("{} failed. each item must have {} values".format(name, components))
+        return None, 0, False
+    if copy:
+        return (item_type * length).from_buffer(flat), length, False
+    arr = _scratch.get(gl.current_renderer, item_type, length)
+    ctypes.memmove(arr, flat.buffer_info()[0], len(flat) * flat.itemsize)
+    return arr, length, False
+
+
 def color(r, g, b, a=255):
     """
     描画する色を設定する
@@ -21,6 +111,9 @@ def color(r, g, b, a=255):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.set_draw_color(r, g, b, a)
+        return True
     res = SDL_SetRenderDrawColor(gl.current_renderer, r, g, b, a)
     if res < 0:
         log.write("draw.color() failed. error={}".format(SDL_GetError()))
@@ -38,6 +131,9 @@ def blend_mode(mode):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.set_draw_blend(mode)
+        return True
     res = SDL_SetRenderDrawBlendMode(gl.current_renderer, mode)
     if res < 0:
         log.write("draw.blend_mode() failed. error={}".format(SDL_GetError()))
@@ -56,6 +152,9 @@ def point(x, y):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(SDL_RenderDrawPoint, int(x), int(y))
+        return True
     res = SDL_RenderDrawPoint(gl.current_renderer, int(x), int(y))
     if res < 0:
         log.write("draw.point() failed. error={}".format(SDL_GetError()))
@@ -68,15 +167,20 @@ def points(point_list):
     点を複数描画する
 
     Args:
-        point_list (list): 点の座標を格納したタプルのリスト[(x, y), (x, y)..]
+        point_list (list): 点の座標を格納したタプルのリスト[(x, y), (x, y)..]、
+            または形が(n, 2)のint32かfloat32のnumpy配列やバッファ
 
     Returns:
         bool: True:成功 False:失敗
     """
-    length = len(point_list)
-    ARRTYPE = SDL_Point * length
-    arr = ARRTYPE(*(SDL_Point(x, y) for x, y in point_list))
-    res = SDL_RenderDrawPoints(gl.current_renderer, arr, length)
+    arr, length, is_float = _to_array("draw.points()", point_list, SDL_Point, SDL_FPoint, 2)
+    if arr is None:
+        return False
+    func = SDL_RenderDrawPointsF if is_float else SDL_RenderDrawPoints
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(func, arr, length)
+        return True
+    res = func(gl.current_renderer, arr, length)
     if res < 0:
         log.write("draw.points() failed. error={}".format(SDL_GetError()))
         return False
@@ -96,6 +200,9 @@ def line(x1, y1, x2, y2):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(SDL_RenderDrawLine, int(x1), int(y1), int(x2), int(y2))
+        return True
     res = SDL_RenderDrawLine(gl.current_renderer, int(x1), int(y1), int(x2), int(y2))
     if res < 0:
         log.write("draw.line() failed. error={}".format(SDL_GetError()))
@@ -108,15 +215,20 @@ def lines(point_list):
     直線をつなげて複数描画する
 
     Args:
-        point_list (list): 点の座標を格納したタプルのリスト[(x, y), (x, y)..]
+        point_list (list): 点の座標を格納したタプルのリスト[(x, y), (x, y)..]、
+            または形が(n, 2)のint32かfloat32のnumpy配列やバッファ
     
     Returns:
         bool: True:成功 False:失敗
     """
-    length = len(point_list)
-    ARRTYPE = SDL_Point * length
-    arr = ARRTYPE(*(SDL_Point(x, y) for x, y in point_list))
-    res = SDL_RenderDrawLines(gl.current_renderer, arr, length)
+    arr, length, is_float = _to_array("draw.lines()", point_list, SDL_Point, SDL_FPoint, 2)
+    if arr is None:
+        return False
+    func = SDL_RenderDrawLinesF if is_float else SDL_RenderDrawLines
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(func, arr, length)
+        return True
+    res = func(gl.current_renderer, arr, length)
     if res < 0:
         log.write("draw.points() failed. error={}".format(SDL_GetError()))
         return False
@@ -136,6 +248,9 @@ def rect(x, y, w, h):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(SDL_RenderDrawRect, SDL_Rect(int(x), int(y), int(w), int(h)))
+        return True
     res = SDL_RenderDrawRect(gl.current_renderer, SDL_Rect(int(x), int(y), int(w), int(h)))
     if res < 0:
         log.write("draw.rect() failed. error={}".format(SDL_GetError()))
@@ -148,15 +263,20 @@ def rects(rect_list):
     長方形を複数描く
 
     Args:
-        rect_list (list): 長方形の座標、サイズを格納したタプルのリスト[(x,y,w,h), (x,y,w,h)...]
+        rect_list (list): 長方形の座標、サイズを格納したタプルのリスト[(x,y,w,h), (x,y,w,h)...]、
+            または形が(n, 4)のint32かfloat32のnumpy配列やバッファ
 
     Returns:
         bool: True:成功 False:失敗
     """
-    length = len(rect_list)
-    ARRTYPE = SDL_Rect * length
-    arr = ARRTYPE(*(SDL_Rect(int(x), int(y), int(w), int(h)) for x, y, w, h in rect_list))
-    res = SDL_RenderDrawRects(gl.current_renderer, arr, length)
+    arr, length, is_float = _to_array("draw.rects()", rect_list, SDL_Rect, SDL_FRect, 4)
+    if arr is None:
+        return False
+    func = SDL_RenderDrawRectsF if is_float else SDL_RenderDrawRects
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(func, arr, length)
+        return True
+    res = func(gl.current_renderer, arr, length)
     if res < 0:
         log.write("draw.rects() failed. error={}".format(SDL_GetError()))
         return False
@@ -176,6 +296,9 @@ def fill_rect(x, y, w, h):
     Returns:
         bool: True:成功 False:失敗
     """
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(SDL_RenderFillRect, SDL_Rect(int(x), int(y), int(w), int(h)))
+        return True
     res = SDL_RenderFillRect(gl.current_renderer, SDL_Rect(int(x), int(y), int(w), int(h)))
     if res < 0:
         log.write("draw.fill_rect() failed. error={}".format(SDL_GetError()))
@@ -188,16 +311,48 @@ def fill_rects(rect_list):
     塗りつぶしの長方形を複数描く
 
     Args:
-        rect_list (list): 長方形の座標、サイズを格納したタプルのリスト[(x,y,w,h), (x,y,w,h)...]
+        rect_list (list): 長方形の座標、サイズを格納したタプルのリスト[(x,y,w,h), (x,y,w,h)...]、
+            または形が(n, 4)のint32かfloat32のnumpy配列やバッファ
 
     Returns:
         bool: True:成功 False:失敗
     """
-    length = len(rect_list)
-    ARRTYPE = SDL_Rect * length
-    arr = ARRTYPE(*(SDL_Rect(int(x), int(y), int(w), int(h)) for x, y, w, h in rect_list))
-    res = SDL_RenderFillRects(gl.current_renderer, arr, length)
+    arr, length, is_float = _to_array("draw.fill_rects()", rect_list, SDL_Rect, SDL_FRect, 4)
+    if arr is None:
+        return False
+    func = SDL_RenderFillRectsF if is_float else SDL_RenderFillRects
+    if gl.render_queue_enabled:
+        render_queue.push_primitive(func, arr, length)
+        return True
+    res = func(gl.current_renderer, arr, length)
     if res < 0:
         log.write("draw.fill_rects() failed. error={}".format(SDL_GetError()))
         return False
     return True
+
+
+def shrink_buffers(renderer=None):
+    """
+    使い回している配列を開放する
+
+    Note:
+        drawモジュールの図形とバッチ描画(draw_batchなど)が使い回している配列を開放する。
+        次に描画するときに必要な大きさで確保し直す。
+
+    Args:
+        renderer (SDL_Renderer): このレンダラの配列を開放する。Noneなら全部
+    """
+    _scratch.shrink(renderer)
+
+
+def get_buffer_stats():
+    """
+    使い回している配列の状況を取得する
+
+    Note:
+        描画する数が変わらなければ、allocationsは増えない。
+
+    Returns:
+        dict: allocations(確保した回数の合計), buffers(配列の数), bytes(配列の合計サイズ)
+    """
+    return _scratch.get_stats()
@@ -4,6 +4,7 @@
 """
 
 from . import _common as g
+from . import camera
 from . import log
 from .functions import *
 from .texture import *
@@ -30,6 +31,7 @@ class Font:
             size (int): フォントサイズ(縦のピクセル数？)
         """
         self.__font = None
+        self.__data = None  # メモリから開いたフォントのデータ(フォントを閉じるまで保持する)
         self.__size = size
         if filename:
             if not self.load(filename, size):
@@ -59,6 +61,7 @@ class Font:
         if self.__font:
             TTF_CloseFont(self.__font)
             self.__font = None
+            self.__data = None
 
         font = TTF_OpenFont(filename.encode("utf-8"), int(size))
         if not font:
@@ -67,6 +70,31 @@ class Font:
         self.__font = font
         return True
 
+    def _load_data(self, data, size):
+        """
+        メモリ上のフォントファイルのデータからフォントを開く(loader用)
+
+        Args:
+            data (bytes): ttfファイルの内容
+            size (int): フォントサイズ
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if self.__font:
+            TTF_CloseFont(self.__font)
+            self.__font = None
+        # TTF_OpenFontRWはデータをコピーしないので、フォントを閉じるまで参照を持っておく
+        self.__data = data
+        rw = SDL_RWFromConstMem(data, len(data))
+        font = TTF_OpenFontRW(rw, 1, int(size))
+        if not font:
+            log.write("_load_data() in Font object failed. error={}".format(TTF_GetError()))
+            self.__data = None
+            return False
+        self.__font = font
+        return True
+
     def get_surface(self, text, color=(255, 255, 255), style=0, bg_color=(0, 0, 0)):
         """
         textを画像化したSDL_Surfaceを取得する
@@ -120,19 +148,13 @@ class Font:
             return None
 
         texture_instance = Texture()
-        texture_instance._Texture__texture = texture
-        # サイズを取得する
-        w = ctypes.c_int()
-        h = ctypes.c_int()
-        SDL_QueryTexture(texture, None, None, ctypes.byref(w), ctypes.byref(h))
-        texture_instance._Texture__w = w.value
-        texture_instance._Texture__h = h.value
+        texture_instance._set_texture(texture)
 
         SDL_FreeSurface(surface)
 
         return texture_instance
 
-    def draw(self, x, y, text, color=(255, 255, 255), style=0, bg_color=(0, 0, 0)):
+    def draw(self, x, y, text, color=(255, 255, 255), style=0, bg_color=(0, 0, 0), world=False):
         """
         文字列を描画する
 
@@ -140,6 +162,7 @@ class Font:
             主にデバッグ情報表示用。
             呼び出すたびにテクスチャを生成、開放するので遅い。
             大量に描画するならget_textureでテクスチャ化したほうが良い。
+            カメラを設定していても、worldがFalseなら画面座標で描画する(FPSの表示などのHUD用)。
   
         Args:
             text (str): 文字列
@@ -148,10 +171,15 @@ class Font:
             color (tuple): 文字列の色(red, green, blue)
             style (int): Fontクラス内の定数
             bg_color (tuple): SHADEDで使用する背景色(red, green, blue)
+            world (bool): True:カメラのワールド座標で描画する False:画面座標で描画する
         """
         texture = self.get_texture(text, color, style, bg_color)
         if not texture:
             log.write("draw() in Font object failed.")
             return
 
-        texture.draw(x, y)
+        if world or g.camera is None:
+            texture.draw(x, y)
+        else:
+            with camera.use(None):
+                texture.draw(x, y)
@@ -1,59 +1,437 @@
 # -*- coding: utf-8 -*-
 """
 フレームレートを計算したり、フレームレートをキープしたりする
+
+Note:
+    wait()を呼ぶたびに前回からの時間(フレーム時間)をリングバッファに記録する。
+    get_stats()でフレーム時間のパーセンタイル、ジッタ、予算を超えたフレーム数を、
+    get_histogram()でヒストグラムを取得できる。
+    平均だけでは分からないカクつきを調べるのに使う。
+    集計はフレームごとに追加した値と押し出された値の分だけ更新する(全体を計算し直さない)。
+
+    wait()はCPUを使い続けないように、締め切りの少し前までOSのスリープで待ち、残りだけをビジーループで待つ。
+    スリープの寝過ごし(要求した時間より長く眠った分)を毎回測って、どれだけ手前で起きるか(マージン)を調整する。
+    set_limiter()で待ち方と許容する遅れを設定し、get_limiter_stats()で待ち時間とそのCPU時間を取得できる。
 """
 
-from statistics import mean
+import time
+from bisect import bisect_left, insort
+from collections import deque
 
 from sdl2 import *
 
-_FPS_INTERVAL = 30
+from . import _common as g
+from . import profiler
+from . import vsync
+
+DEFAULT_HISTORY_SIZE = 240  # 記録するフレーム数
+DEFAULT_BIN_MS = 1.0  # ヒストグラムの1区間の幅(ミリ秒)
+DEFAULT_BINS = 50  # ヒストグラムの区間の数(最後の区間はそれ以上全部)
+DEFAULT_BUDGET_TOLERANCE = 0.1  # 目標のフレーム時間をこの割合だけ超えたら予算超過とみなす
+
+# wait()の待ち方
+HYBRID = 0  # スリープとビジーループ
+SPIN = 1  # ビジーループだけ(以前の動作)
+SLEEP = 2  # スリープだけ
+
+DEFAULT_TOLERANCE_MS = 0.25  # 締め切りから遅れてもよい時間(ミリ秒)
+_MIN_SLEEP_MS = 0.2  # これより短いときはスリープしない
+_INITIAL_OVERSHOOT_MS = 1.0  # 寝過ごしの見積もりの初期値(ミリ秒)
+
+_thread_time = getattr(time, "thread_time", time.process_time)
 
 _pf = 0  # 1秒あたりの分解能
 _prev_count = 0
-_fps_list = [0 for i in range(_FPS_INTERVAL)]
-_frame_count = 0
 _fps = 0
 
+_history_size = DEFAULT_HISTORY_SIZE
+_durations = deque()  # フレーム時間(カウンタの値)。古い順
+_sorted = []  # _durationsを昇順に並べたもの(パーセンタイル用)
+_total = 0  # _durationsの合計
+_diff_total = 0  # 隣り合うフレーム時間の差の絶対値の合計(ジッタ用)
+_bin_ms = DEFAULT_BIN_MS
+_bins = [0] * DEFAULT_BINS
+_bin_ticks = 0  # ヒストグラムの1区間の幅(カウンタの値)
+_budget_ms = None  # 予算(ミリ秒)。Noneならwait()の目標のフレーム時間
+_budget_tolerance = DEFAULT_BUDGET_TOLERANCE
+_budget_ticks = 0  # 予算超過とみなすフレーム時間(カウンタの値)。0なら数えない
+_over_budget = 0  # 予算を超えたフレーム数
+_target_fps = 0  # 最後にwait()に渡されたfps
+
+_limiter = HYBRID
+_tolerance_ms = DEFAULT_TOLERANCE_MS
+_overshoot_ms = _INITIAL_OVERSHOOT_MS  # 寝過ごしの平均の見積もり
+_overshoot_dev_ms = _INITIAL_OVERSHOOT_MS / 2  # 寝過ごしのばらつき(平均偏差)の見積もり
+_margin_ticks = 0  # 締め切りのどれだけ手前で起きるか(カウンタの値)
+_wait_frames = 0  # 以下はreset_stats()からの合計
+_wait_ticks = 0
+_sleep_ticks = 0
+_spin_ticks = 0
+_wait_cpu = 0.0  # 待っている間に使ったCPU時間(秒)
+_late_frames = 0  # 待ち方のせいで締め切りからtolerance以上遅れたフレーム数
+
 
 def _init():
     """
     モジュールの初期化
     """
-    global _pf, _prev_count, _frame_count
+    global _pf, _prev_count
     _pf = SDL_GetPerformanceFrequency()
     _prev_count = SDL_GetPerformanceCounter()
-    _frame_count = 0
+    reset_stats()
 
 
 def wait(fps=60):
     """
     次回更新タイミングを待つ
 
+    Note:
+        垂直同期が効いていてfpsがリフレッシュレート以上なら待たない(vsyncモジュール参照)。
+
     Args:
         fps (int): 1秒間の更新回数
     """
+    _wait(fps, True)
+
+
+def _wait_spin(fps):
+    """
+    スリープせずにビジーループだけで次回更新タイミングを待つ(async_loop用)
+
+    Note:
+        締め切りの手前まではasync_loopがイベントループに返して待っているので、
+        ここでtime.sleep()を呼んでイベントループを止めないようにする。
+    """
+    _wait(fps, False)
+
+
+def _wait(fps, sleep):
+    global _prev_count
+    fps = vsync._software_fps(fps)
+    if fps == 0 and vsync.is_active():
+        # 垂直同期で待っているので記録だけ行う
+        if _target_fps != vsync.get_refresh_rate():
+            _set_target(vsync.get_refresh_rate())
+        now_count = SDL_GetPerformanceCounter()
+        _record(now_count - _prev_count)
+        _prev_count = now_count
+        return
+    if fps != _target_fps:
+        _set_target(fps)
     if fps <= 0: fps = 999999
-    global _prev_count, _frame_count, _fps
+    if g.profiler_enabled:
+        profiler.begin("wait")
+    start_cpu = _thread_time()
+    start_count = SDL_GetPerformanceCounter()
     next_count = _prev_count + _pf // fps
-    while True:
-        now_count = SDL_GetPerformanceCounter()
-        if now_count >= next_count:
-            i = _frame_count % _FPS_INTERVAL
-            _fps_list[i] = _pf / (now_count - _prev_count)
-            if i == _FPS_INTERVAL - 1:
-                _fps = mean(_fps_list)
-            _frame_count += 1
-            _prev_count = now_count
-            break
+    now_count = _sleep_until(next_count, start_count) if sleep else start_count
+    spin_count = now_count
+    while now_count < next_count:
         SDL_Delay(0)
+        now_count = SDL_GetPerformanceCounter()
+    _record_wait(start_count, spin_count, now_count, next_count, _thread_time() - start_cpu)
+    vsync._waited_ticks(now_count - start_count)
+    _record(now_count - _prev_count)
+    _prev_count = now_count
+    if g.profiler_enabled:
+        profiler.end()
+
+
+def _deadline(fps):
+    """
+    wait(fps)が戻るときのカウンタの値を返す(async_loop用)
+
+    Returns:
+        int: カウンタの値。待たないならNone
+    """
+    fps = vsync._software_fps(fps)
+    if fps <= 0:
+        return None
+    return _prev_count + _pf // fps
 
 
 def get_fps():
     """
     現在のフレームレートを取得する
-   
+
+    Note:
+        記録しているフレーム時間の平均から計算する。
+
     Returns:
         float: フレームレート
     """
     return _fps
+
+
+def get_frame_time():
+    """
+    最後のフレーム時間を取得する
+
+    Returns:
+        float: フレーム時間(ミリ秒)
+    """
+    return _durations[-1] * 1000.0 / _pf if _durations else 0.0
+
+
+def get_percentile(p):
+    """
+    フレーム時間のパーセンタイルを取得する
+
+    Args:
+        p (float): 0〜100
+
+    Returns:
+        float: フレーム時間(ミリ秒)
+    """
+    if not _sorted:
+        return 0.0
+    k = max(0, min(len(_sorted) - 1, int(p / 100.0 * len(_sorted) + 0.5) - 1))
+    return _sorted[k] * 1000.0 / _pf
+
+
+def get_stats():
+    """
+    フレーム時間の統計を取得する
+
+    Note:
+        時間はミリ秒。jitterは隣り合うフレームのフレーム時間の差の絶対値の平均。
+        over_budgetは記録しているフレームのうち、予算(set_budget())を超えたフレームの数。
+
+    Returns:
+        dict: count, fps, mean, p50, p95, p99, max, jitter, over_budget, budget
+    """
+    n = len(_durations)
+    to_ms = 1000.0 / _pf if _pf else 0.0
+    return {
+        "count": n,
+        "fps": _fps,
+        "mean": _total * to_ms / n if n else 0.0,
+        "p50": get_percentile(50),
+        "p95": get_percentile(95),
+        "p99": get_percentile(99),
+        "max": _sorted[-1] * to_ms if _sorted else 0.0,
+        "jitter": _diff_total * to_ms / (n - 1) if n > 1 else 0.0,
+        "over_budget": _over_budget,
+        "budget": _budget_ticks * to_ms,
+    }
+
+
+def get_limiter_stats():
+    """
+    wait()の待ち方の統計を取得する
+
+    Note:
+        時間はミリ秒で、reset_stats()からの1フレームあたりの平均。
+        cpu_ratioは待っている時間のうちCPUを使っていた割合(1ならずっとビジーループ)。
+        late_framesは締め切りの前に待ち始めたのに、締め切りからtolerance以上遅れて戻ったフレームの数。
+
+    Returns:
+        dict: mode, tolerance, margin, overshoot, overshoot_dev, wait, sleep, spin, cpu, cpu_ratio, late_frames
+    """
+    to_ms = 1000.0 / _pf if _pf else 0.0
+    n = _wait_frames or 1
+    return {
+        "mode": _limiter,
+        "tolerance": _tolerance_ms,
+        "margin": _margin_ticks * to_ms,
+        "overshoot": _overshoot_ms,
+        "overshoot_dev": _overshoot_dev_ms,
+        "wait": _wait_ticks * to_ms / n,
+        "sleep": _sleep_ticks * to_ms / n,
+        "spin": _spin_ticks * to_ms / n,
+        "cpu": _wait_cpu * 1000.0 / n,
+        "cpu_ratio": _wait_cpu / (_wait_ticks / _pf) if _wait_ticks else 0.0,
+        "late_frames": _late_frames,
+    }
+
+
+def set_limiter(mode=HYBRID, tolerance_ms=DEFAULT_TOLERANCE_MS):
+    """
+    wait()の待ち方を設定する
+
+    Note:
+        HYBRIDは寝過ごしの見積もりからtolerance_msを引いた分だけ締め切りの手前で起き、残りをビジーループで待つ。
+        tolerance_msを大きくするとビジーループが減ってCPUを使わなくなるが、フレームの間隔のばらつきは大きくなる。
+
+    Args:
+        mode (int): HYBRID、SPIN、SLEEPのどれか
+        tolerance_ms (float): 締め切りから遅れてもよい時間(ミリ秒)
+    """
+    global _limiter, _tolerance_ms
+    _limiter = mode
+    _tolerance_ms = max(0.0, float(tolerance_ms))
+    _update_margin()
+
+
+def get_histogram():
+    """
+    フレーム時間のヒストグラムを取得する
+
+    Note:
+        i番目の区間はbin_ms * i以上bin_ms * (i + 1)未満のフレームの数。最後の区間はそれ以上全部。
+
+    Returns:
+        tuple: (区間の幅(ミリ秒), 各区間のフレーム数のリスト)
+    """
+    return _bin_ms, list(_bins)
+
+
+def set_history_size(size):
+    """
+    記録するフレーム数を設定する
+
+    Note:
+        記録はリセットされる。
+
+    Args:
+        size (int): フレーム数
+    """
+    global _history_size
+    _history_size = max(1, int(size))
+    reset_stats()
+
+
+def set_histogram(bin_ms=DEFAULT_BIN_MS, bins=DEFAULT_BINS):
+    """
+    ヒストグラムの区間を設定する
+
+    Args:
+        bin_ms (float): 1区間の幅(ミリ秒)
+        bins (int): 区間の数
+    """
+    global _bin_ms, _bins
+    _bin_ms = float(bin_ms)
+    _bins = [0] * max(1, int(bins))
+    _update_ticks()
+    for ticks in _durations:
+        _bins[_bin(ticks)] += 1
+
+
+def set_budget(ms=None, tolerance=DEFAULT_BUDGET_TOLERANCE):
+    """
+    フレーム時間の予算を設定する
+
+    Note:
+        ms * (1 + tolerance)より長いフレームを予算超過として数える。
+
+    Args:
+        ms (float): 予算(ミリ秒)。Noneならwait()に渡したfpsのフレーム時間
+        tolerance (float): 許容する割合
+    """
+    global _budget_ms, _budget_tolerance
+    _budget_ms = ms
+    _budget_tolerance = tolerance
+    _update_ticks()
+
+
+def reset_stats():
+    """
+    記録したフレーム時間を消す
+    """
+    global _fps, _total, _diff_total, _over_budget
+    global _wait_frames, _wait_ticks, _sleep_ticks, _spin_ticks, _wait_cpu, _late_frames
+    _wait_frames = _wait_ticks = _sleep_ticks = _spin_ticks = _late_frames = 0
+    _wait_cpu = 0.0
+    _durations.clear()
+    del _sorted[:]
+    _total = 0
+    _diff_total = 0
+    _over_budget = 0
+    _fps = 0
+    for i in range(len(_bins)):
+        _bins[i] = 0
+    _update_ticks()
+    _update_margin()
+
+
+def _set_target(fps):
+    global _target_fps
+    _target_fps = fps
+    if _budget_ms is None:
+        _update_ticks()
+
+
+def _update_ticks():
+    """
+    ミリ秒の設定をカウンタの値に直し、予算超過のフレーム数を数え直す
+    """
+    global _bin_ticks, _budget_ticks, _over_budget
+    _bin_ticks = max(1, int(_bin_ms * _pf / 1000.0))
+    budget_ms = _budget_ms
+    if budget_ms is None:
+        budget_ms = 1000.0 / _target_fps if _target_fps > 0 else 0
+    _budget_ticks = int(budget_ms * (1.0 + _budget_tolerance) * _pf / 1000.0)
+    _over_budget = sum(1 for ticks in _durations if ticks > _budget_ticks) if _budget_ticks else 0
+
+
+def _update_margin():
+    global _margin_ticks
+    if _limiter == SLEEP:
+        _margin_ticks = 0
+        return
+    margin_ms = _overshoot_ms + 2 * _overshoot_dev_ms - _tolerance_ms
+    _margin_ticks = int(max(0.0, margin_ms) * _pf / 1000.0)
+
+
+def _sleep_until(next_count, now_count):
+    """
+    締め切りのマージン分手前までスリープし、寝過ごしの見積もりを更新する
+
+    Returns:
+        int: 起きたときのカウンタの値
+    """
+    global _overshoot_ms, _overshoot_dev_ms
+    if _limiter == SPIN:
+        return now_count
+    request = next_count - _margin_ticks - now_count
+    if request * 1000.0 < _MIN_SLEEP_MS * _pf:
+        return now_count
+    time.sleep(request / _pf)
+    after_count = SDL_GetPerformanceCounter()
+    overshoot = (after_count - now_count - request) * 1000.0 / _pf
+    # 寝過ごしが増えたときはすぐに、減ったときはゆっくり見積もりを合わせる
+    rate = 0.25 if overshoot > _overshoot_ms else 0.05
+    _overshoot_dev_ms += rate * (abs(overshoot - _overshoot_ms) - _overshoot_dev_ms)
+    _overshoot_ms += rate * (overshoot - _overshoot_ms)
+    _update_margin()
+    return after_count
+
+
+def _record_wait(start_count, spin_count, end_count, next_count, cpu):
+    global _wait_frames, _wait_ticks, _sleep_ticks, _spin_ticks, _wait_cpu, _late_frames
+    _wait_frames += 1
+    _wait_ticks += end_count - start_count
+    _sleep_ticks += spin_count - start_count
+    _spin_ticks += end_count - spin_count
+    _wait_cpu += cpu
+    if start_count < next_count and (end_count - next_count) * 1000.0 > _tolerance_ms * _pf:
+        _late_frames += 1
+
+
+def _bin(ticks):
+    return min(int(ticks // _bin_ticks), len(_bins) - 1)
+
+
+def _record(ticks):
+    """
+    フレーム時間を記録し、集計を更新する
+    """
+    global _fps, _total, _diff_total, _over_budget
+    if len(_durations) >= _history_size:
+        old = _durations.popleft()
+        if _durations:
+            _diff_total -= abs(_durations[0] - old)
+        del _sorted[bisect_left(_sorted, old)]
+        _total -= old
+        _bins[_bin(old)] -= 1
+        if _budget_ticks and old > _budget_ticks:
+            _over_budget -= 1
+    if _durations:
+        _diff_total += abs(ticks - _durations[-1])
+    _durations.append(ticks)
+    insort(_sorted, ticks)
+    _total += ticks
+    _bins[_bin(ticks)] += 1
+    if _budget_ticks and ticks > _budget_ticks:
+        _over_budget += 1
+    _fps = _pf * len(_durations) / _total if _total else 0
@@ -4,6 +4,7 @@
 #
 
 import ctypes
+import os
 
 from sdl2 import *
 from sdl2.sdlimage import *
@@ -11,26 +12,47 @@ from sdl2.sdlmixer import *
 from sdl2.sdlttf import *
 
 from . import _common as g
+from . import _geometry
+from . import _scratch
+from . import camera
 from . import fps
+from . import layer
 from . import log
+from . import profiler
+from . import render_queue
+from . import texture_cache
+from . import texture_state
+from . import vsync as _vsync
 
 
-def init(img_init_flags=0, mix_init_flags=0):
+def init(img_init_flags=0, mix_init_flags=0, headless=False):
     """
     モジュール全体の初期化
 
     Note:
         Windowsのdllだと何故かmix_init_flagsに0以外を渡すと失敗する。
         ファイルを読み込むときに初期化されるので大きな問題はない？
+        headlessをTrueにすると、ディスプレイやGPU、サウンドデバイスのない環境(ビルドマシンやサーバー)でも動くように、
+        ダミーのビデオドライバとオーディオドライバを使う。create_window()は見えないウィンドウと
+        ソフトウェアレンダラを作るので、描画結果はread_pixels()やsave_screen()で取り出す。
+        環境変数SDL_VIDEODRIVER、SDL_AUDIODRIVERが設定されていればそちらを使う。
     
     Args:
         img_init_flags: SDL_Imageの初期化フラグ
         mix_init_flags: SDL_Mixerの初期化フラグ
+        headless (bool): ヘッドレスモードにするか
 
     Returns:
         bool: True:成功 False:失敗
     """
-    res = SDL_Init(g.sdl_init_flags)
+    g.headless = headless
+    init_flags = g.sdl_init_flags
+    if headless:
+        # SDL_Initより前に設定する必要がある
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        init_flags = g.headless_init_flags
+    res = SDL_Init(init_flags)
     if res != 0:
         log.write("SDL_Init failed. error={}".format(SDL_GetError(res)))
         quit()
@@ -66,6 +88,8 @@ def init(img_init_flags=0, mix_init_flags=0):
     # fps制御モジュールの初期化
     fps._init()
 
+    return True
+
 
 def quit():
     """
@@ -74,8 +98,15 @@ def quit():
     Returns:
         bool: True:成功 False:失敗
     """
+    if g.loader_shutdown is not None:
+        g.loader_shutdown()
+
+    # レンダラを破棄するとテクスチャも開放されるので、キャッシュと覚えている状態を先に捨てる
+    texture_cache._reset()
+    texture_state.invalidate()
     SDL_DestroyWindow(g.main_window)
     SDL_DestroyRenderer(g.main_window_renderer)
+    _scratch.shrink()
 
     Mix_CloseAudio()
 
@@ -92,7 +123,8 @@ def create_window(width=640, height=480, caption="SDL Window",
                   x=SDL_WINDOWPOS_CENTERED,
                   y=SDL_WINDOWPOS_CENTERED,
                   window_flags=SDL_WINDOW_SHOWN,
-                  renderer_flags=0):
+                  renderer_flags=0,
+                  vsync=False):
     """
     メインウィンドウを生成する
     
@@ -103,10 +135,20 @@ def create_window(width=640, height=480, caption="SDL Window",
         y: ウィンドウのスクリーン座標系のY座標, SDL_WINDOWPOS_CENTERED, または SDL_WINDOWPOS_UNDEFINED
         window_flags: SDL_WindowFlagsの論理和
         renderer_flags: SDL_RendererFlagsの論理和(0だとSDL_RENDERER_ACCELERATEDになるらしい？
+        vsync: 垂直同期を使うか(vsyncモジュール参照)。Trueならfps.wait()は垂直同期に任せて待たない
+
+    Note:
+        ヘッドレスモードでは、ウィンドウは表示せず、レンダラはSDL_RENDERER_SOFTWAREにする
+        (垂直同期は使わないので、描画時間がそのまま計れる)。
     
     Returns:
         bool: True:成功 False:失敗
     """
+    if g.headless:
+        window_flags = (window_flags & ~SDL_WINDOW_SHOWN) | SDL_WINDOW_HIDDEN
+        renderer_flags = (renderer_flags & SDL_RENDERER_TARGETTEXTURE) | SDL_RENDERER_SOFTWARE
+    elif vsync:
+        renderer_flags |= SDL_RENDERER_PRESENTVSYNC
     window = SDL_CreateWindow(caption.encode("utf-8"),
                               x, y, int(width), int(height), window_flags)
     if not window:
@@ -122,6 +164,18 @@ def create_window(width=640, height=480, caption="SDL Window",
     g.main_window = window
     g.main_window_renderer = renderer
     g.current_renderer = renderer
+    _vsync._on_create_renderer(renderer, bool(renderer_flags & SDL_RENDERER_PRESENTVSYNC))
+    return True
+
+
+def is_headless():
+    """
+    ヘッドレスモードか調べる
+
+    Returns:
+        bool: True:ヘッドレスモード False:通常
+    """
+    return g.headless
 
 
 def process_events():
@@ -136,6 +190,8 @@ def process_events():
     Returns:
         bool: False: SDL_QUITが処理された True: それ以外
     """
+    if g.profiler_enabled:
+        profiler.begin("events")
     retval = True
     event = SDL_Event()
     while SDL_PollEvent(ctypes.byref(event)) != 0:
@@ -148,6 +204,10 @@ def process_events():
         if event.type == SDL_QUIT:
             retval = False
 
+        # 描画先テクスチャの内容が失われたのでレイヤーを描き直す
+        elif event.type == SDL_RENDER_TARGETS_RESET or event.type == SDL_RENDER_DEVICE_RESET:
+            layer._mark_all_dirty()
+
         # ここからキーボード入力
         elif event.type == SDL_KEYDOWN:
             # キーが押されたらフラグを立てる
@@ -174,6 +234,8 @@ def process_events():
             g.mouse_x = event.button.x
             g.mouse_y = event.button.y
 
+    if g.profiler_enabled:
+        profiler.end()
     return retval
 
 
@@ -274,8 +336,121 @@ def clear_screen():
 def update_screen():
     """
     メインウィンドウの変更を表示する
+
+    Note:
+        遅延描画モードなら溜まっている描画命令を描画してから表示する。
+        loaderで読み込み中のものがあれば、表示した後にテクスチャの作成などを行う。
+    """
+    if g.render_queue_enabled:
+        if g.profiler_enabled:
+            profiler.begin("draw")
+            render_queue.flush()
+            profiler.end()
+        else:
+            render_queue.flush()
+    _present_frame()
+
+
+def _present_frame():
+    """
+    表示してフレームを終える(溜まっている描画命令は描画しない。update_screen()、pipeline用)
     """
-    SDL_RenderPresent(g.main_window_renderer)
+    render_queue._end_frame()
+    camera._end_frame()
+    if g.profiler_enabled:
+        profiler.begin("present")
+        _vsync._present(g.main_window_renderer)
+        profiler.end()
+        profiler._end_frame()
+    else:
+        _vsync._present(g.main_window_renderer)
+    if g.loader_update is not None:
+        g.loader_update()
+
+
+def read_pixels(rect=None, out=None):
+    """
+    描画先のピクセルを読み出す
+
+    Note:
+        ヘッドレスモードでの画像の確認やベンチマーク、サムネイルの作成用。遅いので毎フレームは呼ばないこと。
+        SDL_RenderReadPixelsで現在の描画先(Texture.target()の中ならそのテクスチャ)から読み出す。
+        遅延描画モードなら溜まっている描画命令を先に描画する。
+        numpyがあれば(高さ, 幅, 4)のuint8配列(red, green, blue, alphaの順)、なければ同じ並びのbytearrayを返す。
+
+    Args:
+        rect (Rect): 読み出す範囲。Noneなら全体
+        out (numpy.ndarray): 結果を書き込む配列(同じ形のC連続のuint8配列)。Noneなら新しく作る
+
+    Returns:
+        numpy.ndarray or bytearray: ピクセル。失敗時はNone
+    """
+    renderer = g.current_renderer
+    if g.render_queue_enabled:
+        render_queue.flush()
+    if rect is None:
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        if SDL_GetRendererOutputSize(renderer, ctypes.byref(w), ctypes.byref(h)) < 0:
+            log.write("read_pixels() failed. error={}".format(SDL_GetError()))
+            return None
+        sdl_rect = None
+        w = w.value
+        h = h.value
+    else:
+        sdl_rect = SDL_Rect(int(rect.x), int(rect.y), int(rect.w), int(rect.h))
+        w = sdl_rect.w
+        h = sdl_rect.h
+
+    np = _geometry.np
+    if out is None:
+        out = np.empty((h, w, 4), dtype=np.uint8) if np is not None else bytearray(w * h * 4)
+    buf = (ctypes.c_ubyte * (w * h * 4)).from_buffer(out)
+    # メモリ上でR, G, B, Aの順に並ぶフォーマット
+    fmt = SDL_PIXELFORMAT_RGBA32
+    if SDL_RenderReadPixels(renderer, sdl_rect, fmt, buf, w * 4) < 0:
+        log.write("read_pixels() failed. error={}".format(SDL_GetError()))
+        return None
+    return out
+
+
+def save_screen(filename, rect=None):
+    """
+    描画先をpng画像として保存する
+
+    Note:
+        ヘッドレスモードでのサムネイルやリプレイの書き出し用。
+
+    Args:
+        filename (str): 保存するファイルのパス(utf-8)
+        rect (Rect): 保存する範囲。Noneなら全体
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    pixels = read_pixels(rect)
+    if pixels is None:
+        return False
+    if rect is None:
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        SDL_GetRendererOutputSize(g.current_renderer, ctypes.byref(w), ctypes.byref(h))
+        w = w.value
+        h = h.value
+    else:
+        w = int(rect.w)
+        h = int(rect.h)
+    buf = (ctypes.c_ubyte * (w * h * 4)).from_buffer(pixels)
+    surface = SDL_CreateRGBSurfaceWithFormatFrom(buf, w, h, 32, w * 4, SDL_PIXELFORMAT_RGBA32)
+    if not surface:
+        log.write("save_screen() failed. error={}".format(SDL_GetError()))
+        return False
+    res = IMG_SavePNG(surface, filename.encode("utf-8"))
+    SDL_FreeSurface(surface)
+    if res < 0:
+        log.write("save_screen() failed. error={}".format(IMG_GetError()))
+        return False
+    return True
 
 
 def set_num_channel(num):
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+描画内容をテクスチャにキャッシュしておくレイヤーを定義します。
+"""
+
+import weakref
+
+from sdl2 import *
+
+from . import log
+from . import texture_state
+from .texture import *
+
+_layers = weakref.WeakSet()  # 作成されたレイヤー(描画先のリセット時にすべて描き直すため)
+
+# 透明なテクスチャにアルファブレンドで描くと色にアルファが乗算された状態になるので、
+# 画面に描くときは乗算済みアルファのブレンドモードを使う
+PREMULTIPLIED_BLEND = SDL_ComposeCustomBlendMode(SDL_BLENDFACTOR_ONE, SDL_BLENDFACTOR_ONE_MINUS_SRC_ALPHA,
+                                                 SDL_BLENDOPERATION_ADD, SDL_BLENDFACTOR_ONE,
+                                                 SDL_BLENDFACTOR_ONE_MINUS_SRC_ALPHA, SDL_BLENDOPERATION_ADD)
+
+
+def _mark_all_dirty():
+    """
+    すべてのレイヤーを描き直すようにする
+
+    Note:
+        SDL_RENDER_TARGETS_RESETなどで描画先テクスチャの内容が失われたときにprocess_events()から呼ばれる。
+    """
+    for layer in _layers:
+        layer.mark_dirty()
+
+
+class Layer:
+    """
+    背景やHUDなど、あまり変化しない描画内容をテクスチャにキャッシュしておくクラス
+
+    Note:
+        draw()を呼ぶと、dirtyなときか更新間隔が過ぎたときだけ描画関数でテクスチャに描き直し、
+        それ以外はキャッシュしたテクスチャを1回コピーするだけで済ませる。
+        描画関数はLayerを引数に呼ばれ、座標はレイヤーの左上が(0, 0)になる。
+
+        例:
+            def draw_background(layer):
+                for x, y in tiles:
+                    tile.draw(x, y)
+
+            bg = Layer(640, 480, draw_background)
+            while process_events():
+                clear_screen()
+                bg.draw(0, 0)
+                update_screen()
+    """
+
+    def __init__(self, w, h, draw_func=None, refresh_rate=0, clear_color=(0, 0, 0, 0)):
+        """
+        コンストラクタ
+
+        Args:
+            w (int): 幅
+            h (int): 高さ
+            draw_func (function): 内容を描画する関数。Layerを引数に呼ばれる
+            refresh_rate (float): 1秒あたりの描き直しの回数。0ならmark_dirty()されたときだけ描き直す
+            clear_color (tuple): 描き直す前に塗りつぶす色(red, green, blue, alpha)
+        """
+        self.__texture = Texture()
+        if not self.__texture.create(w, h, SDL_TEXTUREACCESS_TARGET):
+            log.error_log("failed", "__init__", "Layer")
+        # 乗算済みアルファのブレンドモードに対応していないレンダラ(softwareなど)では普通のアルファブレンドにする
+        texture = self.__texture.get_texture()
+        mode = PREMULTIPLIED_BLEND if texture and SDL_SetTextureBlendMode(texture, PREMULTIPLIED_BLEND) == 0 \
+            else SDL_BLENDMODE_BLEND
+        texture_state.invalidate(texture)
+        self.__texture.set_blend_mode(mode)
+        self.__draw_func = draw_func
+        self.__clear_color = clear_color
+        self.__dirty = True
+        self.__interval = 0
+        self.__last_count = 0
+        self.__redraw_count = 0
+        self.set_refresh_rate(refresh_rate)
+        _layers.add(self)
+
+    def set_draw_func(self, draw_func):
+        """
+        内容を描画する関数を設定する
+
+        Args:
+            draw_func (function): Layerを引数に呼ばれる関数
+        """
+        self.__draw_func = draw_func
+        self.__dirty = True
+
+    def set_refresh_rate(self, refresh_rate):
+        """
+        描き直しの頻度を設定する
+
+        Args:
+            refresh_rate (float): 1秒あたりの描き直しの回数。0ならmark_dirty()されたときだけ描き直す
+        """
+        if refresh_rate > 0:
+            self.__interval = int(SDL_GetPerformanceFrequency() / refresh_rate)
+        else:
+            self.__interval = 0
+
+    def mark_dirty(self):
+        """
+        次のdraw()で描き直すようにする
+        """
+        self.__dirty = True
+
+    def is_dirty(self):
+        """
+        次のdraw()で描き直すか調べる
+
+        Returns:
+            bool: True:描き直す False:キャッシュを使う
+        """
+        return self.__dirty
+
+    def refresh(self):
+        """
+        すぐに描画関数でテクスチャに描き直す
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        self.__dirty = False
+        self.__last_count = SDL_GetPerformanceCounter()
+        self.__redraw_count += 1
+        with self.__texture.target(self.__clear_color) as ok:
+            if ok and self.__draw_func is not None:
+                self.__draw_func(self)
+        return ok
+
+    def draw(self, x=0, y=0):
+        """
+        レイヤーを描画する
+
+        Note:
+            必要なら描き直してから、キャッシュしたテクスチャを描画する。
+            指定座標はレイヤーの左上端になる。
+
+        Args:
+            x (int): X座標
+            y (int): Y座標
+        """
+        if self.__dirty or (self.__interval > 0 and
+                            SDL_GetPerformanceCounter() - self.__last_count >= self.__interval):
+            self.refresh()
+        self.__texture.draw(x, y)
+
+    def get_texture(self):
+        """
+        描画内容をキャッシュしているテクスチャを取得する
+
+        Note:
+            set_blend_alphaなどでレイヤー全体の描画方法を変えられる。
+
+        Returns:
+            Texture: テクスチャ
+        """
+        return self.__texture
+
+    def get_redraw_count(self):
+        """
+        描き直した回数を取得する
+
+        Returns:
+            int: 回数
+        """
+        return self.__redraw_count
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""
+画像や音声をバックグラウンドで読み込む
+
+Note:
+    ファイルの読み込みとデコードはスレッドプールで行い、
+    テクスチャの作成などレンダラを使う処理はupdate_screen()の中でメインスレッドで行う。
+    メインスレッドでの処理は1フレームあたりset_time_budget()で設定した時間までにする。
+    load_xxx()はすぐにLoadHandleを返すので、ロード画面を表示しながらis_done()で完了を待つ。
+
+    例:
+        handle = loader.load_texture("image.png")
+        while process_events():
+            if handle.is_done():
+                texture = handle.get()
+            ...
+            update_screen()
+"""
+
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from sdl2 import *
+from sdl2.sdlimage import *
+from sdl2.sdlmixer import *
+
+from . import _atlas_file
+from . import _common as g
+from . import log
+from . import texture_cache
+from .font import Font
+from .music import Music
+from .sound import Sound
+from .sprite_sheet import SpriteSheet
+from .texture import Texture, TextureAtlas
+
+DEFAULT_TIME_BUDGET = 4.0  # 1フレームでメインスレッドの処理に使う時間のデフォルト(ミリ秒)
+
+_executor = None
+_workers = min(4, os.cpu_count() or 1)
+_time_budget = DEFAULT_TIME_BUDGET / 1000.0
+_pending = deque()  # 完了待ちのLoadHandle(要求された順)
+
+_total = 0  # 要求された数
+_done = 0  # 完了した数
+
+
+class LoadHandle:
+    """
+    バックグラウンドで読み込み中のオブジェクト
+
+    Note:
+        完了するとget()で読み込んだオブジェクト(Textureなど)を取得できる。
+    """
+
+    def __init__(self, filename, decode, finish, free=None):
+        """
+        コンストラクタ(loaderモジュールの内部用)
+
+        Args:
+            filename (str): 読み込むファイルのパス
+            decode (function): ワーカースレッドで実行する関数
+            finish (function): decodeの結果を受け取ってメインスレッドで実行する関数
+            free (function): finishを呼ばずに捨てるとき、decodeの結果を開放する関数。Noneなら何もしない
+        """
+        self.__filename = filename
+        self.__finish = finish
+        self.__free = free
+        self.__future = _get_executor().submit(decode)
+        self.__result = None
+        self.__done = False
+        self.__failed = False
+
+    def is_done(self):
+        """
+        読み込みが完了したか調べる
+
+        Returns:
+            bool: True:完了(失敗も含む) False:読み込み中
+        """
+        return self.__done
+
+    def is_failed(self):
+        """
+        読み込みに失敗したか調べる
+
+        Returns:
+            bool: True:失敗 False:成功または読み込み中
+        """
+        return self.__failed
+
+    def get(self):
+        """
+        読み込んだオブジェクトを取得する
+
+        Returns:
+            object: Texture、TextureAtlas、SpriteSheet、Sound、Music、Fontのどれか。未完了や失敗時はNone
+        """
+        return self.__result
+
+    def get_filename(self):
+        """
+        読み込むファイルのパスを取得する
+
+        Returns:
+            str: ファイルのパス
+        """
+        return self.__filename
+
+    def _is_decoded(self):
+        return self.__future.done()
+
+    def _finish(self):
+        """
+        デコード結果からオブジェクトを作る(メインスレッドで呼ぶ)
+        """
+        global _done
+        try:
+            self.__result = self.__finish(self.__future.result())
+        except Exception as e:
+            log.error_log(e, "load", "loader", self.__filename)
+            self.__result = None
+        self.__failed = self.__result is None
+        self.__done = True
+        _done += 1
+
+    def _discard(self):
+        """
+        デコード結果を仕上げずに開放する(shutdown用。デコードが終わってから呼ぶ)
+        """
+        if self.__free is None or self.__future.exception() is not None:
+            return
+        try:
+            self.__free(self.__future.result())
+        except Exception as e:
+            log.error_log(e, "shutdown", "loader", self.__filename)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_workers)
+        g.loader_shutdown = shutdown
+    return _executor
+
+
+def _request(filename, decode, finish, free=None):
+    global _total, _done
+    if _done == _total:
+        # 前回の読み込みが全部終わっていれば進捗を数え直す
+        _total = 0
+        _done = 0
+    handle = LoadHandle(filename, decode, finish, free)
+    _pending.append(handle)
+    _total += 1
+    g.loader_update = update
+    return handle
+
+
+def _decode_image(filename):
+    """
+    画像ファイルをSDL_Surfaceに読み込む(ワーカースレッド)
+    """
+    surface = IMG_Load(filename.encode("utf-8"))
+    if not surface:
+        raise IOError(IMG_GetError().decode("utf-8", "replace"))
+    return surface
+
+
+def _upload(filename, renderer, surface):
+    """
+    サーフェスからテクスチャを作ってtexture_cacheに入れる(メインスレッド)
+    """
+    try:
+        if not texture_cache.add_surface(filename, renderer, surface):
+            raise IOError(SDL_GetError().decode("utf-8", "replace"))
+    finally:
+        SDL_FreeSurface(surface)
+
+
+def _atlas_image_file(filename):
+    """
+    アトラスのjsonファイルから画像ファイルのパスを求める(TextureAtlas.loadと同じ)
+    """
+    if _atlas_file.is_compiled(filename):
+        return _atlas_file.read(filename)[3][0]
+    with open(filename) as fi:
+        data = json.load(fi)
+    path, fn = os.path.split(filename)
+    return path + os.path.sep + data["meta"]["image"]
+
+
+def load_texture(filename):
+    """
+    画像をバックグラウンドで読み込んでTextureを作る
+
+    Args:
+        filename (str): 画像ファイルのパス(utf-8)
+
+    Returns:
+        LoadHandle: 完了するとget()でTextureを取得できる
+    """
+    def finish(surface):
+        _upload(filename, g.current_renderer, surface)
+        texture = Texture(filename)
+        return texture if texture.get_texture() else None
+
+    return _request(filename, lambda: _decode_image(filename), finish, SDL_FreeSurface)
+
+
+def load_texture_atlas(filename):
+    """
+    テクスチャアトラスをバックグラウンドで読み込む
+
+    Args:
+        filename (str): jsonファイルまたはコンパイル済みのファイルのパス(utf-8)
+
+    Returns:
+        LoadHandle: 完了するとget()でTextureAtlasを取得できる
+    """
+    def decode():
+        image_file = _atlas_image_file(filename)
+        return image_file, _decode_image(image_file)
+
+    def finish(result):
+        image_file, surface = result
+        _upload(image_file, g.main_window_renderer, surface)
+        atlas = TextureAtlas(filename)
+        return atlas if atlas.get_texture() else None
+
+    def free(result):
+        SDL_FreeSurface(result[1])
+
+    return _request(filename, decode, finish, free)
+
+
+def load_sprite_sheet(filenames):
+    """
+    複数の画像をバックグラウンドで読み込んでSpriteSheetを作る
+
+    Note:
+        テクスチャはfilenamesの順にadd_texture()される。スプライトは完了後にadd_sprite()で追加する。
+
+    Args:
+        filenames (list): 画像ファイルのパス(utf-8)のリスト
+
+    Returns:
+        LoadHandle: 完了するとget()でSpriteSheetを取得できる
+    """
+    filenames = list(filenames)
+
+    def decode():
+        surfaces = []
+        try:
+            for filename in filenames:
+                surfaces.append(_decode_image(filename))
+        except Exception:
+            for surface in surfaces:
+                SDL_FreeSurface(surface)
+            raise
+        return surfaces
+
+    def finish(surfaces):
+        for filename, surface in zip(filenames, surfaces):
+            _upload(filename, g.current_renderer, surface)
+        sheet = SpriteSheet()
+        for filename in filenames:
+            sheet.add_texture(filename)
+        return sheet
+
+    def free(surfaces):
+        for surface in surfaces:
+            SDL_FreeSurface(surface)
+
+    return _request(", ".join(filenames), decode, finish, free)
+
+
+def load_sound(filename):
+    """
+    サウンドをバックグラウンドで読み込む
+
+    Args:
+        filename (str): サウンドファイルのパス(utf-8)
+
+    Returns:
+        LoadHandle: 完了するとget()でSoundを取得できる
+    """
+    def decode():
+        chunk = Mix_LoadWAV(filename.encode("utf-8"))
+        if not chunk:
+            raise IOError(Mix_GetError().decode("utf-8", "replace"))
+        return chunk
+
+    def finish(chunk):
+        sound = Sound()
+        sound._set_chunk(chunk)
+        return sound
+
+    return _request(filename, decode, finish, Mix_FreeChunk)
+
+
+def load_music(filename):
+    """
+    音楽をバックグラウンドで読み込む
+
+    Args:
+        filename (str): 音楽ファイルのパス(utf-8)
+
+    Returns:
+        LoadHandle: 完了するとget()でMusicを取得できる
+    """
+    def decode():
+        music = Mix_LoadMUS(filename.encode("utf-8"))
+        if not music:
+            raise IOError(Mix_GetError().decode("utf-8", "replace"))
+        return music
+
+    def finish(music):
+        obj = Music()
+        obj._set_music(music)
+        return obj
+
+    return _request(filename, decode, finish, Mix_FreeMusic)
+
+
+def load_font(filename, size=20):
+    """
+    フォントをバックグラウンドで読み込む
+
+    Note:
+        FreeTypeはスレッドセーフではないので、ワーカースレッドではファイルの読み込みだけを行い、
+        フォントを開くのはメインスレッドで行う。
+
+    Args:
+        filename (str): ttfファイルのパス(utf-8)
+        size (int): フォントサイズ
+
+    Returns:
+        LoadHandle: 完了するとget()でFontを取得できる
+    """
+    def decode():
+        with open(filename, "rb") as f:
+            return f.read()
+
+    def finish(data):
+        font = Font()
+        return font if font._load_data(data, size) else None
+
+    return _request(filename, decode, finish)
+
+
+def update(time_budget=None):
+    """
+    デコードが終わったものをメインスレッドで仕上げる
+
+    Note:
+        update_screen()から自動的に呼ばれる。
+        要求された順に処理し、time_budgetを超えたら残りは次のフレームに回す(最低1つは処理する)。
+
+    Args:
+        time_budget (float): 使ってよい時間(ミリ秒)。Noneならset_time_budget()の値
+    """
+    budget = _time_budget if time_budget is None else time_budget / 1000.0
+    start = time.perf_counter()
+    while _pending and _pending[0]._is_decoded():
+        _pending.popleft()._finish()
+        if time.perf_counter() - start >= budget:
+            break
+    if not _pending:
+        g.loader_update = None
+
+
+def wait_all():
+    """
+    要求したものがすべて完了するまで待つ
+    """
+    while _pending:
+        if not _pending[0]._is_decoded():
+            time.sleep(0.001)
+        update(float("inf"))
+
+
+def set_time_budget(ms):
+    """
+    1フレームでメインスレッドの処理に使う時間を設定する
+
+    Args:
+        ms (float): ミリ秒
+    """
+    global _time_budget
+    _time_budget = ms / 1000.0
+
+
+def set_workers(num):
+    """
+    ワーカースレッドの数を設定する
+
+    Note:
+        最初にload_xxx()を呼ぶ前に設定すること。
+
+    Args:
+        num (int): スレッド数
+    """
+    global _workers
+    _workers = max(1, int(num))
+
+
+def get_progress():
+    """
+    読み込みの進捗を取得する
+
+    Note:
+        すべて完了した後に新しく要求すると0から数え直す。
+
+    Returns:
+        tuple (int, int): (完了した数, 要求された数)
+    """
+    return _done, _total
+
+
+def is_busy():
+    """
+    読み込み中のものがあるか調べる
+
+    Returns:
+        bool: True:読み込み中 False:すべて完了
+    """
+    return len(_pending) > 0
+
+
+def shutdown():
+    """
+    ワーカースレッドを終了する
+
+    Note:
+        quit()から呼ばれる。読み込み中のものは完了を待ち、
+        デコードしたがまだ仕上げていないもの(サーフェス、チャンク、ミュージック)を開放してから捨てる。
+        フォントはワーカーではファイルを読むだけなので開放するものはない。
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    while _pending:
+        _pending.popleft()._discard()
+    g.loader_update = None
+    g.loader_shutdown = None
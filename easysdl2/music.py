@@ -88,6 +88,17 @@ class Music():
         self.__music = music
         return True
 
+    def _set_music(self, music):
+        """
+        読み込み済みのMix_Musicを設定する(loader用)
+
+        Args:
+            music (Mix_Music): 音楽。このオブジェクトが開放する
+        """
+        if self.__music:
+            Mix_FreeMusic(self.__music)
+        self.__music = music
+
     def play(self, loops=-1):
         """
         音楽を再生する
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+更新と描画を別のスレッドで重ねて行うメインループ
+
+Note:
+    ワーカースレッドがupdate()を呼んでフレームN+1の描画命令を記録している間に、
+    メインスレッド(g.current_renderer、イベント、ウィンドウを扱う)がフレームNの描画命令を描画して表示する。
+    描画命令はrender_queue(遅延描画モード)の命令で、記録用と描画用の2つのリストを毎フレーム入れ替えて使う。
+    SDLの描画や表示の関数はGILを解放するので、CPUのコアに余裕があれば表示やドライバの時間が更新の時間に隠れる。
+    フレームNの表示はフレームN+1の更新と同時に行われるので、入力から表示までは1フレーム遅れる。
+
+    ワーカー(update)から呼んでよいもの(描画命令を記録するだけのもの):
+        Texture、TextureAtlas、SpriteSheetのdraw系のメソッド(draw、draw_center、draw_ex、draw_crop、draw_batchなど)
+        drawモジュールの図形(color、blend_mode、point、lineなど)
+        render_queue.set_layer()、カメラの移動(camera.set_camera()、Camera.set_positionなど)
+        TileMap.draw()、TileMap.set_tile()(draw()はカメラを設定しているか、view_w、view_hを指定した場合)
+        Animator、AnimationClip
+        check_key()、get_mouse_x()などの入力の状態の取得
+    メインスレッドでしか呼べないもの(SDLのレンダラ、ウィンドウ、イベントを使うもの):
+        テクスチャの作成と開放(Texture()、load()、Font.draw()、Font.get_texture()など)
+        テクスチャの状態の設定(set_blend_mode()、set_blend_alpha()、set_blend_color())
+        Texture.target()、Layer、render_queue.flush()、read_pixels()、clear_screen()、update_screen()、
+        process_events()、TileMap.invalidate()
+        サウンド、ミュージック
+    これらはmain()に渡した関数の中で行う。main()はワーカーが止まっている間に呼ばれ、
+    その中での描画(Font.draw()など)はワーカーが直前に記録したフレームに追加される。
+    ループ中にワーカーからTexture.target()、render_queue.flush()を呼ぶとエラーになる。
+    TileMapのチャンクの焼き直しはワーカーではなく、main()の後にメインスレッドで行われる
+    (書き換えたチャンクはそのフレームから新しい内容で表示され、新しく表示されるチャンクは次のフレームから表示される)。
+"""
+
+import threading
+
+from sdl2 import *
+
+from . import _common as g
+from . import fps
+from . import log
+from . import profiler
+from . import render_queue
+from .functions import _present_frame, clear_screen, process_events
+
+_RATE = 0.1  # 統計の平均の更新の割合
+
+
+class Pipeline:
+    """
+    更新と描画を別のスレッドで重ねて行うメインループ
+    """
+
+    def __init__(self, update, main=None, max_fps=0, clear=True):
+        """
+        コンストラクタ
+
+        Args:
+            update (function): ワーカースレッドで呼ぶ更新と描画の関数。update(dt)の形で、dtは前回からの時間(秒)。
+                Falseを返すとループを終える
+            main (function): メインスレッドで毎フレーム呼ぶ関数(引数なし)。Noneなら呼ばない
+            max_fps (int): 1秒あたりの表示回数の上限。0なら制限しない
+            clear (bool): 描画の前にclear_screen()を呼ぶか
+        """
+        self.__update = update
+        self.__main = main
+        self.__max_fps = max_fps
+        self.__clear = clear
+        self.__running = False
+        self.__pf = SDL_GetPerformanceFrequency()
+        self.__go = threading.Event()
+        self.__done = threading.Event()
+        self.__quit = False
+        self.__error = None
+        self.__prev_count = 0
+        self.__update_ticks = 0
+        self.__frames = 0
+        # 平均(ミリ秒)
+        self.__update_ms = 0.0
+        self.__replay_ms = 0.0
+        self.__sync_ms = 0.0
+
+    def is_running(self):
+        """
+        ループ中か調べる
+
+        Returns:
+            bool: True:ループ中 False:止まっている
+        """
+        return self.__running
+
+    def stop(self):
+        """
+        ループを止める(update、mainの中から呼べる)
+        """
+        self.__running = False
+
+    def get_stats(self):
+        """
+        パイプラインの統計を取得する
+
+        Note:
+            時間は最近のフレームの平均(ミリ秒)。
+            updateはワーカーの更新の時間、replayはメインスレッドで描画命令を描画した時間、
+            syncはメインスレッドがワーカーの更新の終わりを待った時間。
+            overlapはupdateのうち表示などと重ねられた割合(1ならメインスレッドは更新を待っていない)。
+
+        Returns:
+            dict: frames, update, replay, sync, overlap
+        """
+        overlap = 1.0 - self.__sync_ms / self.__update_ms if self.__update_ms > 0 else 0.0
+        return {
+            "frames": self.__frames,
+            "update": self.__update_ms,
+            "replay": self.__replay_ms,
+            "sync": self.__sync_ms,
+            "overlap": max(0.0, overlap),
+        }
+
+    def run(self):
+        """
+        process_events()がFalseを返すかstop()が呼ばれるまでループする
+
+        Returns:
+            bool: True:正常に終了 False:遅延描画モードが使えない
+        """
+        prev_enabled = g.render_queue_enabled
+        if not render_queue.enable(True):
+            log.error_log("render_queue is not available", "run", "Pipeline")
+            return False
+        render_queue.flush()
+        buffers = [[], []]
+        render_queue._swap(buffers[0])
+        recording = 0
+        self.__running = True
+        self.__quit = False
+        self.__error = None
+        self.__go.clear()
+        self.__done.clear()
+        self.__prev_count = SDL_GetPerformanceCounter()
+        g.pipeline_thread = threading.get_ident()
+        worker = threading.Thread(target=self.__worker, name="easysdl2-pipeline")
+        worker.daemon = True
+        worker.start()
+        self.__go.set()
+        try:
+            while True:
+                # ワーカーがフレームを記録し終わるのを待つ
+                if g.profiler_enabled:
+                    profiler.begin("sync")
+                start = SDL_GetPerformanceCounter()
+                self.__done.wait()
+                self.__done.clear()
+                self.__sync_ms += _RATE * ((SDL_GetPerformanceCounter() - start) * 1000.0 / self.__pf -
+                                           self.__sync_ms)
+                self.__update_ms += _RATE * (self.__update_ticks * 1000.0 / self.__pf - self.__update_ms)
+                if g.profiler_enabled:
+                    profiler.end()
+                if self.__error is not None:
+                    raise self.__error
+
+                # ワーカーが止まっている間にメインスレッドの処理を行う
+                if not process_events():
+                    self.__running = False
+                if self.__running and self.__main is not None:
+                    self.__main()
+                if not self.__running:
+                    break
+                self.__run_tasks()
+
+                # 記録先を入れ替えて、次のフレームの記録を始めさせる
+                recording = 1 - recording
+                commands = render_queue._swap(buffers[recording])
+                self.__go.set()
+
+                if self.__clear:
+                    clear_screen()
+                if g.profiler_enabled:
+                    profiler.begin("draw")
+                start = SDL_GetPerformanceCounter()
+                render_queue._replay(commands)
+                del commands[:]
+                self.__replay_ms += _RATE * ((SDL_GetPerformanceCounter() - start) * 1000.0 / self.__pf -
+                                             self.__replay_ms)
+                if g.profiler_enabled:
+                    profiler.end()
+                _present_frame()
+                self.__frames += 1
+                fps.wait(self.__max_fps)
+        finally:
+            self.__running = False
+            self.__quit = True
+            self.__go.set()
+            worker.join()
+            g.pipeline_thread = None
+            del g.pipeline_tasks[:]
+            render_queue._swap([])
+            if not prev_enabled:
+                render_queue.enable(False)
+        return True
+
+    def __run_tasks(self):
+        """
+        ワーカーから頼まれた処理(TileMapのチャンクの焼き直しなど)をメインスレッドで行う
+
+        Note:
+            ワーカーが止まっている間に呼ぶ。記録したフレームの命令は退避しておき、
+            処理の中のTexture.target()では処理の描画命令だけが描画されるようにする。
+        """
+        if not g.pipeline_tasks:
+            return
+        tasks = g.pipeline_tasks[:]
+        del g.pipeline_tasks[:]
+        commands = render_queue._swap([])
+        try:
+            for task in tasks:
+                task()
+        finally:
+            render_queue._swap(commands)
+
+    def __worker(self):
+        """
+        ワーカースレッドの処理
+        """
+        while True:
+            self.__go.wait()
+            self.__go.clear()
+            if self.__quit:
+                return
+            start = SDL_GetPerformanceCounter()
+            dt = (start - self.__prev_count) / self.__pf
+            self.__prev_count = start
+            try:
+                if self.__update(dt) is False:
+                    self.__running = False
+            except BaseException as e:
+                self.__error = e
+                self.__running = False
+            self.__update_ticks = SDL_GetPerformanceCounter() - start
+            self.__done.set()
+
+
+def run(update, main=None, max_fps=0, clear=True):
+    """
+    更新と描画を別のスレッドで重ねて行うメインループを実行する
+
+    Args:
+        update (function): ワーカースレッドで呼ぶ更新と描画の関数。update(dt)の形
+        main (function): メインスレッドで毎フレーム呼ぶ関数(引数なし)
+        max_fps (int): 1秒あたりの表示回数の上限。0なら制限しない
+        clear (bool): 描画の前にclear_screen()を呼ぶか
+
+    Returns:
+        Pipeline: 実行したPipeline(統計の取得用)
+    """
+    pipeline = Pipeline(update, main, max_fps, clear)
+    pipeline.run()
+    return pipeline
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+フレームの各段階の時間とレンダラの呼び出し回数を計測する
+
+Note:
+    enable()で有効にすると、フレームごとに次のものを記録する。
+        段階の時間: process_events()は"events"、update_screen()の溜まっている描画命令の描画は"draw"、
+            SDL_RenderPresentは"present"、fps.wait()は"wait"に自動で記録される。
+            ゲームの更新や描画はphase("update")、phase("draw")などで囲んで記録する。
+            どの段階にも入らなかった時間は"other"になる。
+        呼び出し回数: RenderCopy、RenderCopyEx、RenderGeometry、図形の描画、テクスチャの状態の変更、
+            テクスチャの作成と破棄の回数。
+    1フレームはupdate_screen()の表示から次の表示までで、表示の後のfps.wait()は次のフレームに入る。
+
+    呼び出し回数は有効にしている間だけeasysdl2の各モジュールのSDL関数を数える関数に差し替えて数えるので、
+    無効のときは描画ごとの負担はない(段階の記録もフラグを1回調べるだけ)。
+    有効にした後に読み込んだモジュールの呼び出しは数えない。
+
+    例:
+        profiler.enable()
+        while esdl.process_events():
+            with profiler.phase("update"):
+                update()
+            with profiler.phase("draw"):
+                draw()
+            profiler.draw_overlay(0, 0, font)
+            esdl.update_screen()
+            fps.wait(60)
+        print(profiler.get_frame())
+"""
+
+import sys
+from collections import deque
+from contextlib import contextmanager
+
+import sdl2
+from sdl2 import SDL_GetPerformanceCounter, SDL_GetPerformanceFrequency
+
+from . import _common as g
+
+PHASES = ("events", "update", "draw", "present", "wait")  # 標準の段階
+HISTORY = 120  # 覚えておくフレーム数
+
+# 数える項目とSDLの関数
+COUNTERS = (
+    ("copy", ("SDL_RenderCopy", "SDL_RenderCopyF")),
+    ("copy_ex", ("SDL_RenderCopyEx", "SDL_RenderCopyExF")),
+    ("geometry", ("SDL_RenderGeometry", "SDL_RenderGeometryRaw")),
+    ("primitives", ("SDL_RenderDrawPoint", "SDL_RenderDrawPoints", "SDL_RenderDrawLine", "SDL_RenderDrawLines",
+                    "SDL_RenderDrawRect", "SDL_RenderDrawRects", "SDL_RenderFillRect", "SDL_RenderFillRects",
+                    "SDL_RenderDrawPointF", "SDL_RenderDrawPointsF", "SDL_RenderDrawLineF", "SDL_RenderDrawLinesF",
+                    "SDL_RenderDrawRectF", "SDL_RenderDrawRectsF", "SDL_RenderFillRectF", "SDL_RenderFillRectsF")),
+    ("state_changes", ("SDL_SetTextureBlendMode", "SDL_SetTextureColorMod", "SDL_SetTextureAlphaMod")),
+    ("textures_created", ("SDL_CreateTexture", "SDL_CreateTextureFromSurface")),
+    ("textures_destroyed", ("SDL_DestroyTexture",)),
+)
+COUNTER_NAMES = tuple(name for name, funcs in COUNTERS)
+
+# 段階の色(オーバーレイ用)
+_COLORS = {
+    "events": (80, 160, 255),
+    "update": (80, 220, 120),
+    "draw": (255, 200, 60),
+    "present": (230, 90, 200),
+    "wait": (110, 110, 110),
+}
+_OTHER_COLOR = (200, 200, 200)
+
+_counts = [0] * len(COUNTERS)
+_patched = []  # (モジュール, 名前, 元の関数)
+_freq = 0
+_frame_start = 0
+_phase_times = {}  # 段階の名前 -> カウンタの値の合計(このフレーム)
+_stack = []  # 計測中の段階の[名前, 開始]
+_history = deque(maxlen=HISTORY)
+
+
+def enable(flag=True):
+    """
+    計測を有効にする
+
+    Args:
+        flag (bool): True:有効 False:無効
+    """
+    global _freq, _frame_start
+    if flag == g.profiler_enabled:
+        return
+    if flag:
+        _patch()
+        _freq = SDL_GetPerformanceFrequency()
+        _frame_start = SDL_GetPerformanceCounter()
+        _reset_frame()
+    else:
+        _unpatch()
+        del _stack[:]
+    g.profiler_enabled = bool(flag)
+
+
+def is_enabled():
+    """
+    計測が有効か調べる
+
+    Returns:
+        bool: True:有効 False:無効
+    """
+    return g.profiler_enabled
+
+
+def reset():
+    """
+    記録したフレームを消す
+    """
+    _history.clear()
+    _reset_frame()
+
+
+def begin(name):
+    """
+    段階の計測を始める
+
+    Note:
+        段階は入れ子にできる。入れ子の内側の時間は外側の段階には含めない。
+
+    Args:
+        name (str): 段階の名前
+    """
+    if not g.profiler_enabled:
+        return
+    now = SDL_GetPerformanceCounter()
+    if _stack:
+        top = _stack[-1]
+        _phase_times[top[0]] = _phase_times.get(top[0], 0) + now - top[1]
+    _stack.append([name, now])
+
+
+def end():
+    """
+    最後に始めた段階の計測を終える
+    """
+    if not g.profiler_enabled or not _stack:
+        return
+    now = SDL_GetPerformanceCounter()
+    name, start = _stack.pop()
+    _phase_times[name] = _phase_times.get(name, 0) + now - start
+    if _stack:
+        _stack[-1][1] = now
+
+
+@contextmanager
+def phase(name):
+    """
+    withで囲んだ部分を段階として計測する
+
+    Args:
+        name (str): 段階の名前
+    """
+    begin(name)
+    try:
+        yield
+    finally:
+        end()
+
+
+def get_frame():
+    """
+    最後のフレームの記録を取得する
+
+    Returns:
+        dict: {"frame_ms": フレームの時間, "phases": {段階: ミリ秒}, "counts": {項目: 回数}}。記録がなければNone
+    """
+    return _history[-1] if _history else None
+
+
+def get_history():
+    """
+    覚えているフレームの記録を取得する
+
+    Returns:
+        list: get_frame()と同じ形のdictのリスト(古い順)
+    """
+    return list(_history)
+
+
+def get_average(frames=None):
+    """
+    最近のフレームの記録の平均を取得する
+
+    Args:
+        frames (int): 平均するフレーム数。Noneなら覚えている全部
+
+    Returns:
+        dict: get_frame()と同じ形のdict。記録がなければNone
+    """
+    records = list(_history)[-frames:] if frames else list(_history)
+    if not records:
+        return None
+    n = float(len(records))
+    phases = {}
+    counts = dict.fromkeys(COUNTER_NAMES, 0.0)
+    for record in records:
+        for name, ms in record["phases"].items():
+            phases[name] = phases.get(name, 0.0) + ms
+        for name, value in record["counts"].items():
+            counts[name] += value
+    return {
+        "frame_ms": sum(record["frame_ms"] for record in records) / n,
+        "phases": {name: ms / n for name, ms in phases.items()},
+        "counts": {name: value / n for name, value in counts.items()},
+    }
+
+
+def draw_overlay(x=0, y=0, font=None, width=160, budget_ms=1000.0 / 60):
+    """
+    最近のフレームの記録を小さく描画する
+
+    Note:
+        段階の時間を色分けした帯グラフ(幅がbudget_msのとき1フレーム分)で描画する。
+        fontを渡すと時間と呼び出し回数の文字も描画する。
+        オーバーレイの描画自体は呼び出し回数に数えない(遅延描画モードではupdate_screen()でまとめて描画されるので数える)。
+
+    Args:
+        x (int): 左上のx座標
+        y (int): 左上のy座標
+        font (Font): 文字を描画するフォント。Noneなら帯グラフだけ
+        width (int): 帯グラフの幅
+        budget_ms (float): 帯グラフの幅に当たる時間(ミリ秒)
+    """
+    from . import draw  # drawはfunctionsを読み込むので使うときに読み込む
+
+    average = get_average(30)
+    if average is None:
+        return
+    saved = list(_counts)
+    scale = width / budget_ms
+    draw.color(0, 0, 0, 160)
+    draw.fill_rect(x, y, width, 8)
+    left = x
+    phases = average["phases"]
+    for name in PHASES + tuple(sorted(set(phases) - set(PHASES))):
+        ms = phases.get(name, 0.0)
+        w = int(round(ms * scale))
+        if w <= 0 or name == "other":
+            continue
+        r, gr, b = _COLORS.get(name, _OTHER_COLOR)
+        draw.color(r, gr, b, 255)
+        draw.fill_rect(left, y, w, 8)
+        left += w
+    if font is not None:
+        counts = average["counts"]
+        lines = [
+            "{:.2f}ms ".format(average["frame_ms"]) + " ".join(
+                "{}:{:.2f}".format(name[0], phases.get(name, 0.0)) for name in PHASES),
+            "copy:{:.0f} ex:{:.0f} geo:{:.0f} prim:{:.0f}".format(
+                counts["copy"], counts["copy_ex"], counts["geometry"], counts["primitives"]),
+            "state:{:.0f} tex:+{:.0f}/-{:.0f}".format(
+                counts["state_changes"], counts["textures_created"], counts["textures_destroyed"]),
+        ]
+        for i, line in enumerate(lines):
+            font.draw(x, y + 10 + i * 18, line)
+    _counts[:] = saved
+
+
+def _reset_frame():
+    _phase_times.clear()
+    for i in range(len(_counts)):
+        _counts[i] = 0
+
+
+def _end_frame():
+    """
+    フレームの記録を終える(update_screen()の表示の後に呼ばれる)
+    """
+    global _frame_start
+    now = SDL_GetPerformanceCounter()
+    # 終わっていない段階はここで区切り、続きは次のフレームに記録する
+    for entry in _stack[-1:]:
+        _phase_times[entry[0]] = _phase_times.get(entry[0], 0) + now - entry[1]
+        entry[1] = now
+    to_ms = 1000.0 / _freq
+    total = now - _frame_start
+    phases = {name: ticks * to_ms for name, ticks in _phase_times.items()}
+    phases["other"] = max(0.0, (total - sum(_phase_times.values())) * to_ms)
+    _history.append({
+        "frame_ms": total * to_ms,
+        "phases": phases,
+        "counts": dict(zip(COUNTER_NAMES, _counts)),
+    })
+    _frame_start = now
+    _reset_frame()
+
+
+def _counter(index, func):
+    def counted(*args):
+        _counts[index] += 1
+        return func(*args)
+    counted.__wrapped__ = func
+    return counted
+
+
+def _patch():
+    """
+    easysdl2の各モジュールのSDL関数を数える関数に差し替える
+    """
+    wrappers = {}
+    for index, (name, funcs) in enumerate(COUNTERS):
+        for func_name in funcs:
+            func = getattr(sdl2, func_name, None)
+            if func is not None:
+                wrappers[func_name] = (func, _counter(index, func))
+    package = __name__.rpartition(".")[0]
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name == package or module_name.startswith(package + ".")):
+            continue
+        namespace = vars(module)
+        for func_name, (func, wrapper) in wrappers.items():
+            if namespace.get(func_name) is func:
+                namespace[func_name] = wrapper
+                _patched.append((namespace, func_name, func))
+
+
+def _unpatch():
+    for namespace, func_name, func in _patched:
+        namespace[func_name] = func
+    del _patched[:]
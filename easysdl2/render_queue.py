@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""
+描画命令をキューに溜めておき、並べ替えてまとめて描画する(遅延描画モード)
+
+Note:
+    enable()で有効にすると、Texture、TextureAtlas、SpriteSheet、Font、drawモジュールの描画は
+    すぐには行われずに命令として記録される。
+    update_screen()かflush()を呼ぶと(レイヤー, テクスチャ, ブレンド状態)で安定ソートし、
+    同じテクスチャと状態が続く部分はSDL_RenderGeometry 1回にまとめて描画する。
+    同じレイヤーの中ではテクスチャの違う描画の順番が入れ替わるので、
+    重なり順が大事なものはset_layer()でレイヤーを分けること。
+    ただしdrawモジュールの図形は並べ替えの区切りになり、その前後の描画とは記録した順に描画される
+    (スプライトの後に描いた枠線がスプライトの下にならない)。
+    SDL_RenderGeometryが使えないSDL(2.0.18未満)では有効にできない。
+"""
+
+import ctypes
+import threading
+from operator import itemgetter
+
+from sdl2 import *
+
+from . import _common as g
+from . import _geometry
+from . import log
+from . import texture_state
+
+# 命令の種類
+_QUADS = 0  # テクスチャの四角形(まとめられる)
+_PRIMITIVE = 1  # drawモジュールの図形
+_CALL = 2  # それ以外のテクスチャを使う描画(まとめられない)
+
+# 命令は((レイヤー, 区切り), テクスチャのキー, ブレンドモード, モッド, 種類, 内容)のタプル
+# 区切りはレイヤーごとに図形を記録するたびに増やす番号で、並べ替えは区切りの中でだけ行われる
+_sort_key = itemgetter(0, 1, 2, 3)
+
+_layer = 0
+_order = (0, 0)  # 今の(レイヤー, 区切り)
+_segments = {}  # レイヤー -> 区切り
+_commands = []
+
+# drawモジュールの描画色とブレンドモード(遅延描画中は記録時の値を命令に持たせる)
+_draw_color = (255, 255, 255, 255)
+_draw_blend = SDL_BLENDMODE_NONE
+
+_STAT_KEYS = ("commands", "submissions", "merges", "state_changes")
+_frame_stats = dict.fromkeys(_STAT_KEYS, 0)
+_last_stats = dict.fromkeys(_STAT_KEYS, 0)
+
+
+def enable(flag=True):
+    """
+    遅延描画モードを設定する
+
+    Note:
+        無効にするときは溜まっている命令を描画してから無効にする。
+
+    Args:
+        flag (bool): True:有効 False:無効
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    if flag and not _geometry.is_available():
+        log.write("render_queue.enable() failed. SDL_RenderGeometry is not available.")
+        return False
+    if flag and not g.render_queue_enabled:
+        _load_draw_state()
+    ret = True
+    if not flag and g.render_queue_enabled:
+        ret = flush()
+        # 図形を1つも記録していなくてもdraw.color()などで設定した値をレンダラーに反映する
+        _apply_draw_state(g.current_renderer)
+    g.render_queue_enabled = bool(flag)
+    return ret
+
+
+def is_enabled():
+    """
+    遅延描画モードが有効か調べる
+
+    Returns:
+        bool: True:有効 False:無効
+    """
+    return g.render_queue_enabled
+
+
+def set_layer(layer):
+    """
+    これから記録する描画命令のレイヤーを設定する
+
+    Note:
+        レイヤーの小さいものから順に描画される。
+
+    Args:
+        layer (int): レイヤー
+    """
+    global _layer, _order
+    _layer = layer
+    _order = (layer, _segments.get(layer, 0))
+
+
+def get_layer():
+    """
+    現在のレイヤーを取得する
+
+    Returns:
+        int: レイヤー
+    """
+    return _layer
+
+
+def get_stats():
+    """
+    直前のフレームの統計を取得する
+
+    Note:
+        commands: 記録された命令の数
+        submissions: 実際にSDLに送った描画の数
+        merges: 前の描画にまとめられた命令の数
+        state_changes: テクスチャやブレンド状態の切り替え回数
+
+    Returns:
+        dict: 統計の辞書
+    """
+    return dict(_last_stats)
+
+
+def _end_frame():
+    """
+    フレームの統計を確定する(update_screen()から呼ばれる)
+    """
+    global _frame_stats, _last_stats
+    _last_stats = _frame_stats
+    _frame_stats = dict.fromkeys(_STAT_KEYS, 0)
+
+
+def _texture_key(texture):
+    return ctypes.cast(texture, ctypes.c_void_p).value or 0
+
+
+def push_quad(texture, tex_w, tex_h, blend, mod, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+              angle=0.0, flip_h=False, flip_v=False, rotated=False, color=(255, 255, 255), alpha=255, owner=None):
+    """
+    テクスチャの四角形1つの描画命令を記録する
+
+    Note:
+        引数は_geometry.render_quadsと同じだがすべてスカラー。
+        ownerには描画までテクスチャが開放されないようにTextureなどのオブジェクトを渡す。
+
+    Args:
+        texture (SDL_Texture): 描画するテクスチャ
+        tex_w, tex_h (int): テクスチャのサイズ
+        blend (int): 記録時のブレンドモード
+        mod (tuple): 記録時のモッド(red, green, blue, alpha)
+    """
+    _commands.append((_order, _texture_key(texture), blend, mod, _QUADS,
+                      (texture, tex_w, tex_h, owner, None,
+                       (x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                        angle, flip_h, flip_v, rotated, color, alpha))))
+
+
+def push_quads(texture, tex_w, tex_h, blend, mod, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+               angle=0.0, flip_h=False, flip_v=False, rotated=False, color=None, alpha=None, owner=None):
+    """
+    テクスチャの四角形をまとめて描画する命令を記録する(バッチ描画用)
+
+    Note:
+        引数は_geometry.render_quadsと同じで、スカラーか配列を指定できる。
+    """
+    if color is None:
+        color = (255, 255, 255)
+    if alpha is None:
+        alpha = 255
+    n = _geometry.count(x, y, src_x, w, h, angle)
+    _commands.append((_order, _texture_key(texture), blend, mod, _QUADS,
+                      (texture, tex_w, tex_h, owner, n,
+                       (x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                        angle, flip_h, flip_v, rotated, color, alpha))))
+
+
+def push_call(texture, func, *args, owner=None):
+    """
+    まとめられない描画命令を記録する
+
+    Args:
+        texture (SDL_Texture): 使用するテクスチャ(並べ替えのキー)
+        func (function): 描画時に呼ぶ関数。第一引数にレンダラが渡される
+        args: funcに渡す引数
+    """
+    _commands.append((_order, _texture_key(texture), -1, (), _CALL, (func, args, owner)))
+
+
+def push_primitive(func, *args):
+    """
+    drawモジュールの図形の描画命令を記録する
+
+    Note:
+        set_draw_color()、set_draw_blend()で設定された値で描画される。
+        図形は前後の命令との順番を保つように、新しい区切りに入れる。
+
+    Args:
+        func (function): SDL_RenderDrawLineなど。第一引数にレンダラが渡される
+        args: funcに渡す引数
+    """
+    global _order
+    segment = _order[1] + 1
+    _commands.append(((_layer, segment), 0, _draw_blend, _draw_color, _PRIMITIVE, (func, args)))
+    # 後から記録する命令は図形より後に描画する
+    _segments[_layer] = segment + 1
+    _order = (_layer, segment + 1)
+
+
+def set_draw_color(r, g, b, a=255):
+    """
+    遅延描画中のdrawモジュールの描画色を設定する
+    """
+    global _draw_color
+    _draw_color = (r, g, b, a)
+
+
+def set_draw_blend(mode):
+    """
+    遅延描画中のdrawモジュールのブレンドモードを設定する
+    """
+    global _draw_blend
+    _draw_blend = mode
+
+
+def _load_draw_state():
+    """
+    レンダラーの今の描画色とブレンドモードを記録の初期値にする
+    """
+    global _draw_color, _draw_blend
+    renderer = g.current_renderer
+    if not renderer:
+        return
+    red = ctypes.c_uint8()
+    green = ctypes.c_uint8()
+    blue = ctypes.c_uint8()
+    alpha = ctypes.c_uint8()
+    if SDL_GetRenderDrawColor(renderer, ctypes.byref(red), ctypes.byref(green),
+                              ctypes.byref(blue), ctypes.byref(alpha)) == 0:
+        _draw_color = (red.value, green.value, blue.value, alpha.value)
+    mode = SDL_BlendMode()
+    if SDL_GetRenderDrawBlendMode(renderer, ctypes.byref(mode)) == 0:
+        _draw_blend = mode.value
+
+
+def _apply_draw_state(renderer):
+    """
+    最後に設定された描画色とブレンドモードをレンダラーに設定する
+    """
+    if not renderer:
+        return
+    SDL_SetRenderDrawBlendMode(renderer, _draw_blend)
+    SDL_SetRenderDrawColor(renderer, *_draw_color)
+
+
+def _concat(values, counts, per_item_ndim=0):
+    """
+    命令ごとの値(スカラーまたは配列)をつなげて1つの配列にする
+    """
+    np = _geometry.np
+    if np is not None:
+        arrays = []
+        for v, n in zip(values, counts):
+            a = np.asarray(v)
+            if a.ndim == per_item_ndim:
+                a = np.broadcast_to(a, (n,) + a.shape)
+            arrays.append(a)
+        return np.concatenate(arrays)
+    ret = []
+    for v, n in zip(values, counts):
+        if per_item_ndim == 0 and _geometry.is_sequence(v):
+            ret.extend(v)
+        elif per_item_ndim == 1 and _geometry.is_sequence(v[0]):
+            ret.extend(v)
+        else:
+            ret.extend([v] * n)
+    return ret
+
+
+def _submit_quads(renderer, run, mod):
+    """
+    同じテクスチャと状態の命令をまとめて1回で描画する
+    """
+    texture, tex_w, tex_h = run[0][5][:3]
+    if len(run) == 1 and run[0][5][4] is None:
+        columns = run[0][5][5]
+    elif all(c[5][4] is None for c in run):
+        # 全部1つずつの描画ならそのまま列にする
+        columns = list(zip(*(c[5][5] for c in run)))
+    else:
+        counts = [1 if c[5][4] is None else c[5][4] for c in run]
+        params = [c[5][5] for c in run]
+        columns = [_concat(col, counts) for col in list(zip(*params))[:14]]
+        columns.append(_concat([p[14] for p in params], counts, 1))
+        columns.append(_concat([p[15] for p in params], counts))
+    x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, angle, flip_h, flip_v, rotated, color, alpha = columns
+    return _geometry.render_quads(renderer, texture, tex_w, tex_h, x, y, src_x, src_y, src_w, src_h, w, h,
+                                  pivot_x, pivot_y, angle, flip_h, flip_v, rotated, color, alpha, mod)
+
+
+def flush():
+    """
+    溜まっている描画命令を並べ替えて描画する
+
+    Note:
+        update_screen()から自動的に呼ばれる。
+        描画先を切り替える前などに明示的に呼んでもよい。
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    global _commands
+    if _off_main_thread():
+        log.write("render_queue.flush() failed. called off the main thread while a Pipeline is running.")
+        return False
+    if not _commands:
+        return True
+    commands = _commands
+    _commands = []
+    return _replay(commands)
+
+
+def _off_main_thread():
+    """
+    Pipelineのループ中にメインスレッド以外(ワーカー)から呼ばれているか調べる
+
+    Returns:
+        bool: True:メインスレッド以外 False:メインスレッドかループ中でない
+    """
+    return g.pipeline_thread is not None and threading.get_ident() != g.pipeline_thread
+
+
+def _swap(commands):
+    """
+    記録先の命令のリストを入れ替える(pipeline用)
+
+    Args:
+        commands (list): これから記録する命令のリスト
+
+    Returns:
+        list: それまで記録していた命令のリスト
+    """
+    global _commands
+    prev = _commands
+    _commands = commands
+    return prev
+
+
+def _replay(commands):
+    """
+    命令のリストを並べ替えて描画する
+
+    Note:
+        commandsは並べ替えられる。
+    """
+    if not commands:
+        return True
+    commands.sort(key=_sort_key)
+
+    ret = True
+    renderer = g.current_renderer
+    stats = _frame_stats
+    stats["commands"] += len(commands)
+    prev_texture_state = None
+    prev_draw_state = None
+    blend_backup = {}  # 描画後に元に戻すテクスチャのブレンドモード
+    i = 0
+    n = len(commands)
+    while i < n:
+        cmd = commands[i]
+        kind = cmd[4]
+        if kind == _QUADS:
+            state = cmd[1:4]
+            j = i + 1
+            while j < n and commands[j][4] == _QUADS and commands[j][1:4] == state:
+                j += 1
+            if state != prev_texture_state:
+                texture = cmd[5][0]
+                if cmd[1] not in blend_backup:
+                    blend_backup[cmd[1]] = (texture, texture_state.get_state(texture)[0])
+                texture_state.set_blend_mode(texture, cmd[2])
+                stats["state_changes"] += 1
+                prev_texture_state = state
+            if _submit_quads(renderer, commands[i:j], cmd[3]) < 0:
+                log.write("render_queue.flush() failed. error={}".format(SDL_GetError()))
+                ret = False
+            stats["submissions"] += 1
+            stats["merges"] += j - i - 1
+            i = j
+            continue
+
+        if kind == _PRIMITIVE:
+            state = cmd[2:4]
+            if state != prev_draw_state:
+                SDL_SetRenderDrawBlendMode(renderer, cmd[2])
+                SDL_SetRenderDrawColor(renderer, *cmd[3])
+                stats["state_changes"] += 1
+                prev_draw_state = state
+        else:
+            # テクスチャの状態は関数側で変わるかもしれない
+            prev_texture_state = None
+        func, args = cmd[5][:2]
+        if func(renderer, *args) < 0:
+            log.write("render_queue.flush() failed. error={}".format(SDL_GetError()))
+            ret = False
+        stats["submissions"] += 1
+        i += 1
+
+    for texture, mode in blend_backup.values():
+        texture_state.set_blend_mode(texture, mode)
+    if prev_draw_state is not None and prev_draw_state != (_draw_blend, _draw_color):
+        # 図形ごとに変えた描画色とブレンドモードを最後に設定された値に戻す
+        _apply_draw_state(renderer)
+    return ret
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+固定時間刻みのメインループ
+
+Note:
+    ゲームの更新(update)は決まった間隔(tick_rate回/秒)で呼び、描画(render)はできるだけ多く(かmax_fpsまで)呼ぶ。
+    描画の速さに関係なく更新の回数が決まるので、描画が重くてもシミュレーションの結果は変わらない。
+    render(alpha)のalphaは前回の更新から次の更新までの割合(0〜1)で、前回と今回の状態を補間して描画するのに使う。
+    更新が遅れているときは描画を飛ばして更新を優先する(連続max_frame_skip回まで)。
+    それでも追いつかないときは遅れた時間を捨てる。
+
+    例:
+        def update(dt):
+            player.x += player.vx * dt
+
+        def render(alpha):
+            tex.draw(player.prev_x + (player.x - player.prev_x) * alpha, player.y)
+
+        runner.run(update, render, tick_rate=60)
+"""
+
+from sdl2 import *
+
+from . import _common as g
+from . import fps
+from . import profiler
+from .functions import clear_screen, process_events, update_screen
+
+DEFAULT_TICK_RATE = 60  # 1秒あたりの更新回数
+DEFAULT_MAX_FRAME_SKIP = 5  # 連続して飛ばせる描画の回数
+_MAX_ELAPSED = 0.25  # 1回のループで進める時間の上限(秒)。止まっていた後に更新が大量に走るのを防ぐ
+
+_current = None  # run()で実行中のRunner
+
+
+class Runner:
+    """
+    固定時間刻みで更新し、補間して描画するメインループ
+    """
+
+    def __init__(self, update, render, tick_rate=DEFAULT_TICK_RATE, max_fps=0,
+                 max_frame_skip=DEFAULT_MAX_FRAME_SKIP, clear=True):
+        """
+        コンストラクタ
+
+        Args:
+            update (function): 更新する関数。update(dt)の形で、dtは1回の更新の時間(秒、いつも同じ値)
+            render (function): 描画する関数。render(alpha)の形
+            tick_rate (int): 1秒あたりの更新回数
+            max_fps (int): 1秒あたりの描画回数の上限。0なら制限しない
+            max_frame_skip (int): 更新が遅れているとき、連続して飛ばせる描画の回数
+            clear (bool): render()の前にclear_screen()を呼ぶか
+        """
+        self.__update = update
+        self.__render = render
+        self.__max_fps = max_fps
+        self.__max_frame_skip = max_frame_skip
+        self.__clear = clear
+        self.__running = False
+        self.__pf = SDL_GetPerformanceFrequency()
+        self.__tick_rate = 0
+        self.__dt = 0.0
+        self.__tick_ticks = 0
+        self.set_tick_rate(tick_rate)
+        self.__prev_count = 0
+        self.__accumulator = 0  # まだ更新に使っていない時間(カウンタの値)
+        self.__skipped = 0  # 連続して飛ばした描画の回数
+        self.__tick = 0  # 更新の回数の合計
+        self.__alpha = 0.0
+        # 1秒ごとの集計
+        self.__second_start = 0
+        self.__second_ticks = 0
+        self.__second_renders = 0
+        self.__ticks_per_sec = 0.0
+        self.__renders_per_sec = 0.0
+        self.__skipped_renders = 0  # 合計
+        self.__dropped_ticks = 0  # 追いつけずに捨てた更新の回数の合計
+
+    def set_tick_rate(self, tick_rate):
+        """
+        1秒あたりの更新回数を設定する
+
+        Args:
+            tick_rate (int): 1秒あたりの更新回数
+        """
+        self.__tick_rate = tick_rate
+        self.__dt = 1.0 / tick_rate
+        self.__tick_ticks = max(1, self.__pf // tick_rate)
+
+    def get_tick_rate(self):
+        """
+        1秒あたりの更新回数を取得する
+
+        Returns:
+            int: 1秒あたりの更新回数
+        """
+        return self.__tick_rate
+
+    def set_max_fps(self, max_fps):
+        """
+        1秒あたりの描画回数の上限を設定する
+
+        Args:
+            max_fps (int): 上限。0なら制限しない
+        """
+        self.__max_fps = max_fps
+
+    def get_tick(self):
+        """
+        更新の回数を取得する
+
+        Returns:
+            int: run()を始めてからの更新の回数
+        """
+        return self.__tick
+
+    def get_alpha(self):
+        """
+        最後の描画の補間の割合を取得する
+
+        Returns:
+            float: 0〜1
+        """
+        return self.__alpha
+
+    def get_stats(self):
+        """
+        更新と描画の回数を取得する
+
+        Note:
+            ticks_per_sec、renders_per_secは直前の1秒間の回数。
+
+        Returns:
+            dict: ticks_per_sec, renders_per_sec, skipped_renders, dropped_ticks, tick
+        """
+        return {
+            "ticks_per_sec": self.__ticks_per_sec,
+            "renders_per_sec": self.__renders_per_sec,
+            "skipped_renders": self.__skipped_renders,
+            "dropped_ticks": self.__dropped_ticks,
+            "tick": self.__tick,
+        }
+
+    def is_running(self):
+        """
+        ループ中か調べる
+
+        Returns:
+            bool: True:ループ中 False:止まっている
+        """
+        return self.__running
+
+    def stop(self):
+        """
+        ループを止める(update、renderの中から呼ぶ)
+        """
+        self.__running = False
+
+    def start(self):
+        """
+        時間の計測を始める(run()を使わずにstep()を呼ぶとき用)
+        """
+        now = SDL_GetPerformanceCounter()
+        self.__prev_count = now
+        self.__second_start = now
+        self.__accumulator = 0
+        self.__skipped = 0
+        self.__running = True
+
+    def run(self):
+        """
+        process_events()がFalseを返すかstop()が呼ばれるまでループする
+        """
+        self.start()
+        while self.__running:
+            if not self.step():
+                break
+        self.__running = False
+
+    def step(self):
+        """
+        ループを1回分進める
+
+        Note:
+            イベント処理、溜まった時間分の更新、描画(飛ばすこともある)、fps.wait()を行う。
+
+        Returns:
+            bool: False:終了する True:それ以外
+        """
+        if not process_events():
+            self.__running = False
+            return False
+
+        now = SDL_GetPerformanceCounter()
+        self.__accumulator += min(now - self.__prev_count, int(self.__pf * _MAX_ELAPSED))
+        self.__prev_count = now
+
+        # 溜まった時間分だけ更新する
+        tick_ticks = self.__tick_ticks
+        count = 0
+        if g.profiler_enabled:
+            profiler.begin("update")
+        while self.__accumulator >= tick_ticks and count <= self.__max_frame_skip and self.__running:
+            self.__update(self.__dt)
+            self.__accumulator -= tick_ticks
+            self.__tick += 1
+            self.__second_ticks += 1
+            count += 1
+        if g.profiler_enabled:
+            profiler.end()
+        if not self.__running:
+            return False
+
+        if self.__accumulator >= tick_ticks:
+            if self.__skipped < self.__max_frame_skip:
+                # まだ遅れているので描画を飛ばして更新を優先する
+                self.__skipped += 1
+                self.__skipped_renders += 1
+                self.__count_second(now)
+                return True
+            # 飛ばせる回数を超えたので遅れを捨てる
+            dropped = self.__accumulator // tick_ticks
+            self.__dropped_ticks += dropped
+            self.__accumulator -= dropped * tick_ticks
+        self.__skipped = 0
+
+        self.__alpha = self.__accumulator / tick_ticks
+        if self.__clear:
+            clear_screen()
+        if g.profiler_enabled:
+            profiler.begin("draw")
+        self.__render(self.__alpha)
+        if g.profiler_enabled:
+            profiler.end()
+        update_screen()
+        self.__second_renders += 1
+        fps.wait(self.__max_fps)
+        self.__count_second(now)
+        return self.__running
+
+    def __count_second(self, now):
+        elapsed = now - self.__second_start
+        if elapsed >= self.__pf:
+            seconds = elapsed / self.__pf
+            self.__ticks_per_sec = self.__second_ticks / seconds
+            self.__renders_per_sec = self.__second_renders / seconds
+            self.__second_start = now
+            self.__second_ticks = 0
+            self.__second_renders = 0
+
+
+def run(update, render, tick_rate=DEFAULT_TICK_RATE, max_fps=0, max_frame_skip=DEFAULT_MAX_FRAME_SKIP, clear=True):
+    """
+    固定時間刻みのメインループを実行する
+
+    Note:
+        process_events()がFalseを返すか、stop()が呼ばれるまで戻らない。
+
+    Args:
+        update (function): 更新する関数。update(dt)の形
+        render (function): 描画する関数。render(alpha)の形
+        tick_rate (int): 1秒あたりの更新回数
+        max_fps (int): 1秒あたりの描画回数の上限。0なら制限しない
+        max_frame_skip (int): 更新が遅れているとき、連続して飛ばせる描画の回数
+        clear (bool): render()の前にclear_screen()を呼ぶか
+
+    Returns:
+        Runner: 実行したRunner(統計の取得用)
+    """
+    global _current
+    runner = Runner(update, render, tick_rate, max_fps, max_frame_skip, clear)
+    prev, _current = _current, runner
+    try:
+        runner.run()
+    finally:
+        _current = prev
+    return runner
+
+
+def stop():
+    """
+    run()で実行中のループを止める(update、renderの中から呼ぶ)
+    """
+    if _current is not None:
+        _current.stop()
+
+
+def get_current():
+    """
+    run()で実行中のRunnerを取得する
+
+    Returns:
+        Runner: 実行中のRunner。なければNone
+    """
+    return _current
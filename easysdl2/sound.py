@@ -59,6 +59,18 @@ class Sound:
         Mix_VolumeChunk(self.__chunk, self.__volume)
         return True
 
+    def _set_chunk(self, chunk):
+        """
+        読み込み済みのMix_Chunkを設定する(loader用)
+
+        Args:
+            chunk (Mix_Chunk): チャンク。このオブジェクトが開放する
+        """
+        if self.__chunk:
+            Mix_FreeChunk(self.__chunk)
+        self.__chunk = chunk
+        Mix_VolumeChunk(self.__chunk, self.__volume)
+
     def play(self, channel=0, loops=0):
         """
         サウンドを再生する
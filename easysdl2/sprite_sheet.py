@@ -8,7 +8,12 @@ from easysdl2 import Rect, SDL_DestroyTexture, SDL_Rect, SDL_Point, SDL_RenderCo
     SDL_SetTextureColorMod, SDL_BLENDMODE_NONE, SDL_FLIP_NONE, SDL_Texture, IMG_LoadTexture, IMG_GetError, Texture, \
     SDL_BLENDMODE_BLEND
 
+from . import _atlas_file
 from . import _common as g
+from . import _frame_table
+from . import _geometry
+from . import render_queue
+from . import texture_state
 
 
 class SpriteSheetFrame:
@@ -48,6 +53,8 @@ class SpriteSheet:
         コンストラクタ
         """
         self.__frames = []
+        self.__table = _frame_table.FrameTable()
+        self.__index = None  # コンパイル済みのファイルの名前のハッシュ表
         self.__textures = []
         self.__texture_files = []
         self.__w = 0
@@ -68,10 +75,43 @@ class SpriteSheet:
         del self.__frames[:]
         del self.__texture_files[:]
 
+    def load(self, filename):
+        """
+        atlas_compilerでコンパイルしたスプライトシートを読み込む
+
+        Note:
+            今までに追加したテクスチャとスプライトは削除される。
+            フレームテーブルはmmapしたファイルをそのまま使い、名前はハッシュ表で引くので、
+            スプライト数が多くても読み込みは速い。
+
+        Args:
+            filename (str): コンパイル済みのファイルのパス(utf-8)
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        try:
+            buffer, header, index, texture_files = _atlas_file.read(filename)
+        except (IOError, OSError, ValueError) as e:
+            log.error_log(e, "load", "SpriteSheet", filename)
+            return False
+        del self.__frames[:]
+        del self.__textures[:]
+        del self.__texture_files[:]
+        for file_path in texture_files:
+            self.add_texture(file_path)
+        offset, count = _atlas_file.frames_offset(header)
+        self.__table.map_buffer(buffer, offset, count)
+        self.__index = index
+        return True
+
     def add_texture(self, file_path: str):
         """
         テクスチャを追加する
 
+        Note:
+            同じ画像ファイルのテクスチャはtexture_cacheで共有される。
+
         Args:
             file_path (str): 画像ファイルのパス
 
@@ -110,6 +150,11 @@ class SpriteSheet:
         frame.pivot_y = 0.5
         frame.name = name
         self.__frames.append(frame)
+        # 描画用の値を計算してテーブルに格納しておく
+        index = self.__table.append(rect.x, rect.y, rect.w, rect.h, frame.pivot_x, frame.pivot_y, False, texture_index)
+        if self.__index is not None:
+            self.__index.add(name, index)
+        return index
 
     def draw(self, index, x, y):
         """
@@ -128,23 +173,25 @@ class SpriteSheet:
         if len(self.__textures) == 0:
             log.error_log("not loaded", "draw", "SpriteSheet")
             return
-        if index < 0 or index >= len(self.__frames):
+        if index < 0 or index >= len(self.__table):
             log.error_log("index out of range", "draw", "SpriteSheet")
             return
 
-        frame = self.__frames[index]
-        rect = frame.frame
-
-        w, h = rect.w, rect.h
-        px, py = frame.pivot_x, frame.pivot_y
-
-        x -= w * px
-        y -= h * py
-        srcrect = SDL_Rect(rect.x, rect.y, w, h)
-        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
-        texture = self.__textures[frame.texture_index].get_texture()
+        zoom = 1.0
+        if g.camera is not None:
+            pos = g.camera._point(x, y, self.__table.radius(index))
+            if pos is None:
+                return
+            x, y, zoom = pos
+        if g.render_queue_enabled:
+            self.__push(index, self.__table.quad(index, zoom, zoom), x, y)
+            return
+        texture = self.__textures[self.__table[index].texture_index].get_texture()
         self.__set_blend_param_to_texture(texture)
-        SDL_RenderCopy(g.current_renderer, texture, srcrect, dstrect)
+        if zoom != 1.0:
+            self.__table.draw_ex(g.current_renderer, texture, index, x, y, zoom, zoom)
+        else:
+            self.__table.draw(g.current_renderer, texture, index, x, y)
 
     def draw_ex(self, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False):
         """
@@ -166,32 +213,133 @@ class SpriteSheet:
         if len(self.__textures) == 0:
             log.error_log("not loaded", "draw", "SpriteSheet")
             return
-        if index < 0 or index >= len(self.__frames):
+        if index < 0 or index >= len(self.__table):
             log.error_log("index out of range", "draw", "SpriteSheet")
             return
 
-        flip = 0
-        if flip_h:
-            flip |= SDL_FLIP_HORIZONTAL
-        if flip_v:
-            flip |= SDL_FLIP_VERTICAL
-
-        frame = self.__frames[index]
-        rect = frame.frame
-
-        rw, rh = rect.w, rect.h
-        px, py = frame.pivot_x, frame.pivot_y
-
-        w = rw * ex_x
-        h = rh * ex_y
-        x -= rw * px * ex_x
-        y -= rh * py * ex_y
-        srcrect = SDL_Rect(rect.x, rect.y, rw, rh)
-        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
-        pt = SDL_Point(int(rw * px * ex_x), int(rh * py * ex_y))
-        texture = self.__textures[frame.texture_index].get_texture()
+        if g.camera is not None:
+            pos = g.camera._point(x, y, self.__table.radius(index) * max(abs(ex_x), abs(ex_y)))
+            if pos is None:
+                return
+            x, y, zoom = pos
+            ex_x *= zoom
+            ex_y *= zoom
+        if g.render_queue_enabled:
+            self.__push(index, self.__table.quad(index, ex_x, ex_y), x, y, angle, flip_h, flip_v)
+            return
+        texture = self.__textures[self.__table[index].texture_index].get_texture()
         self.__set_blend_param_to_texture(texture)
-        SDL_RenderCopyEx(g.current_renderer, texture, srcrect, dstrect, angle, pt, flip)
+        self.__table.draw_ex(g.current_renderer, texture, index, x, y, ex_x, ex_y, angle, flip_h, flip_v)
+
+    def draw_batch(self, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False,
+                   color=None, alpha=None):
+        """
+        複数の画像をまとめて拡大縮小回転反転描画する
+
+        Note:
+            指定座標はpivotの位置になる(draw_exと同じ)。
+            各引数はスカラー(全部共通)か、インスタンスごとの配列(numpy配列、リスト、バッファなど)を指定できる。
+            元になるテクスチャごとにSDL_RenderGeometryを1回呼ぶ。
+            SDL_RenderGeometryが使えないSDL(2.0.18未満)ではdraw_exをループで呼ぶ。
+
+        Args:
+            index (int or array): 画像のインデックス
+            x (array): X座標の配列
+            y (array): Y座標の配列
+            ex_x (float or array): X軸方向の拡大率
+            ex_y (float or array): Y軸方向の拡大率
+            angle (float or array): 回転量(度数法)
+            flip_h (bool or array): 左右反転フラグ
+            flip_v (bool or array): 上下反転フラグ
+            color (tuple or array): 乗算する色(red, green, blue)、またはその配列。Noneなら(255, 255, 255)
+            alpha (int or array): 不透明度(0〜255)。Noneなら255
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if len(self.__textures) == 0:
+            log.error_log("not loaded", "draw_batch", "SpriteSheet")
+            return False
+        if not _geometry.in_range(index, len(self.__table)):
+            log.error_log("index out of range", "draw_batch", "SpriteSheet")
+            return False
+
+        param = self.__blend_param
+        mod = (param.red, param.green, param.blue, param.alpha)
+        if not _geometry.is_available():
+            return _geometry.draw_each(self.draw_ex, self.__set_mod, mod,
+                                       (index, x, y, ex_x, ex_y, angle, flip_h, flip_v), color, alpha)
+
+        if g.camera is not None:
+            radius = self.__table.radius(None) * max(_geometry.max_abs(ex_x), _geometry.max_abs(ex_y))
+            x, y, sel = g.camera._batch(x, y, radius)
+            if len(x) == 0:
+                return True
+            if sel is not None:
+                index = _geometry.select(index, sel)
+                ex_x = _geometry.select(ex_x, sel)
+                ex_y = _geometry.select(ex_y, sel)
+                angle = _geometry.select(angle, sel)
+                flip_h = _geometry.select(flip_h, sel)
+                flip_v = _geometry.select(flip_v, sel)
+                color = _geometry.select_color(color, sel)
+                alpha = _geometry.select(alpha, sel)
+            zoom = g.camera.get_zoom()
+            ex_x = _geometry.multiply(ex_x, zoom)
+            ex_y = _geometry.multiply(ex_y, zoom)
+
+        table = self.__table.columns()
+        ret = True
+        for texture_index, sel in _geometry.split_by(_geometry.gather(table["texture_index"], index)):
+            texture = self.__textures[texture_index]
+            tex_w, tex_h = texture.get_size()
+            src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated = \
+                _geometry.frame_quads(table, _geometry.select(index, sel),
+                                      _geometry.select(ex_x, sel), _geometry.select(ex_y, sel))
+            args = (_geometry.select(x, sel), _geometry.select(y, sel), src_x, src_y, src_w, src_h, w, h,
+                    pivot_x, pivot_y, _geometry.select(angle, sel),
+                    _geometry.select(flip_h, sel), _geometry.select(flip_v, sel), rotated,
+                    _geometry.select_color(color, sel), _geometry.select(alpha, sel))
+            if g.render_queue_enabled:
+                render_queue.push_quads(texture.get_texture(), tex_w, tex_h, param.blend_mode, mod, *args,
+                                        owner=texture)
+                continue
+            texture_state.set_blend_mode(texture.get_texture(), param.blend_mode)
+            res = _geometry.render_quads(g.current_renderer, texture.get_texture(), tex_w, tex_h, *args, mod=mod)
+            if res < 0:
+                log.error_log(SDL_GetError(), "draw_batch", "SpriteSheet")
+                ret = False
+        return ret
+
+    def __push(self, index, quad, x, y, angle=0.0, flip_h=False, flip_v=False):
+        """
+        遅延描画モードでスプライトの描画命令を記録する
+        """
+        texture = self.__textures[self.__table[index].texture_index]
+        tex_w, tex_h = texture.get_size()
+        src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated = quad
+        param = self.__blend_param
+        render_queue.push_quad(texture.get_texture(), tex_w, tex_h, param.blend_mode,
+                               (param.red, param.green, param.blue, param.alpha), x, y,
+                               src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                               angle, bool(flip_h), bool(flip_v), bool(rotated), owner=texture)
+
+    def __set_mod(self, red, green, blue, alpha):
+        self.__blend_param.red = red
+        self.__blend_param.green = green
+        self.__blend_param.blue = blue
+        self.__blend_param.alpha = alpha
+
+    def _get_frame_table(self):
+        return self.__table
+
+    def _get_names(self):
+        if self.__index is not None:
+            return [self.__index.get_name(i) for i in range(len(self.__table))]
+        return [f.name for f in self.__frames]
+
+    def _get_texture_files(self):
+        return list(self.__texture_files)
 
     def get_index(self, name):
         """
@@ -200,9 +348,14 @@ class SpriteSheet:
         Args:
             name (str): スプライトの識別名
 
+        Note:
+            load()で読み込んだ場合はハッシュ表で引くので、スプライト数が多くても速い。
+
         Returns:
             int: テクスチャのインデックス。失敗は-1
         """
+        if self.__index is not None:
+            return self.__index.find(name)
         ret = -1
         i = 0
         for f in self.__frames:
@@ -213,9 +366,9 @@ class SpriteSheet:
         return ret
 
     def __set_blend_param_to_texture(self, texture):
-        SDL_SetTextureBlendMode(texture, self.__blend_param.blend_mode)
-        SDL_SetTextureAlphaMod(texture, self.__blend_param.alpha)
-        SDL_SetTextureColorMod(texture, self.__blend_param.red, self.__blend_param.green, self.__blend_param.blue)
+        # 前回と同じ値ならSDLの関数は呼ばれない
+        param = self.__blend_param
+        texture_state.set_all(texture, param.blend_mode, param.red, param.green, param.blue, param.alpha)
 
     def set_blend_param(self, red=255, green=255, blue=255, alpha=255, mode=SDL_BLENDMODE_BLEND):
         """
@@ -228,8 +381,8 @@ class SpriteSheet:
             alpha (int): 不透明度(0〜255)
             mode (int): SDL_BLENDMODE_XXXXで定義されいるブレンドモード
         """
-        self.__blend_param.r = red
-        self.__blend_param.g = green
-        self.__blend_param.b = blue
-        self.__blend_param.a = alpha
-        self.__blend_param.mode = mode
+        self.__blend_param.red = red
+        self.__blend_param.green = green
+        self.__blend_param.blue = blue
+        self.__blend_param.alpha = alpha
+        self.__blend_param.blend_mode = mode
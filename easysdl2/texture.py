@@ -3,6 +3,7 @@
 テクスチャ（画像）を扱うクラスを定義します。
 """
 
+import contextlib
 import ctypes
 import json
 import os
@@ -10,8 +11,54 @@ import os
 from sdl2 import *
 from sdl2.sdlimage import *
 
+from . import _atlas_file
 from . import _common as g
+from . import _frame_table
+from . import _geometry
 from . import log
+from . import render_queue
+from . import texture_cache
+from . import texture_state
+
+
+def _copy_with_state(renderer, texture, state, copy, *args):
+    """
+    ブレンドモードとモッドを設定してからSDL_RenderCopy(Ex)を呼ぶ(遅延描画用)
+    """
+    texture_state.apply(texture, state)
+    return copy(renderer, texture, *args)
+
+
+def _pixel_view(address, pitch, w, h, bpp):
+    """
+    ロックしたピクセルのメモリをコピーせずに参照する配列を作る
+
+    Note:
+        numpyがあれば4バイトのフォーマットは(h, w)のuint32、それ以外は(h, w, bpp)のuint8の配列。
+        numpyがなければ1次元のmemoryview(各行はpitchバイトごと)。
+    """
+    size = pitch * (h - 1) + w * bpp if h > 0 else 0
+    buf = (ctypes.c_ubyte * size).from_address(address)
+    np = _geometry.np
+    if np is None:
+        return memoryview(buf).cast("B")
+    if bpp == 4:
+        return np.ndarray((h, w), dtype=np.uint32, buffer=buf, strides=(pitch, 4))
+    return np.ndarray((h, w, bpp), dtype=np.uint8, buffer=buf, strides=(pitch, bpp, 1))
+
+
+def _clear_target(renderer, color):
+    """
+    描画色を変えずに描画先を塗りつぶす
+    """
+    red = ctypes.c_uint8()
+    green = ctypes.c_uint8()
+    blue = ctypes.c_uint8()
+    alpha = ctypes.c_uint8()
+    SDL_GetRenderDrawColor(renderer, ctypes.byref(red), ctypes.byref(green), ctypes.byref(blue), ctypes.byref(alpha))
+    SDL_SetRenderDrawColor(renderer, *color)
+    SDL_RenderClear(renderer)
+    SDL_SetRenderDrawColor(renderer, red, green, blue, alpha)
 
 
 class Rect:
@@ -50,36 +97,74 @@ class Texture:
         ブレンドモードの定数はSDLのものを使っても良い
     """
 
-    def __init__(self, filename=""):
+    def __init__(self, filename="", w=0, h=0):
         """
         コンストラクタ
 
         Note:
             filenameをしてしなければインスタンのみ生成し、後でload()できる。
+            filenameを指定せずにw, hを指定するとcreate()で書き換え可能なテクスチャを作る。
 
         Args:
             filename: ロードする画像ファイルのパス(utf-8)
+            w (int): 作成するテクスチャの幅
+            h (int): 作成するテクスチャの高さ
         """
         self.__texture = None
+        self.__state = [SDL_BLENDMODE_NONE, 255, 255, 255, 255]  # ブレンドモードとモッド(texture_state.apply()用)
         self.__w = 0
         self.__h = 0
         if filename:
             if not self.load(filename):
                 log.error_log("failed", "__init__", "Texture")
+        elif w > 0 and h > 0:
+            if not self.create(w, h):
+                log.error_log("failed", "__init__", "Texture")
 
     def __del__(self):
         """
         デストラクタ
         
         Note:
-            delするとテクスチャを開放する
+            delするとテクスチャの参照を手放す(開放はtexture_cacheが行う)
         """
         if self.__texture:
+            self.__release()
+
+    def __release(self):
+        if not texture_cache.release(self.__texture):
+            # キャッシュを通さずに作られたテクスチャ(Fontなど)はここで開放する
+            texture_state.invalidate(self.__texture)
             SDL_DestroyTexture(self.__texture)
+        self.__texture = None
+
+    def _set_texture(self, texture):
+        """
+        作成済みのSDL_Textureを設定する(パッケージ内部用)
+
+        Note:
+            設定したテクスチャはこのオブジェクトが開放する。
+
+        Args:
+            texture (SDL_Texture): テクスチャ
+        """
+        if self.__texture:
+            self.__release()
+        self.__texture = texture
+        blend, mod = texture_state.get_state(texture)
+        self.__state = [blend, mod[0], mod[1], mod[2], mod[3]]
+        w = ctypes.c_int()
+        h = ctypes.c_int()
+        SDL_QueryTexture(texture, None, None, ctypes.byref(w), ctypes.byref(h))
+        self.__w = w.value
+        self.__h = h.value
 
     def load(self, filename):
         """
         画像を読み込む
+
+        Note:
+            同じ画像ファイルを読み込み済みならtexture_cacheのテクスチャを共有する。
         
         Args: 
             filename (str): 読み込む画像ファイルのパス(utf-8)
@@ -88,23 +173,150 @@ class Texture:
             bool: True:成功 False:失敗
         """
         if self.__texture:
-            SDL_DestroyTexture(self.__texture)
-            self.__texture = None
+            self.__release()
 
-        texture = IMG_LoadTexture(g.current_renderer, filename.encode("utf-8"))
+        texture = texture_cache.acquire(filename, g.current_renderer)
         if not texture:
             log.error_log(IMG_GetError(), "load", "Texture", filename)
             return False
         self.__texture = texture
+        blend, mod = texture_cache.get_initial_state(texture)
+        self.__state = [blend, mod[0], mod[1], mod[2], mod[3]]
+        self.__w, self.__h = texture_cache.get_size(texture)
+        return True
 
-        # サイズを取得する
-        w = ctypes.c_int()
-        h = ctypes.c_int()
-        SDL_QueryTexture(self.__texture, None, None, ctypes.byref(w), ctypes.byref(h))
-        self.__w = w.value
-        self.__h = h.value
+    def create(self, w, h, access=SDL_TEXTUREACCESS_STREAMING, pixel_format=SDL_PIXELFORMAT_ARGB8888):
+        """
+        空のテクスチャを作成する
+
+        Note:
+            SDL_TEXTUREACCESS_STREAMINGで作ればlock()でピクセルを書き換えられる。
+            作成したテクスチャはtexture_cacheで共有されない。
+
+        Args:
+            w (int): 幅
+            h (int): 高さ
+            access (int): SDL_TEXTUREACCESS_XXXX
+            pixel_format (int): SDL_PIXELFORMAT_XXXX
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if self.__texture:
+            self.__release()
+
+        texture = SDL_CreateTexture(g.current_renderer, pixel_format, access, int(w), int(h))
+        if not texture:
+            log.error_log(SDL_GetError(), "create", "Texture")
+            return False
+        self._set_texture(texture)
         return True
 
+    @contextlib.contextmanager
+    def lock(self, rect=None):
+        """
+        テクスチャのピクセルを書き換えるためにロックする
+
+        Note:
+            withで使い、抜けるとアンロックされる。create()で作ったストリーミングテクスチャのみ。
+            pixelsはロックしたメモリをそのまま参照するので、withの外では使わないこと。
+            numpyがあれば4バイトのフォーマット(ARGB8888など)は(高さ, 幅)のuint32の配列、
+            それ以外は(高さ, 幅, バイト数)のuint8の配列になる(行の間隔はpitchに合わせてある)。
+            numpyがなければ1次元のmemoryviewで、各行の先頭はpitchバイトごとになる。
+            SDLの仕様で、ロック中のピクセルは元の内容を保持していないので全部書き込むこと。
+            遅延描画モードでは、それまでの描画命令を描画してからロックする。
+
+            例:
+                with texture.lock() as (pixels, pitch):
+                    pixels[:] = 0xFF000000
+
+        Args:
+            rect (Rect): ロックする範囲。Noneなら全体
+
+        Yields:
+            tuple: (pixels, pitch)。失敗時は(None, 0)
+        """
+        if not self.__texture:
+            log.error_log("not loaded", "lock", "Texture")
+            yield None, 0
+            return
+        fmt = ctypes.c_uint32()
+        access = ctypes.c_int()
+        SDL_QueryTexture(self.__texture, ctypes.byref(fmt), ctypes.byref(access), None, None)
+        if access.value != SDL_TEXTUREACCESS_STREAMING:
+            log.error_log("not a streaming texture", "lock", "Texture")
+            yield None, 0
+            return
+        if g.render_queue_enabled:
+            render_queue.flush()
+
+        if rect is None:
+            sdl_rect = None
+            w, h = self.__w, self.__h
+        else:
+            sdl_rect = SDL_Rect(int(rect.x), int(rect.y), int(rect.w), int(rect.h))
+            w, h = sdl_rect.w, sdl_rect.h
+        pixels = ctypes.c_void_p()
+        pitch = ctypes.c_int()
+        if SDL_LockTexture(self.__texture, sdl_rect, ctypes.byref(pixels), ctypes.byref(pitch)) < 0:
+            log.error_log(SDL_GetError(), "lock", "Texture")
+            yield None, 0
+            return
+        try:
+            yield _pixel_view(pixels.value, pitch.value, w, h, SDL_BYTESPERPIXEL(fmt.value)), pitch.value
+        finally:
+            SDL_UnlockTexture(self.__texture)
+
+    @contextlib.contextmanager
+    def target(self, clear_color=None):
+        """
+        描画先をこのテクスチャに切り替える
+
+        Note:
+            withで使い、抜けると元の描画先に戻る。create()でSDL_TEXTUREACCESS_TARGETを指定して作ったテクスチャのみ。
+            withの中のTexture、TextureAtlas、SpriteSheet、Font、drawモジュールの描画はこのテクスチャに描かれる。
+            withの中ではカメラ(camera.set_camera())を使わず、テクスチャの左上を(0, 0)として描画する。
+            遅延描画モードでは、切り替えの前後でそれまでの描画命令を描画する。
+
+            例:
+                with texture.target((0, 0, 0, 0)):
+                    sprite.draw(0, 0)
+
+        Args:
+            clear_color (tuple): 切り替えた後に塗りつぶす色(red, green, blue, alpha)。Noneなら塗りつぶさない
+
+        Yields:
+            bool: True:成功 False:失敗
+        """
+        if not self.__texture:
+            log.error_log("not loaded", "target", "Texture")
+            yield False
+            return
+        if render_queue._off_main_thread():
+            # ワーカーから描画先を切り替えるとメインスレッドの描画と競合する
+            log.error_log("called off the main thread while a Pipeline is running", "target", "Texture")
+            yield False
+            return
+        renderer = g.current_renderer
+        if g.render_queue_enabled:
+            render_queue.flush()
+        prev = SDL_GetRenderTarget(renderer)
+        if SDL_SetRenderTarget(renderer, self.__texture) < 0:
+            log.error_log(SDL_GetError(), "target", "Texture")
+            yield False
+            return
+        camera = g.camera
+        g.camera = None
+        try:
+            if clear_color is not None:
+                _clear_target(renderer, clear_color)
+            yield True
+        finally:
+            if g.render_queue_enabled:
+                render_queue.flush()
+            SDL_SetRenderTarget(renderer, prev)
+            g.camera = camera
+
     def draw(self, x, y):
         """
         画像を描画する
@@ -119,8 +331,19 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw", "Texture")
             return
+        w = self.__w
+        h = self.__h
+        if g.camera is not None:
+            rect = g.camera._rect(x, y, w, h)
+            if rect is None:
+                return
+            x, y, w, h = rect
+        if g.render_queue_enabled:
+            self.__push(int(x), int(y), 0, 0, self.__w, self.__h, w, h, 0, 0)
+            return
 
-        dstrect = SDL_Rect(int(x), int(y), int(self.__w), int(self.__h))
+        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopy(g.current_renderer, self.__texture, None, dstrect)
 
     def draw_crop(self, rect, x, y):
@@ -138,8 +361,20 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw_crop", "Texture")
             return
+        w = self.__w
+        h = self.__h
+        if g.camera is not None:
+            dst = g.camera._rect(x, y, w, h)
+            if dst is None:
+                return
+            x, y, w, h = dst
+        if g.render_queue_enabled:
+            self.__push(int(x), int(y), int(rect.x), int(rect.y), int(rect.w), int(rect.h),
+                        w, h, 0, 0)
+            return
         srcrect = SDL_Rect(int(rect.x), int(rect.y), int(rect.w), int(rect.h))
-        dstrect = SDL_Rect(int(x), int(y), int(self.__w), int(self.__h))
+        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopy(g.current_renderer, self.__texture, srcrect, dstrect)
 
     def draw_center(self, x, y):
@@ -156,9 +391,20 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw", "Texture")
             return
-        x = x - self.__w / 2
-        y = y - self.__h / 2
-        dstrect = SDL_Rect(int(x), int(y), int(self.__w), int(self.__h))
+        w = self.__w
+        h = self.__h
+        x = x - w / 2
+        y = y - h / 2
+        if g.camera is not None:
+            rect = g.camera._rect(x, y, w, h)
+            if rect is None:
+                return
+            x, y, w, h = rect
+        if g.render_queue_enabled:
+            self.__push(int(x), int(y), 0, 0, self.__w, self.__h, w, h, 0, 0)
+            return
+        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopy(g.current_renderer, self.__texture, None, dstrect)
 
     def draw_crop_center(self, rect, x, y):
@@ -176,10 +422,22 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw_crop_center", "Texture")
             return
-        x = x - self.__w / 2
-        y = y - self.__h / 2
+        w = self.__w
+        h = self.__h
+        x = x - w / 2
+        y = y - h / 2
+        if g.camera is not None:
+            dst = g.camera._rect(x, y, w, h)
+            if dst is None:
+                return
+            x, y, w, h = dst
+        if g.render_queue_enabled:
+            self.__push(int(x), int(y), int(rect.x), int(rect.y), int(rect.w), int(rect.h),
+                        w, h, 0, 0)
+            return
         srcrect = SDL_Rect(int(rect.x), int(rect.y), int(rect.w), int(rect.h))
-        dstrect = SDL_Rect(int(x), int(y), int(self.__w), int(self.__h))
+        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopy(g.current_renderer, self.__texture, srcrect, dstrect)
 
     def draw_ex(self, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False):
@@ -201,6 +459,18 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw_ex", "Texture")
             return
+        if g.camera is not None:
+            pos = g.camera._point(x, y, (abs(self.__w * ex_x) + abs(self.__h * ex_y)) / 2)
+            if pos is None:
+                return
+            x, y, zoom = pos
+            ex_x *= zoom
+            ex_y *= zoom
+        if g.render_queue_enabled:
+            w = self.__w * ex_x
+            h = self.__h * ex_y
+            self.__push(x, y, 0, 0, self.__w, self.__h, w, h, w / 2, h / 2, angle, flip_h, flip_v)
+            return
         flip = 0
         if flip_h:
             flip |= SDL_FLIP_HORIZONTAL
@@ -212,6 +482,7 @@ class Texture:
         x -= w / 2
         y -= h / 2
         dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopyEx(g.current_renderer, self.__texture, None, dstrect, angle, None, flip)
 
     def draw_crop_ex(self, rect, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False):
@@ -234,6 +505,19 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "draw_crop_ex", "Texture")
             return
+        if g.camera is not None:
+            pos = g.camera._point(x, y, (abs(rect.w * ex_x) + abs(rect.h * ex_y)) / 2)
+            if pos is None:
+                return
+            x, y, zoom = pos
+            ex_x *= zoom
+            ex_y *= zoom
+        if g.render_queue_enabled:
+            w = rect.w * ex_x
+            h = rect.h * ex_y
+            self.__push(x, y, int(rect.x), int(rect.y), int(rect.w), int(rect.h), w, h, w / 2, h / 2,
+                        angle, flip_h, flip_v)
+            return
         flip = 0
         if flip_h:
             flip |= SDL_FLIP_HORIZONTAL
@@ -246,8 +530,88 @@ class Texture:
         y -= h / 2
         srcrect = SDL_Rect(int(rect.x), int(rect.y), int(rect.w), int(rect.h))
         dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopyEx(g.current_renderer, self.__texture, srcrect, dstrect, angle, None, flip)
 
+    def draw_batch(self, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False, color=None, alpha=None):
+        """
+        同じ画像を複数まとめて拡大縮小回転反転描画する
+
+        Note:
+            指定座標は画像の中心になる(draw_exと同じ)。
+            各引数はスカラー(全部共通)か、インスタンスごとの配列(numpy配列、リスト、バッファなど)を指定できる。
+            頂点配列を組み立ててSDL_RenderGeometryで1回で描画する。
+            SDL_RenderGeometryが使えないSDL(2.0.18未満)ではdraw_exをループで呼ぶ。
+
+        Args:
+            x (array): X座標の配列
+            y (array): Y座標の配列
+            ex_x (float or array): X軸方向の拡大率
+            ex_y (float or array): Y軸方向の拡大率
+            angle (float or array): 回転量(度数法)
+            flip_h (bool or array): 左右反転フラグ
+            flip_v (bool or array): 上下反転フラグ
+            color (tuple or array): 乗算する色(red, green, blue)、またはその配列。Noneなら(255, 255, 255)
+            alpha (int or array): 不透明度(0〜255)。Noneなら255
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if not self.__texture:
+            log.error_log("not loaded", "draw_batch", "Texture")
+            return False
+        blend = self.__state[0]
+        mod = tuple(self.__state[1:])
+        if not _geometry.is_available():
+            return _geometry.draw_each(self.draw_ex, self.__set_mod, mod,
+                                       (x, y, ex_x, ex_y, angle, flip_h, flip_v), color, alpha)
+
+        if g.camera is not None:
+            radius = (_geometry.max_abs(ex_x) * self.__w + _geometry.max_abs(ex_y) * self.__h) / 2
+            x, y, sel = g.camera._batch(x, y, radius)
+            if len(x) == 0:
+                return True
+            zoom = g.camera.get_zoom()
+            ex_x = _geometry.multiply(_geometry.select(ex_x, sel), zoom)
+            ex_y = _geometry.multiply(_geometry.select(ex_y, sel), zoom)
+            angle = _geometry.select(angle, sel)
+            flip_h = _geometry.select(flip_h, sel)
+            flip_v = _geometry.select(flip_v, sel)
+            color = _geometry.select_color(color, sel)
+            alpha = _geometry.select(alpha, sel)
+
+        w = _geometry.multiply(ex_x, self.__w)
+        h = _geometry.multiply(ex_y, self.__h)
+        if g.render_queue_enabled:
+            render_queue.push_quads(self.__texture, self.__w, self.__h, blend, mod, x, y,
+                                    0, 0, self.__w, self.__h, w, h,
+                                    _geometry.multiply(w, 0.5), _geometry.multiply(h, 0.5),
+                                    angle, flip_h, flip_v, False, color, alpha, owner=self)
+            return True
+        texture_state.apply(self.__texture, self.__state)
+        res = _geometry.render_quads(g.current_renderer, self.__texture, self.__w, self.__h, x, y,
+                                     0, 0, self.__w, self.__h, w, h,
+                                     _geometry.multiply(w, 0.5), _geometry.multiply(h, 0.5),
+                                     angle, flip_h, flip_v, False, color, alpha, mod)
+        if res < 0:
+            log.error_log(SDL_GetError(), "draw_batch", "Texture")
+            return False
+        return True
+
+    def __set_mod(self, red, green, blue, alpha):
+        # 次の描画の直前にtexture_state.apply()で設定される
+        self.__state[1:] = [red, green, blue, alpha]
+
+    def __push(self, x, y, src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, angle=0.0, flip_h=False, flip_v=False):
+        """
+        遅延描画モードで四角形の描画命令を記録する
+        """
+        blend = self.__state[0]
+        mod = tuple(self.__state[1:])
+        render_queue.push_quad(self.__texture, self.__w, self.__h, blend, mod, x, y,
+                               src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                               angle, bool(flip_h), bool(flip_v), owner=self)
+
     def render_copy(self, srcrect, dstrect):
         """
         SDL_RenderCopyをそのまま使う
@@ -259,8 +623,19 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "render_copy", "Texture")
             return
+        x, y, w, h = dstrect.x, dstrect.y, dstrect.w, dstrect.h
+        if g.camera is not None:
+            rect = g.camera._rect(x, y, w, h)
+            if rect is None:
+                return
+            x, y, w, h = rect
         srcrect_sdl = SDL_Rect(int(srcrect.x), int(srcrect.y), int(srcrect.w), int(srcrect.h))
-        dstrect_sdl = SDL_Rect(int(dstrect.x), int(dstrect.y), int(dstrect.w), int(dstrect.h))
+        dstrect_sdl = SDL_Rect(int(x), int(y), int(w), int(h))
+        if g.render_queue_enabled:
+            render_queue.push_call(self.__texture, _copy_with_state, self.__texture, list(self.__state),
+                                   SDL_RenderCopy, srcrect_sdl, dstrect_sdl, owner=self)
+            return
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopy(g.current_renderer, self.__texture, srcrect_sdl, dstrect_sdl)
 
     def render_copy_ex(self, srcrect, dstrect, angle=0.0, center=None, flip=SDL_FLIP_NONE):
@@ -277,8 +652,26 @@ class Texture:
         if not self.__texture:
             log.error_log("not loaded", "render_copy_ex", "Texture")
             return
+        x, y, w, h = dstrect.x, dstrect.y, dstrect.w, dstrect.h
+        if g.camera is not None:
+            # 回転しても収まるように、外接円の外接矩形で判定する
+            radius = (abs(w) + abs(h)) / 2
+            rect = g.camera._rect(x + w / 2 - radius, y + h / 2 - radius, radius * 2, radius * 2)
+            if rect is None:
+                return
+            zoom = g.camera.get_zoom()
+            x, y = g.camera.to_screen(x, y)
+            w *= zoom
+            h *= zoom
+            if center is not None:
+                center = SDL_Point(int(center.x * zoom), int(center.y * zoom))
         srcrect_sdl = SDL_Rect(int(srcrect.x), int(srcrect.y), int(srcrect.w), int(srcrect.h))
-        dstrect_sdl = SDL_Rect(int(dstrect.x), int(dstrect.y), int(dstrect.w), int(dstrect.h))
+        dstrect_sdl = SDL_Rect(int(x), int(y), int(w), int(h))
+        if g.render_queue_enabled:
+            render_queue.push_call(self.__texture, _copy_with_state, self.__texture, list(self.__state),
+                                   SDL_RenderCopyEx, srcrect_sdl, dstrect_sdl, angle, center, flip, owner=self)
+            return
+        texture_state.apply(self.__texture, self.__state)
         SDL_RenderCopyEx(g.current_renderer, self.__texture, srcrect_sdl, dstrect_sdl, angle, center, flip)
 
     def set_blend_mode(self, mode):
@@ -291,7 +684,8 @@ class Texture:
         Returns:
             bool: True:成功 False:失敗
         """
-        res = SDL_SetTextureBlendMode(self.__texture, mode)
+        self.__state[0] = mode
+        res = texture_state.set_blend_mode(self.__texture, mode)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_mode", "Texture")
             return False
@@ -307,7 +701,8 @@ class Texture:
         Returns:
             bool: True:成功 False:失敗        
         """
-        res = SDL_SetTextureAlphaMod(self.__texture, alpha)
+        self.__state[4] = alpha
+        res = texture_state.set_alpha_mod(self.__texture, alpha)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_alpha", "Textrue")
             return False
@@ -325,7 +720,8 @@ class Texture:
         Returns:
             bool: True:成功 False:失敗
         """
-        res = SDL_SetTextureColorMod(self.__texture, red, green, blue)
+        self.__state[1:4] = [red, green, blue]
+        res = texture_state.set_color_mod(self.__texture, red, green, blue)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_color", "Textrue")
             return False
@@ -354,6 +750,15 @@ class Texture:
     def get_texture(self):
         return self.__texture
 
+    def get_size(self):
+        """
+        テクスチャのサイズを取得する
+
+        Returns:
+            tuple (int, int): (幅, 高さ)
+        """
+        return self.__w, self.__h
+
 
 class TextureAtlasFrame:
     """
@@ -389,7 +794,10 @@ class TextureAtlas:
             filename: ロードする画像ファイルのパス(utf-8)
         """
         self.__frames = []
+        self.__table = _frame_table.FrameTable()
+        self.__index = None  # コンパイル済みのファイルの名前のハッシュ表
         self.__texture = None
+        self.__state = [SDL_BLENDMODE_NONE, 255, 255, 255, 255]  # ブレンドモードとモッド(texture_state.apply()用)
         self.__texture_file = ""
         self.__w = 0
         self.__h = 0
@@ -402,10 +810,10 @@ class TextureAtlas:
         デストラクタ
         
         Note:
-            delするとテクスチャを開放する
+            delするとテクスチャの参照を手放す(開放はtexture_cacheが行う)
         """
         if self.__texture:
-            SDL_DestroyTexture(self.__texture)
+            texture_cache.release(self.__texture)
 
         del self.__frames[:]
 
@@ -413,14 +821,24 @@ class TextureAtlas:
         """
         テクスチャアトラスを読み込む
         
+        Note:
+            atlas_compilerでコンパイルしたバイナリファイルも読み込める。
+            バイナリファイルはmmapしてそのままフレームテーブルとして使うので、フレーム数が多くても速い。
+
         Args: 
-            filename (str): 読み込むjosnファイルのパス(utf-8)
+            filename (str): 読み込むjosnファイルまたはコンパイル済みのファイルのパス(utf-8)
     
         Returns: 
             bool: True:成功 False:失敗
         """
         if len(self.__frames) > 0:
             del self.__frames[:]
+        self.__table.clear()
+        self.__index = None
+        if _atlas_file.is_compiled(filename):
+            if not self.__load_compiled(filename):
+                return False
+            return self.__acquire_texture()
 
         try:
             with open(filename) as fi:
@@ -430,6 +848,7 @@ class TextureAtlas:
             path, fn = os.path.split(filename)
             self.__texture_file = path + os.path.sep + meta["image"]
             frames = data["frames"]
+            self.__table.reserve(len(frames))
             for frm in frames:
                 taf = TextureAtlasFrame()
                 taf.filename = str(frm["filename"])
@@ -453,31 +872,57 @@ class TextureAtlas:
                 taf.pivotY = float(pt["y"])
 
                 self.__frames.append(taf)
+                # 描画用の値を計算してテーブルに格納しておく
+                self.__table.append(taf.frame.x, taf.frame.y, taf.frame.w, taf.frame.h,
+                                    taf.pivotX, taf.pivotY, taf.rotated)
 
         except Exception:
             log.error_log("Invalid json file", "load", "TextrueAtlas", filename)
             self.__texture_file = ""
             del self.__frames[:]
+            self.__table.clear()
             return False
 
+        return self.__acquire_texture()
+
+    def __load_compiled(self, filename):
+        """
+        コンパイル済みのファイルからフレームテーブルと名前のハッシュ表を読み込む
+        """
+        try:
+            buffer, header, index, texture_files = _atlas_file.read(filename)
+        except (IOError, OSError, ValueError) as e:
+            log.error_log(e, "load", "TextrueAtlas", filename)
+            return False
+        if len(texture_files) != 1:
+            log.error_log("atlas must have one texture", "load", "TextrueAtlas", filename)
+            return False
+        offset, count = _atlas_file.frames_offset(header)
+        self.__table.map_buffer(buffer, offset, count)
+        self.__index = index
+        self.__texture_file = texture_files[0]
+        return True
+
+    def __acquire_texture(self):
+        """
+        画像ファイルのテクスチャをtexture_cacheから取得する
+        """
         if self.__texture:
-            SDL_DestroyTexture(self.__texture)
+            texture_cache.release(self.__texture)
             self.__texture = None
 
-        texture = IMG_LoadTexture(g.main_window_renderer, self.__texture_file.encode("utf-8"))
+        texture = texture_cache.acquire(self.__texture_file, g.main_window_renderer)
         if not texture:
             log.error_log(IMG_GetError(), "load", "TextrueAtlas", self.__texture_file)
             self.__texture_file = ""
             del self.__frames[:]
+            self.__table.clear()
+            self.__index = None
             return False
         self.__texture = texture
-
-        # サイズを取得する
-        w = ctypes.c_int()
-        h = ctypes.c_int()
-        SDL_QueryTexture(self.__texture, None, None, ctypes.byref(w), ctypes.byref(h))
-        self.__w = w.value
-        self.__h = h.value
+        blend, mod = texture_cache.get_initial_state(texture)
+        self.__state = [blend, mod[0], mod[1], mod[2], mod[3]]
+        self.__w, self.__h = texture_cache.get_size(texture)
         return True
 
     def draw(self, index, x, y):
@@ -498,29 +943,25 @@ class TextureAtlas:
             log.error_log("not loaded", "draw", "TextrueAtlas")
             return
 
-        if index < 0 or index >= len(self.__frames):
+        if index < 0 or index >= len(self.__table):
             log.error_log("index out of range", "draw_ex", "TextrueAtlas")
             return
+        zoom = 1.0
+        if g.camera is not None:
+            pos = g.camera._point(x, y, self.__table.radius(index))
+            if pos is None:
+                return
+            x, y, zoom = pos
+        if g.render_queue_enabled:
+            self.__push(self.__table.quad(index, zoom, zoom), x, y)
+            return
 
-        frame = self.__frames[index]
-        rect = frame.frame
-
-        if frame.rotated:
-            w, h = rect.h, rect.w
-            px, py = -frame.pivotY, frame.pivotX
-        else:
-            w, h = rect.w, rect.h
-            px, py = frame.pivotX, frame.pivotY
+        texture_state.apply(self.__texture, self.__state)
 
-        x -= w * px
-        y -= h * py
-        srcrect = SDL_Rect(rect.x, rect.y, w, h)
-        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
-        if frame.rotated:
-            pt = SDL_Point(int(w * px), int(h * py))
-            SDL_RenderCopyEx(g.current_renderer, self.__texture, srcrect, dstrect, -90, pt, SDL_FLIP_NONE)
+        if zoom != 1.0:
+            self.__table.draw_ex(g.current_renderer, self.__texture, index, x, y, zoom, zoom)
         else:
-            SDL_RenderCopy(g.current_renderer, self.__texture, srcrect, dstrect)
+            self.__table.draw(g.current_renderer, self.__texture, index, x, y)
 
     def draw_ex(self, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False):
         """
@@ -542,36 +983,126 @@ class TextureAtlas:
         if not self.__texture:
             log.error_log("not loaded", "draw_ex", "TextrueAtlas")
             return
-        if index < 0 or index >= len(self.__frames):
+        if index < 0 or index >= len(self.__table):
             log.error_log("index out of range", "draw_ex", "TextrueAtlas")
             return
+        if g.camera is not None:
+            pos = g.camera._point(x, y, self.__table.radius(index) * max(abs(ex_x), abs(ex_y)))
+            if pos is None:
+                return
+            x, y, zoom = pos
+            ex_x *= zoom
+            ex_y *= zoom
+        if g.render_queue_enabled:
+            self.__push(self.__table.quad(index, ex_x, ex_y), x, y, angle, flip_h, flip_v)
+            return
 
-        flip = 0
-        if flip_h:
-            flip |= SDL_FLIP_HORIZONTAL
-        if flip_v:
-            flip |= SDL_FLIP_VERTICAL
+        texture_state.apply(self.__texture, self.__state)
 
-        frame = self.__frames[index]
-        rect = frame.frame
+        self.__table.draw_ex(g.current_renderer, self.__texture, index, x, y, ex_x, ex_y, angle, flip_h, flip_v)
 
-        if frame.rotated:
-            rw, rh = rect.h, rect.w
-            ex_x, ex_y = ex_y, ex_x
-            px, py = -frame.pivotY, frame.pivotX
-            angle -= 90
-        else:
-            rw, rh = rect.w, rect.h
-            px, py = frame.pivotX, frame.pivotY
-
-        w = rw * ex_x
-        h = rh * ex_y
-        x -= rw * px * ex_x
-        y -= rh * py * ex_y
-        srcrect = SDL_Rect(rect.x, rect.y, rw, rh)
-        dstrect = SDL_Rect(int(x), int(y), int(w), int(h))
-        pt = SDL_Point(int(rw * px * ex_x), int(rh * py * ex_y))
-        SDL_RenderCopyEx(g.current_renderer, self.__texture, srcrect, dstrect, angle, pt, flip)
+    def draw_batch(self, index, x, y, ex_x=1.0, ex_y=1.0, angle=0.0, flip_h=False, flip_v=False,
+                   color=None, alpha=None):
+        """
+        複数の画像をまとめて拡大縮小回転反転描画する
+
+        Note:
+            指定座標はpivotの位置になる(draw_exと同じ)。
+            各引数はスカラー(全部共通)か、インスタンスごとの配列(numpy配列、リスト、バッファなど)を指定できる。
+            切り取り範囲やpivotはフレームテーブルから引くので、何個描画してもSDL_RenderGeometryの呼び出しは1回。
+            SDL_RenderGeometryが使えないSDL(2.0.18未満)ではdraw_exをループで呼ぶ。
+
+        Args:
+            index (int or array): 画像のインデックス
+            x (array): X座標の配列
+            y (array): Y座標の配列
+            ex_x (float or array): X軸方向の拡大率
+            ex_y (float or array): Y軸方向の拡大率
+            angle (float or array): 回転量(度数法)
+            flip_h (bool or array): 左右反転フラグ
+            flip_v (bool or array): 上下反転フラグ
+            color (tuple or array): 乗算する色(red, green, blue)、またはその配列。Noneなら(255, 255, 255)
+            alpha (int or array): 不透明度(0〜255)。Noneなら255
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if not self.__texture:
+            log.error_log("not loaded", "draw_batch", "TextrueAtlas")
+            return False
+        if not _geometry.in_range(index, len(self.__table)):
+            log.error_log("index out of range", "draw_batch", "TextrueAtlas")
+            return False
+
+        blend = self.__state[0]
+        mod = tuple(self.__state[1:])
+        if not _geometry.is_available():
+            return _geometry.draw_each(self.draw_ex, self.__set_mod, mod,
+                                       (index, x, y, ex_x, ex_y, angle, flip_h, flip_v), color, alpha)
+
+        if g.camera is not None:
+            radius = self.__table.radius(None) * max(_geometry.max_abs(ex_x), _geometry.max_abs(ex_y))
+            x, y, sel = g.camera._batch(x, y, radius)
+            if len(x) == 0:
+                return True
+            if sel is not None:
+                index = _geometry.select(index, sel)
+                ex_x = _geometry.select(ex_x, sel)
+                ex_y = _geometry.select(ex_y, sel)
+                angle = _geometry.select(angle, sel)
+                flip_h = _geometry.select(flip_h, sel)
+                flip_v = _geometry.select(flip_v, sel)
+                color = _geometry.select_color(color, sel)
+                alpha = _geometry.select(alpha, sel)
+            zoom = g.camera.get_zoom()
+            ex_x = _geometry.multiply(ex_x, zoom)
+            ex_y = _geometry.multiply(ex_y, zoom)
+
+        if g.render_queue_enabled:
+            src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated = \
+                _geometry.frame_quads(self.__table.columns(), index, ex_x, ex_y)
+            render_queue.push_quads(self.__texture, self.__w, self.__h, blend, mod, x, y,
+                                    src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                                    angle, flip_h, flip_v, rotated, color, alpha, owner=self)
+            return True
+
+        texture_state.apply(self.__texture, self.__state)
+        res = _geometry.render_frames(g.current_renderer, self.__texture, self.__w, self.__h,
+                                      self.__table.columns(), index, x, y, ex_x, ex_y, angle,
+                                      flip_h, flip_v, color, alpha, mod)
+        if res < 0:
+            log.error_log(SDL_GetError(), "draw_batch", "TextrueAtlas")
+            return False
+        return True
+
+    def __set_mod(self, red, green, blue, alpha):
+        # 次の描画の直前にtexture_state.apply()で設定される
+        self.__state[1:] = [red, green, blue, alpha]
+
+    def __push(self, quad, x, y, angle=0.0, flip_h=False, flip_v=False):
+        """
+        遅延描画モードでフレームの描画命令を記録する
+        """
+        src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y, rotated = quad
+        blend = self.__state[0]
+        mod = tuple(self.__state[1:])
+        render_queue.push_quad(self.__texture, self.__w, self.__h, blend, mod, x, y,
+                               src_x, src_y, src_w, src_h, w, h, pivot_x, pivot_y,
+                               angle, bool(flip_h), bool(flip_v), bool(rotated), owner=self)
+
+    def get_texture(self):
+        return self.__texture
+
+    def _get_frame_table(self):
+        return self.__table
+
+    def _get_names(self):
+        if self.__index is not None:
+            return [self.__index.get_name(i) for i in range(len(self.__table))]
+        return [f.filename for f in self.__frames]
+
+    def _get_texture_file(self):
+        return self.__texture_file
 
     def get_index(self, filename):
         """
@@ -580,9 +1111,14 @@ class TextureAtlas:
         Args:
             filename (str): テクスチャの識別名(filename要素)
         
+        Note:
+            コンパイル済みのファイルを読み込んだ場合はハッシュ表で引くので、フレーム数が多くても速い。
+
         Returns:
             int: テクスチャのインデックス。失敗は-1
         """
+        if self.__index is not None:
+            return self.__index.find(filename)
         ret = -1
         i = 0
         for f in self.__frames:
@@ -602,7 +1138,8 @@ class TextureAtlas:
         Returns:
             bool: True:成功 False:失敗
         """
-        res = SDL_SetTextureBlendMode(self.__texture, mode)
+        self.__state[0] = mode
+        res = texture_state.set_blend_mode(self.__texture, mode)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_mode", "TextrueAtlas")
             return False
@@ -618,7 +1155,8 @@ class TextureAtlas:
         Returns:
             bool: True:成功 False:失敗        
         """
-        res = SDL_SetTextureAlphaMod(self.__texture, alpha)
+        self.__state[4] = alpha
+        res = texture_state.set_alpha_mod(self.__texture, alpha)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_alpha", "TextrueAtlas")
             return False
@@ -636,7 +1174,8 @@ class TextureAtlas:
         Returns:
             bool: True:成功 False:失敗
         """
-        res = SDL_SetTextureColorMod(self.__texture, red, green, blue)
+        self.__state[1:4] = [red, green, blue]
+        res = texture_state.set_color_mod(self.__texture, red, green, blue)
         if res < 0:
             log.error_log(SDL_GetError(), "set_blend_color", "TextrueAtlas")
             return False
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+画像ファイルから読み込んだテクスチャを共有するためのキャッシュ
+
+Note:
+    Texture、TextureAtlas、SpriteSheetは画像をこのモジュールを通して読み込むので、
+    同じ画像ファイルを使うものが複数あっても読み込みとVRAMへの転送は1回で済む。
+    テクスチャは参照カウントで管理され、誰も使っていないテクスチャもすぐには開放せずに残しておく。
+    キャッシュ全体のサイズが予算(set_budget())を超えたら、使われていないものを古い順に開放する。
+    同じテクスチャを共有しているので、ブレンドモードやモッドは描画の直前に各オブジェクトが設定し直す。
+"""
+
+import ctypes
+import os
+from collections import OrderedDict
+
+from sdl2 import *
+from sdl2.sdlimage import *
+
+from . import texture_state
+
+DEFAULT_BUDGET = 64 * 1024 * 1024  # 使われていないテクスチャを残しておく上限のデフォルト(バイト)
+
+_budget = DEFAULT_BUDGET
+
+
+class _Entry:
+    """
+    キャッシュされた1枚のテクスチャの情報
+    """
+
+    def __init__(self, key, texture, w, h, size, state):
+        self.key = key  # (レンダラのアドレス, ファイルの絶対パス)
+        self.texture = texture
+        self.w = w
+        self.h = h
+        self.size = size  # テクスチャのバイト数
+        self.state = state  # 読み込んだときの(ブレンドモード, (red, green, blue, alpha))
+        self.refs = 0
+
+
+_entries = {}  # キー -> _Entry
+_by_texture = {}  # テクスチャのアドレス -> _Entry
+_unused = OrderedDict()  # 使われていないテクスチャ(古い順) キー -> _Entry
+_bytes = 0
+
+_hits = 0
+_misses = 0
+_evictions = 0
+
+
+def _address(ptr):
+    return ctypes.cast(ptr, ctypes.c_void_p).value or 0
+
+
+def _texture_size(texture):
+    """
+    テクスチャのサイズとバイト数を求める
+    """
+    fmt = ctypes.c_uint32()
+    w = ctypes.c_int()
+    h = ctypes.c_int()
+    SDL_QueryTexture(texture, ctypes.byref(fmt), None, ctypes.byref(w), ctypes.byref(h))
+    bpp = SDL_BYTESPERPIXEL(fmt.value)
+    if bpp == 0:
+        # YUVなどは1ピクセルのバイト数が決まらないので大きめに見積もる
+        bpp = 4
+    return w.value, h.value, w.value * h.value * bpp
+
+
+def _key(filename, renderer):
+    """
+    キャッシュのキーを求める
+
+    Note:
+        ファイルのないテクスチャ(texture_packerのメモリ上のページなど)はタプルの名前で登録するので、
+        画像ファイルのパスと重なることはない。
+    """
+    if isinstance(filename, tuple):
+        return _address(renderer), filename
+    return _address(renderer), os.path.normcase(os.path.realpath(filename))
+
+
+def acquire(filename, renderer):
+    """
+    画像ファイルのテクスチャを取得する
+
+    Note:
+        キャッシュになければ読み込む。参照カウントが1増えるので、使い終わったらrelease()を呼ぶこと。
+        タプルの名前(add_surface()で登録したもの)はキャッシュになければ失敗する。
+
+    Args:
+        filename (str or tuple): 画像ファイルのパス(utf-8)、またはadd_surface()で登録した名前
+        renderer (SDL_Renderer): テクスチャを作成するレンダラ
+
+    Returns:
+        SDL_Texture: テクスチャ。失敗時はNone(エラーはIMG_GetError()で取得する)
+    """
+    global _bytes, _hits, _misses
+    key = _key(filename, renderer)
+    entry = _entries.get(key)
+    if entry is not None:
+        _hits += 1
+    else:
+        if isinstance(filename, tuple):
+            return None
+        _misses += 1
+        texture = IMG_LoadTexture(renderer, filename.encode("utf-8"))
+        if not texture:
+            return None
+        w, h, size = _texture_size(texture)
+        entry = _Entry(key, texture, w, h, size, texture_state.get_state(texture))
+        _entries[key] = entry
+        _by_texture[_address(texture)] = entry
+        _bytes += size
+
+    if entry.refs == 0:
+        _unused.pop(key, None)
+    entry.refs += 1
+    _evict()
+    return entry.texture
+
+
+def add_surface(filename, renderer, surface):
+    """
+    読み込み済みのSDL_Surfaceからテクスチャを作ってキャッシュに入れる
+
+    Note:
+        loaderが別スレッドで画像を読み込んだあと、メインスレッドで呼ぶ。
+        追加されたテクスチャは使われていない状態なので、acquire()で取得すること。
+        サーフェスは呼び出し側で開放する。
+
+    Args:
+        filename (str or tuple): 画像ファイルのパス(utf-8)。ファイルのないものはタプルの名前
+        renderer (SDL_Renderer): テクスチャを作成するレンダラ
+        surface (SDL_Surface): 画像のサーフェス
+
+    Returns:
+        bool: True:成功 False:失敗(エラーはSDL_GetError()で取得する)
+    """
+    global _bytes
+    key = _key(filename, renderer)
+    if key in _entries:
+        return True
+    texture = SDL_CreateTextureFromSurface(renderer, surface)
+    if not texture:
+        return False
+    w, h, size = _texture_size(texture)
+    entry = _Entry(key, texture, w, h, size, texture_state.get_state(texture))
+    _entries[key] = entry
+    _by_texture[_address(texture)] = entry
+    _unused[key] = entry
+    _bytes += size
+    return True
+
+
+def release(texture):
+    """
+    テクスチャの参照カウントを1減らす
+
+    Note:
+        0になってもすぐには開放せず、予算を超えたときに古いものから開放する。
+
+    Args:
+        texture (SDL_Texture): acquire()で取得したテクスチャ
+
+    Returns:
+        bool: True:キャッシュのテクスチャだった False:キャッシュにないテクスチャだった
+    """
+    entry = _by_texture.get(_address(texture))
+    if entry is None:
+        return False
+    if entry.refs > 0:
+        entry.refs -= 1
+        if entry.refs == 0:
+            _unused[entry.key] = entry
+            _evict()
+    return True
+
+
+def _destroy(entry):
+    global _bytes
+    del _entries[entry.key]
+    del _by_texture[_address(entry.texture)]
+    _unused.pop(entry.key, None)
+    _bytes -= entry.size
+    texture_state.invalidate(entry.texture)
+    SDL_DestroyTexture(entry.texture)
+
+
+def _evict():
+    """
+    予算を超えている間、使われていないテクスチャを古い順に開放する
+    """
+    global _evictions
+    while _bytes > _budget and _unused:
+        key, entry = next(iter(_unused.items()))
+        _destroy(entry)
+        _evictions += 1
+
+
+def get_size(texture):
+    """
+    キャッシュしているテクスチャのサイズを取得する
+
+    Returns:
+        tuple (int, int): (幅, 高さ)。キャッシュにないテクスチャなら(0, 0)
+    """
+    entry = _by_texture.get(_address(texture))
+    if entry is None:
+        return 0, 0
+    return entry.w, entry.h
+
+
+def get_initial_state(texture):
+    """
+    テクスチャを読み込んだときのブレンドモードとモッドを取得する
+
+    Note:
+        テクスチャを共有している他のオブジェクトが状態を変えていても、読み込み直後の値を返す。
+
+    Returns:
+        tuple: (ブレンドモード, (red, green, blue, alpha))。キャッシュにないテクスチャならtexture_stateの値
+    """
+    entry = _by_texture.get(_address(texture))
+    if entry is None:
+        return texture_state.get_state(texture)
+    return entry.state
+
+
+def set_budget(size):
+    """
+    使われていないテクスチャを残しておくキャッシュ全体のサイズの上限を設定する
+
+    Note:
+        0にすると使われなくなったテクスチャはすぐに開放される。
+        使われているテクスチャは上限を超えていても開放されない。
+
+    Args:
+        size (int): バイト数
+    """
+    global _budget
+    _budget = max(0, int(size))
+    _evict()
+
+
+def get_budget():
+    """
+    キャッシュ全体のサイズの上限を取得する
+
+    Returns:
+        int: バイト数
+    """
+    return _budget
+
+
+def get_usage():
+    """
+    キャッシュしているテクスチャの合計のバイト数を取得する
+
+    Returns:
+        int: バイト数
+    """
+    return _bytes
+
+
+def get_stats():
+    """
+    キャッシュの統計を取得する
+
+    Note:
+        textures: キャッシュしているテクスチャの数
+        unused: そのうち使われていないものの数
+        bytes: キャッシュしているテクスチャの合計のバイト数
+        hits: キャッシュから取得できた回数
+        misses: 画像を読み込んだ回数
+        evictions: 予算を超えたので開放した回数
+
+    Returns:
+        dict: 統計の辞書
+    """
+    return {"textures": len(_entries), "unused": len(_unused), "bytes": _bytes,
+            "hits": _hits, "misses": _misses, "evictions": _evictions}
+
+
+def _reset():
+    """
+    テクスチャを開放せずにキャッシュを空にする(quit()から呼ばれる)
+
+    Note:
+        レンダラを破棄するとテクスチャもすべて開放されるので、その前に呼んで開放済みのテクスチャを触らないようにする。
+    """
+    global _bytes
+    _entries.clear()
+    _by_texture.clear()
+    _unused.clear()
+    _bytes = 0
+
+
+def clear():
+    """
+    使われていないテクスチャをすべて開放する
+
+    Note:
+        シーンの切り替えの後などに呼ぶ。
+    """
+    for entry in list(_unused.values()):
+        _destroy(entry)
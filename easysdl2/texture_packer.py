@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+バラバラの画像を実行時に大きなテクスチャ(ページ)にまとめる
+
+Note:
+    SpriteSheet.add_texture()で画像ファイルごとにテクスチャを追加すると、描画のたびにテクスチャが切り替わり、
+    draw_batchや遅延描画モードでもまとめて描画できない。
+    TexturePackerで複数の画像を数枚のページに詰め込み、SpriteSheetを作ると、
+    同じページの画像はSDL_RenderGeometryの1回の呼び出しで描画できる。
+    詰め込みはスカイライン法(下詰め左詰め)で行い、ページの大きさはレンダラの最大テクスチャサイズまでにする。
+    save()で詰め込んだ結果(ページのpngとjson)を保存しておけば、次回からはload()で詰め込みを省略できる。
+    jsonはTexturePackerのJSON(Array)形式と同じなので、ページが1枚ならTextureAtlasでも読み込める。
+
+    例:
+        sheet = texture_packer.pack_files(["a.png", "b.png", "c.png"], "cache/sprites.json")
+        index = sheet.get_index("a.png")
+        sheet.draw(index, 100, 100)
+"""
+
+import ctypes
+import json
+import os
+
+from sdl2 import *
+from sdl2.sdlimage import *
+
+from . import _common as g
+from . import log
+from . import texture_cache
+from .sprite_sheet import SpriteSheet
+from .texture import Rect
+
+DEFAULT_MAX_SIZE = 2048  # ページの最大サイズのデフォルト(ピクセル)
+DEFAULT_PADDING = 1  # 画像の間の隙間のデフォルト(ピクセル)
+FORMAT_VERSION = 1  # 保存するjsonのバージョン
+
+_pack_count = 0  # メモリ上だけのページの名前を一意にするための番号
+
+
+class _Skyline:
+    """
+    1ページ分の詰め込みの状態(スカイライン法)
+
+    Note:
+        詰め込んだ画像の上端を左から順に(x, y, 幅)の線分のリストで持ち、
+        新しい画像はなるべく下、同じ高さなら左に置く。
+    """
+
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+        self.used_w = 0
+        self.used_h = 0
+        self.segments = [[0, 0, w]]
+
+    def __fit(self, i, w, h):
+        """
+        i番目の線分の左端に置いたときのY座標を求める。置けなければ-1
+        """
+        x = self.segments[i][0]
+        if x + w > self.w:
+            return -1
+        y = 0
+        remain = w
+        while remain > 0:
+            sx, sy, sw = self.segments[i]
+            y = max(y, sy)
+            if y + h > self.h:
+                return -1
+            remain -= sw
+            i += 1
+        return y
+
+    def insert(self, w, h):
+        """
+        画像を置く場所を探して置く
+
+        Returns:
+            tuple (int, int): 置いた位置。置けなければNone
+        """
+        best = -1
+        best_x = 0
+        best_y = 0
+        best_bottom = self.h + 1
+        for i in range(len(self.segments)):
+            y = self.__fit(i, w, h)
+            if y >= 0 and y + h < best_bottom:
+                best = i
+                best_x = self.segments[i][0]
+                best_y = y
+                best_bottom = y + h
+        if best < 0:
+            return None
+
+        # 置いた画像の上端を線分として挿入し、隠れた線分を削る
+        segments = self.segments
+        segments.insert(best, [best_x, best_y + h, w])
+        i = best + 1
+        while i < len(segments):
+            seg = segments[i]
+            prev_right = segments[i - 1][0] + segments[i - 1][2]
+            if seg[0] >= prev_right:
+                break
+            shrink = prev_right - seg[0]
+            seg[0] += shrink
+            seg[2] -= shrink
+            if seg[2] > 0:
+                break
+            del segments[i]
+        # 同じ高さの線分をつなげる
+        i = 0
+        while i < len(segments) - 1:
+            if segments[i][1] == segments[i + 1][1]:
+                segments[i][2] += segments[i + 1][2]
+                del segments[i + 1]
+            else:
+                i += 1
+
+        self.used_w = max(self.used_w, best_x + w)
+        self.used_h = max(self.used_h, best_y + h)
+        return best_x, best_y
+
+
+class TexturePacker:
+    """
+    複数の画像を数枚のページに詰め込むクラス
+
+    Note:
+        add_file()、add_surface()で画像を追加し、pack()で詰め込んでから、
+        create_sprite_sheet()でSpriteSheetを作るか、save()で保存する。
+        スプライトのインデックスは追加した順になる。
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, padding=DEFAULT_PADDING):
+        """
+        コンストラクタ
+
+        Args:
+            max_size (int): ページの最大の幅と高さ。レンダラの最大テクスチャサイズの方が小さければそちらを使う
+            padding (int): 画像の間の隙間(拡大縮小したときに隣の画像がにじまないように空ける)
+        """
+        self.__id = 0
+        self.__max_size = int(max_size)
+        self.__padding = max(0, int(padding))
+        self.__images = []  # [名前, SDL_Surface, 元のファイル]
+        self.__frames = []  # [名前, ページ番号, x, y, 幅, 高さ](追加順)
+        self.__pages = []  # ページのSDL_Surface
+        self.__page_files = []  # save()で保存したページのファイル名
+
+    def __del__(self):
+        """
+        デストラクタ
+
+        Note:
+            読み込んだ画像とページのサーフェスを開放する
+        """
+        self.__free_images()
+        self.__free_pages()
+
+    def __free_images(self):
+        for image in self.__images:
+            if image[1]:
+                SDL_FreeSurface(image[1])
+                image[1] = None
+
+    def __free_pages(self):
+        for page in self.__pages:
+            SDL_FreeSurface(page)
+        self.__pages = []
+        self.__page_files = []
+
+    def add_file(self, filename, name=None):
+        """
+        画像ファイルを追加する
+
+        Args:
+            filename (str): 画像ファイルのパス(utf-8)
+            name (str): スプライトの名前。Noneならfilename
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        surface = IMG_Load(filename.encode("utf-8"))
+        if not surface:
+            log.error_log(IMG_GetError(), "add_file", "TexturePacker", filename)
+            return False
+        ret = self.__add(filename if name is None else name, surface, filename)
+        SDL_FreeSurface(surface)
+        return ret
+
+    def add_surface(self, name, surface):
+        """
+        SDL_Surfaceを追加する
+
+        Note:
+            サーフェスはコピーされるので、呼び出し側で開放してよい。
+
+        Args:
+            name (str): スプライトの名前
+            surface (SDL_Surface): 画像のサーフェス
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        return self.__add(name, surface, None)
+
+    def __add(self, name, surface, filename):
+        converted = SDL_ConvertSurfaceFormat(surface, SDL_PIXELFORMAT_ARGB8888, 0)
+        if not converted:
+            log.error_log(SDL_GetError(), "add", "TexturePacker", name)
+            return False
+        # ページにそのままコピーする(アルファブレンドしない)
+        SDL_SetSurfaceBlendMode(converted, SDL_BLENDMODE_NONE)
+        self.__images.append([name, converted, filename])
+        return True
+
+    def get_image_count(self):
+        """
+        追加した画像の数を取得する
+
+        Returns:
+            int: 画像の数
+        """
+        return len(self.__images)
+
+    def __page_size(self):
+        """
+        ページの最大サイズをレンダラの最大テクスチャサイズに合わせて求める
+        """
+        w = h = self.__max_size
+        renderer = g.main_window_renderer
+        if renderer:
+            info = SDL_RendererInfo()
+            if SDL_GetRendererInfo(renderer, ctypes.byref(info)) == 0:
+                if info.max_texture_width > 0:
+                    w = min(w, info.max_texture_width)
+                if info.max_texture_height > 0:
+                    h = min(h, info.max_texture_height)
+        return w, h
+
+    def pack(self):
+        """
+        追加した画像をページに詰め込む
+
+        Note:
+            高さが大きい画像から順に、入るページを先頭から探して置く。どのページにも入らなければページを増やす。
+
+        Returns:
+            bool: True:成功 False:失敗(ページより大きい画像があるなど)
+        """
+        global _pack_count
+        _pack_count += 1
+        self.__id = _pack_count
+        self.__free_pages()
+        self.__frames = []
+        page_w, page_h = self.__page_size()
+        pad = self.__padding
+        order = sorted(range(len(self.__images)),
+                       key=lambda i: (self.__images[i][1].contents.h, self.__images[i][1].contents.w), reverse=True)
+        skylines = []
+        places = [None] * len(self.__images)
+        for i in order:
+            name, surface, filename = self.__images[i]
+            w = surface.contents.w
+            h = surface.contents.h
+            if w > page_w or h > page_h:
+                log.error_log("image is larger than max texture size", "pack", "TexturePacker", name)
+                return False
+            # ページの右端と下端には隙間がいらないので、ページも隙間の分だけ大きいものとして詰める
+            for page, skyline in enumerate(skylines):
+                pos = skyline.insert(w + pad, h + pad)
+                if pos is not None:
+                    break
+            else:
+                skyline = _Skyline(page_w + pad, page_h + pad)
+                skylines.append(skyline)
+                page = len(skylines) - 1
+                pos = skyline.insert(w + pad, h + pad)
+            places[i] = (page, pos[0], pos[1])
+
+        for skyline in skylines:
+            w = max(1, skyline.used_w - pad)
+            h = max(1, skyline.used_h - pad)
+            page = SDL_CreateRGBSurfaceWithFormat(0, w, h, 32, SDL_PIXELFORMAT_ARGB8888)
+            if not page:
+                log.error_log(SDL_GetError(), "pack", "TexturePacker")
+                self.__free_pages()
+                return False
+            SDL_FillRect(page, None, 0)
+            self.__pages.append(page)
+
+        for (name, surface, filename), (page, x, y) in zip(self.__images, places):
+            w = surface.contents.w
+            h = surface.contents.h
+            SDL_BlitSurface(surface, None, self.__pages[page], SDL_Rect(x, y, w, h))
+            self.__frames.append([name, page, x, y, w, h])
+        return True
+
+    def get_page_count(self):
+        """
+        ページの数を取得する
+
+        Returns:
+            int: ページの数。pack()する前は0
+        """
+        return len(self.__pages)
+
+    def get_page_sizes(self):
+        """
+        ページのサイズを取得する
+
+        Returns:
+            list: (幅, 高さ)のリスト
+        """
+        return [(page.contents.w, page.contents.h) for page in self.__pages]
+
+    def get_frames(self):
+        """
+        詰め込んだ画像の位置を取得する
+
+        Returns:
+            list: (名前, ページ番号, x, y, 幅, 高さ)のリスト(追加順)
+        """
+        return [tuple(frame) for frame in self.__frames]
+
+    def save(self, filename):
+        """
+        詰め込んだ結果を保存する
+
+        Note:
+            ページは"jsonファイル名_ページ番号.png"として同じディレクトリに保存する。
+            ファイルから追加した画像は、ファイルのサイズと更新日時も保存し、load()で変更されていないか調べる。
+
+        Args:
+            filename (str): jsonファイルのパス(utf-8)
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if not self.__pages:
+            log.error_log("not packed", "save", "TexturePacker", filename)
+            return False
+        path, fn = os.path.split(filename)
+        base = os.path.splitext(fn)[0]
+        page_files = []
+        for i, page in enumerate(self.__pages):
+            page_file = "{}_{}.png".format(base, i)
+            if IMG_SavePNG(page, os.path.join(path, page_file).encode("utf-8")) < 0:
+                log.error_log(IMG_GetError(), "save", "TexturePacker", page_file)
+                return False
+            page_files.append(page_file)
+
+        sources = []
+        for name, surface, source in self.__images:
+            if source is not None:
+                st = os.stat(source)
+                sources.append({"filename": source, "size": st.st_size, "mtime": st.st_mtime_ns})
+        frames = []
+        for name, page, x, y, w, h in self.__frames:
+            frames.append({"filename": name, "page": page, "frame": {"x": x, "y": y, "w": w, "h": h},
+                           "rotated": False, "pivot": {"x": 0.5, "y": 0.5}})
+        data = {"frames": frames,
+                "meta": {"app": "easysdl2.texture_packer", "version": FORMAT_VERSION,
+                         "image": page_files[0], "pages": page_files, "sources": sources}}
+        try:
+            with open(filename, "w") as fo:
+                json.dump(data, fo)
+        except (IOError, OSError) as e:
+            log.error_log(e, "save", "TexturePacker", filename)
+            return False
+        self.__page_files = [os.path.join(path, page_file) for page_file in page_files]
+        return True
+
+    def create_sprite_sheet(self):
+        """
+        詰め込んだページからSpriteSheetを作る
+
+        Note:
+            ページのテクスチャはtexture_cacheに入れて共有する。
+            save()した後ならページのpngファイル名、そうでなければメモリ上だけの名前
+            (画像ファイルのパスと重ならない("packer", id, ページ番号)のタプル)で登録する。
+
+        Returns:
+            SpriteSheet: スプライトシート。失敗時はNone
+        """
+        if not self.__pages:
+            log.error_log("not packed", "create_sprite_sheet", "TexturePacker")
+            return None
+        sheet = SpriteSheet()
+        for i, page in enumerate(self.__pages):
+            if self.__page_files:
+                name = self.__page_files[i]
+            else:
+                name = ("packer", self.__id, i)
+            if not texture_cache.add_surface(name, g.main_window_renderer, page):
+                log.error_log(SDL_GetError(), "create_sprite_sheet", "TexturePacker")
+                return None
+            sheet.add_texture(name)
+        for name, page, x, y, w, h in self.__frames:
+            sheet.add_sprite(name, page, Rect(x, y, w, h))
+        return sheet
+
+
+def _is_valid(data, path):
+    """
+    保存した結果の元になった画像ファイルが変更されていないか調べる
+    """
+    meta = data["meta"]
+    if meta.get("app") != "easysdl2.texture_packer" or meta.get("version") != FORMAT_VERSION:
+        return False
+    for page_file in meta["pages"]:
+        if not os.path.isfile(os.path.join(path, page_file)):
+            return False
+    for source in meta["sources"]:
+        try:
+            st = os.stat(source["filename"])
+        except OSError:
+            return False
+        if st.st_size != source["size"] or st.st_mtime_ns != source["mtime"]:
+            return False
+    return True
+
+
+def load(filename, check_sources=True):
+    """
+    save()で保存した結果からSpriteSheetを作る
+
+    Args:
+        filename (str): jsonファイルのパス(utf-8)
+        check_sources (bool): 元の画像ファイルが変更されていたら失敗にするか
+
+    Returns:
+        SpriteSheet: スプライトシート。ファイルがない、古いなどで使えなければNone
+    """
+    try:
+        with open(filename) as fi:
+            data = json.load(fi)
+    except (IOError, OSError, ValueError):
+        return None
+    path, fn = os.path.split(filename)
+    try:
+        if check_sources and not _is_valid(data, path):
+            return None
+        sheet = SpriteSheet()
+        for page_file in data["meta"]["pages"]:
+            sheet.add_texture(os.path.join(path, page_file))
+        for frm in data["frames"]:
+            rect = frm["frame"]
+            sheet.add_sprite(str(frm["filename"]), int(frm["page"]),
+                             Rect(int(rect["x"]), int(rect["y"]), int(rect["w"]), int(rect["h"])))
+    except (KeyError, TypeError, ValueError):
+        log.error_log("Invalid json file", "load", "texture_packer", filename)
+        return None
+    return sheet
+
+
+def pack_files(filenames, cache_file=None, max_size=DEFAULT_MAX_SIZE, padding=DEFAULT_PADDING):
+    """
+    画像ファイルを詰め込んでSpriteSheetを作る
+
+    Note:
+        cache_fileを指定すると、前回保存した結果が使えればそれを読み込み、使えなければ詰め込んで保存する。
+        スプライトの名前は画像ファイルのパス、インデックスはfilenamesの順になる。
+
+    Args:
+        filenames (list): 画像ファイルのパス(utf-8)のリスト
+        cache_file (str): 結果を保存するjsonファイルのパス。Noneなら保存しない
+        max_size (int): ページの最大の幅と高さ
+        padding (int): 画像の間の隙間
+
+    Returns:
+        SpriteSheet: スプライトシート。失敗時はNone
+    """
+    filenames = list(filenames)
+    if cache_file is not None:
+        sheet = load(cache_file)
+        if sheet is not None and [sheet.get_index(fn) for fn in filenames] == list(range(len(filenames))):
+            return sheet
+
+    packer = TexturePacker(max_size, padding)
+    for filename in filenames:
+        if not packer.add_file(filename):
+            return None
+    if not packer.pack():
+        return None
+    if cache_file is not None:
+        packer.save(cache_file)
+    return packer.create_sprite_sheet()
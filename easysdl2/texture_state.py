@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+テクスチャのブレンドモード、アルファモッド、カラーモッドを覚えておき、
+値が変わらないときはSDLの関数を呼ばないようにする
+
+Note:
+    easysdl2のクラスはこのモジュールを通してテクスチャの状態を設定する。
+    SDL_SetTextureBlendModeなどを直接呼んだ場合はinvalidate()を呼ぶこと。
+"""
+
+import ctypes
+
+from sdl2 import *
+
+# テクスチャのアドレスをキーにして[ブレンドモード, red, green, blue, alpha]を保存する。Noneは不明
+_states = {}
+
+_calls = 0  # 実際にSDLを呼んだ回数
+_elided = 0  # 値が同じだったので省略した回数
+
+
+def _key(texture):
+    return ctypes.cast(texture, ctypes.c_void_p).value or 0
+
+
+def _state(texture):
+    key = _key(texture)
+    state = _states.get(key)
+    if state is None:
+        state = _states[key] = [None, None, None, None, None]
+    return state
+
+
+def set_blend_mode(texture, mode):
+    """
+    テクスチャのブレンドモードを設定する
+
+    Args:
+        texture (SDL_Texture): テクスチャ
+        mode (SDL_BlendMode): ブレンドモード
+
+    Returns:
+        int: SDL_SetTextureBlendModeの戻り値。省略した場合は0
+    """
+    global _calls, _elided
+    state = _state(texture)
+    if state[0] == mode:
+        _elided += 1
+        return 0
+    _calls += 1
+    res = SDL_SetTextureBlendMode(texture, mode)
+    state[0] = mode if res == 0 else None
+    return res
+
+
+def set_color_mod(texture, red, green, blue):
+    """
+    テクスチャのカラーモッドを設定する
+
+    Returns:
+        int: SDL_SetTextureColorModの戻り値。省略した場合は0
+    """
+    global _calls, _elided
+    state = _state(texture)
+    if state[1] == red and state[2] == green and state[3] == blue:
+        _elided += 1
+        return 0
+    _calls += 1
+    res = SDL_SetTextureColorMod(texture, red, green, blue)
+    if res == 0:
+        state[1], state[2], state[3] = red, green, blue
+    else:
+        state[1] = state[2] = state[3] = None
+    return res
+
+
+def set_alpha_mod(texture, alpha):
+    """
+    テクスチャのアルファモッドを設定する
+
+    Returns:
+        int: SDL_SetTextureAlphaModの戻り値。省略した場合は0
+    """
+    global _calls, _elided
+    state = _state(texture)
+    if state[4] == alpha:
+        _elided += 1
+        return 0
+    _calls += 1
+    res = SDL_SetTextureAlphaMod(texture, alpha)
+    state[4] = alpha if res == 0 else None
+    return res
+
+
+def set_all(texture, mode, red, green, blue, alpha):
+    """
+    ブレンドモード、カラーモッド、アルファモッドをまとめて設定する
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    ret = set_blend_mode(texture, mode) == 0
+    ret = set_color_mod(texture, red, green, blue) == 0 and ret
+    ret = set_alpha_mod(texture, alpha) == 0 and ret
+    return ret
+
+
+def apply(texture, state):
+    """
+    ブレンドモードとモッドが[ブレンドモード, red, green, blue, alpha]のとおりになるようにする
+
+    Note:
+        テクスチャを共有しているオブジェクトが描画の直前に呼ぶ。
+        全部同じ値なら比較1回で終わる。
+
+    Args:
+        texture (SDL_Texture): テクスチャ
+        state (list): [ブレンドモード, red, green, blue, alpha]
+
+    Returns:
+        bool: True:成功 False:失敗
+    """
+    global _elided
+    if _states.get(_key(texture)) == state:
+        _elided += 1
+        return True
+    return set_all(texture, *state)
+
+
+def get_state(texture):
+    """
+    テクスチャのブレンドモードとモッドを取得する
+
+    Note:
+        覚えていない値だけSDLから取得する。
+
+    Returns:
+        tuple: (ブレンドモード, (red, green, blue, alpha))
+    """
+    state = _state(texture)
+    if state[0] is None:
+        mode = SDL_BlendMode()
+        SDL_GetTextureBlendMode(texture, ctypes.byref(mode))
+        state[0] = mode.value
+    if state[1] is None or state[2] is None or state[3] is None:
+        r = ctypes.c_uint8()
+        g = ctypes.c_uint8()
+        b = ctypes.c_uint8()
+        SDL_GetTextureColorMod(texture, ctypes.byref(r), ctypes.byref(g), ctypes.byref(b))
+        state[1], state[2], state[3] = r.value, g.value, b.value
+    if state[4] is None:
+        a = ctypes.c_uint8()
+        SDL_GetTextureAlphaMod(texture, ctypes.byref(a))
+        state[4] = a.value
+    return state[0], (state[1], state[2], state[3], state[4])
+
+
+def invalidate(texture=None):
+    """
+    覚えている状態を捨てる
+
+    Note:
+        テクスチャを開放したときや、SDLの関数で直接状態を変えたときに呼ぶ。
+
+    Args:
+        texture (SDL_Texture): 対象のテクスチャ。Noneなら全部
+    """
+    if texture is None:
+        _states.clear()
+    else:
+        _states.pop(_key(texture), None)
+
+
+def get_call_count():
+    """
+    SDLの関数を実際に呼んだ回数を取得する
+
+    Returns:
+        int: 回数
+    """
+    return _calls
+
+
+def get_elided_count():
+    """
+    値が変わらなかったので省略したSDLの関数の呼び出し回数を取得する
+
+    Returns:
+        int: 回数
+    """
+    return _elided
+
+
+def reset_counts():
+    """
+    呼び出し回数と省略回数を0に戻す
+    """
+    global _calls, _elided
+    _calls = 0
+    _elided = 0
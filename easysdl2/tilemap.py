@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""
+タイルマップを扱うクラスを定義します。
+"""
+
+import ctypes
+from array import array
+from collections import OrderedDict
+
+from sdl2 import *
+
+from . import _common as g
+from . import log
+from . import render_queue
+from .layer import Layer
+
+DEFAULT_CHUNK_SIZE = 16  # 1チャンクのタイル数(縦横)
+DEFAULT_MAX_CHUNKS = 64  # テクスチャに焼いておくチャンクの最大数
+
+
+class TileMap:
+    """
+    TextureAtlasかSpriteSheetのフレームを並べたタイルマップ
+
+    Note:
+        タイル番号はarray('i')に格納する。-1は空のタイル。
+        マップはchunk_size x chunk_sizeタイルのチャンクに分けられ、
+        チャンクは初めて表示されたときに描画先テクスチャ(Layer)に焼かれる。
+        draw()では画面に入るチャンクだけをコピーするので、マップが大きくても描画はチャンク数回で済む。
+        タイルを書き換えるとそのチャンクだけが焼き直される。
+        焼いたチャンクはmax_chunks個まで残し、それを超えたら長く表示されていないものから捨てる。
+        タイルはフレームのpivotを考慮してマス目の左上に合わせて描画される。
+        Pipelineのワーカーからdraw()を呼んだときは、チャンクの作成と焼き直しはメインスレッドに頼み、
+        新しく表示されるチャンクは焼けた次のフレームから表示される。
+    """
+
+    def __init__(self, tileset, map_w, map_h, tile_w, tile_h, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_chunks=DEFAULT_MAX_CHUNKS):
+        """
+        コンストラクタ
+
+        Args:
+            tileset (TextureAtlas or SpriteSheet): タイルの画像
+            map_w (int): マップの横のタイル数
+            map_h (int): マップの縦のタイル数
+            tile_w (int): タイルの幅(ピクセル)
+            tile_h (int): タイルの高さ(ピクセル)
+            chunk_size (int): 1チャンクの縦横のタイル数
+            max_chunks (int): テクスチャに焼いておくチャンクの最大数
+        """
+        self.__tileset = tileset
+        self.__map_w = int(map_w)
+        self.__map_h = int(map_h)
+        self.__tile_w = int(tile_w)
+        self.__tile_h = int(tile_h)
+        self.__chunk_size = int(chunk_size)
+        self.__max_chunks = max(1, int(max_chunks))
+        self.__tiles = array("i", [-1]) * (self.__map_w * self.__map_h)
+        self.__chunks = OrderedDict()  # (cx, cy) -> Layer (最近表示した順)
+        self.__empty = set()  # タイルが1つもないチャンク
+        self.__pending = set()  # メインスレッドで焼くのを待っているチャンク(Pipelineのワーカーから描画したとき)
+        self.__drawn = set()  # 直前のdraw()で描画したチャンク
+        self.__baked = 0  # 前回のdraw()の後に焼いたチャンクの数
+        self.__stats = {"visible": 0, "baked": 0, "cached": 0}
+        self.__output_w = ctypes.c_int()
+        self.__output_h = ctypes.c_int()
+
+    def get_size(self):
+        """
+        マップのタイル数を取得する
+
+        Returns:
+            tuple (int, int): (横のタイル数, 縦のタイル数)
+        """
+        return self.__map_w, self.__map_h
+
+    def get_pixel_size(self):
+        """
+        マップ全体のピクセル数を取得する
+
+        Returns:
+            tuple (int, int): (幅, 高さ)
+        """
+        return self.__map_w * self.__tile_w, self.__map_h * self.__tile_h
+
+    def get_tile(self, tx, ty):
+        """
+        タイル番号を取得する
+
+        Args:
+            tx (int): タイルのX座標
+            ty (int): タイルのY座標
+
+        Returns:
+            int: タイル番号。空またはマップ外は-1
+        """
+        if tx < 0 or ty < 0 or tx >= self.__map_w or ty >= self.__map_h:
+            return -1
+        return self.__tiles[ty * self.__map_w + tx]
+
+    def set_tile(self, tx, ty, index):
+        """
+        タイル番号を設定する
+
+        Note:
+            タイルを含むチャンクだけが焼き直される。
+
+        Args:
+            tx (int): タイルのX座標
+            ty (int): タイルのY座標
+            index (int): タイル番号(TextureAtlas、SpriteSheetのインデックス)。-1で空にする
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        if tx < 0 or ty < 0 or tx >= self.__map_w or ty >= self.__map_h:
+            log.error_log("out of range", "set_tile", "TileMap")
+            return False
+        i = ty * self.__map_w + tx
+        if self.__tiles[i] == index:
+            return True
+        self.__tiles[i] = index
+        self.__invalidate_chunk(tx // self.__chunk_size, ty // self.__chunk_size)
+        return True
+
+    def set_tiles(self, tiles):
+        """
+        マップ全体のタイル番号をまとめて設定する
+
+        Args:
+            tiles (list): タイル番号の2次元リスト(tiles[y][x])、またはmap_w * map_hの1次元の配列
+
+        Returns:
+            bool: True:成功 False:失敗
+        """
+        flat = array("i")
+        for row in tiles:
+            if hasattr(row, "__len__"):
+                flat.extend(int(t) for t in row)
+            else:
+                flat.append(int(row))
+        if len(flat) != len(self.__tiles):
+            log.error_log("size mismatch", "set_tiles", "TileMap")
+            return False
+        self.__tiles = flat
+        self.invalidate()
+        return True
+
+    def get_tiles(self):
+        """
+        タイル番号の配列を取得する
+
+        Note:
+            直接書き換えた場合はinvalidate()を呼ぶこと。
+
+        Returns:
+            array: map_w * map_hの1次元配列(tiles[y * map_w + x])
+        """
+        return self.__tiles
+
+    def invalidate(self):
+        """
+        すべてのチャンクを焼き直すようにする
+        """
+        self.__chunks.clear()
+        self.__empty.clear()
+        self.__pending.clear()
+
+    def __invalidate_chunk(self, cx, cy):
+        key = (cx, cy)
+        self.__empty.discard(key)
+        layer = self.__chunks.get(key)
+        if layer is not None:
+            layer.mark_dirty()
+
+    def __bake(self, cx, cy):
+        """
+        チャンクのタイルを描画する(Layerの描画関数から呼ばれる)
+        """
+        table = self.__tileset._get_frame_table()
+        n = len(table)
+        size = self.__chunk_size
+        tw = self.__tile_w
+        th = self.__tile_h
+        tx0 = cx * size
+        ty0 = cy * size
+        tiles = self.__tiles
+        indices = []
+        xs = []
+        ys = []
+        for ty in range(ty0, min(ty0 + size, self.__map_h)):
+            row = ty * self.__map_w
+            for tx in range(tx0, min(tx0 + size, self.__map_w)):
+                index = tiles[row + tx]
+                if index < 0 or index >= n:
+                    continue
+                fd = table[index]
+                indices.append(index)
+                xs.append((tx - tx0) * tw + fd.offset_x)
+                ys.append((ty - ty0) * th + fd.offset_y)
+        self.__baked += 1
+        if indices:
+            self.__tileset.draw_batch(indices, xs, ys)
+
+    def __is_empty(self, cx, cy):
+        size = self.__chunk_size
+        tiles = self.__tiles
+        for ty in range(cy * size, min(cy * size + size, self.__map_h)):
+            row = ty * self.__map_w
+            start = row + cx * size
+            end = row + min(cx * size + size, self.__map_w)
+            if max(tiles[start:end]) >= 0:
+                return False
+        return True
+
+    def __get_chunk(self, cx, cy, worker=False, keep=()):
+        key = (cx, cy)
+        layer = self.__chunks.get(key)
+        if layer is not None:
+            self.__chunks.move_to_end(key)
+            if worker and layer.is_dirty():
+                self.__request_bake(key)
+            return layer
+        if key in self.__empty:
+            return None
+        if self.__is_empty(cx, cy):
+            self.__empty.add(key)
+            return None
+        if worker:
+            # テクスチャの作成はメインスレッドでしかできない
+            self.__request_bake(key)
+            return None
+        bake = lambda l: self.__bake(cx, cy)
+        oldest = next(iter(self.__chunks), None)
+        if len(self.__chunks) >= self.__max_chunks and oldest not in keep:
+            # 一番長く表示されていないチャンクのテクスチャを使い回す
+            # (keepのチャンクはこのフレームで表示するので使い回さない)
+            old_key, layer = self.__chunks.popitem(last=False)
+            layer.set_draw_func(bake)
+        else:
+            size = self.__chunk_size
+            layer = Layer(size * self.__tile_w, size * self.__tile_h, bake)
+        self.__chunks[key] = layer
+        return layer
+
+    def __request_bake(self, key):
+        """
+        チャンクの作成と焼き直しをメインスレッドに頼む
+        """
+        if not self.__pending:
+            g.pipeline_tasks.append(self.__bake_pending)
+        self.__pending.add(key)
+
+    def __bake_pending(self):
+        """
+        ワーカーから頼まれたチャンクを焼く(メインスレッドで呼ばれる)
+        """
+        pending = self.__pending
+        self.__pending = set()
+        # ワーカーが描画を記録したチャンクと、これから焼くチャンクのテクスチャは使い回さない
+        keep = self.__drawn | pending
+        for cx, cy in pending:
+            layer = self.__get_chunk(cx, cy, keep=keep)
+            if layer is not None and layer.is_dirty():
+                layer.refresh()
+
+    def draw(self, camera_x, camera_y, x=0, y=0, view_w=0, view_h=0):
+        """
+        タイルマップを描画する
+
+        Note:
+            マップ上の(camera_x, camera_y)が画面の(x, y)に来るように描画する。
+            view_w, view_hで指定した範囲に入るチャンクだけを描画する。
+            カメラ(camera.set_camera())を使っているときは、座標はワールド座標になり、
+            カメラの表示範囲に入るチャンクだけを描画する(view_w, view_hは使わない)。
+            例えばtilemap.draw(0, 0)でマップの左上がワールドの(0, 0)に来る。
+
+        Args:
+            camera_x (int): 表示範囲の左上のマップ上のX座標(ピクセル)
+            camera_y (int): 表示範囲の左上のマップ上のY座標(ピクセル)
+            x (int): 描画先のX座標
+            y (int): 描画先のY座標
+            view_w (int): 表示範囲の幅。0なら描画先の幅
+            view_h (int): 表示範囲の高さ。0なら描画先の高さ
+        """
+        worker = render_queue._off_main_thread()
+        if self.__pending and not worker:
+            # Pipelineが終わって焼かれずに残ったチャンク
+            self.__bake_pending()
+        if g.camera is not None:
+            left, top, right, bottom = g.camera.get_world_rect()
+            view_x = int(left - x + camera_x) - 1
+            view_y = int(top - y + camera_y) - 1
+            view_w = int(right - left) + 2
+            view_h = int(bottom - top) + 2
+        else:
+            view_x = int(camera_x)
+            view_y = int(camera_y)
+        if view_w <= 0 or view_h <= 0:
+            SDL_GetRendererOutputSize(g.current_renderer, ctypes.byref(self.__output_w),
+                                      ctypes.byref(self.__output_h))
+            if view_w <= 0:
+                view_w = self.__output_w.value - x
+            if view_h <= 0:
+                view_h = self.__output_h.value - y
+
+        camera_x = int(camera_x)
+        camera_y = int(camera_y)
+        chunk_w = self.__chunk_size * self.__tile_w
+        chunk_h = self.__chunk_size * self.__tile_h
+        num_cx = (self.__map_w + self.__chunk_size - 1) // self.__chunk_size
+        num_cy = (self.__map_h + self.__chunk_size - 1) // self.__chunk_size
+        cx0 = max(0, view_x // chunk_w)
+        cy0 = max(0, view_y // chunk_h)
+        cx1 = min(num_cx - 1, (view_x + view_w - 1) // chunk_w)
+        cy1 = min(num_cy - 1, (view_y + view_h - 1) // chunk_h)
+
+        stats = self.__stats
+        stats["visible"] = 0
+        drawn = self.__drawn
+        drawn.clear()
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                layer = self.__get_chunk(cx, cy, worker)
+                if layer is None:
+                    continue
+                if worker:
+                    # 焼き直しはこのフレームの描画の前にメインスレッドで行われる
+                    layer.get_texture().draw(x + cx * chunk_w - camera_x, y + cy * chunk_h - camera_y)
+                    drawn.add((cx, cy))
+                else:
+                    layer.draw(x + cx * chunk_w - camera_x, y + cy * chunk_h - camera_y)
+                stats["visible"] += 1
+        # ワーカーから描画したときは、前回のdraw()の後にメインスレッドで焼いた数になる
+        stats["baked"] = self.__baked
+        self.__baked = 0
+        stats["cached"] = len(self.__chunks)
+
+    def get_stats(self):
+        """
+        直前のdraw()の統計を取得する
+
+        Note:
+            visible: 描画したチャンクの数
+            baked: 焼き直したチャンクの数
+            cached: テクスチャに焼いてあるチャンクの数
+
+        Returns:
+            dict: 統計の辞書
+        """
+        return dict(self.__stats)
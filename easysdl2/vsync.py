@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+垂直同期(VSync)を使った表示とフレームレートの調整
+
+Note:
+    create_window(vsync=True)かenable()で垂直同期を要求すると、SDL_RENDERER_PRESENTVSYNCでレンダラを作る
+    (作った後ならSDL_RenderSetVSyncで切り替える)。
+    垂直同期が効いているときはSDL_RenderPresentが次の垂直帰線まで待つので、
+    fps.wait()はビジーループで待たずにフレーム時間の記録だけを行う
+    (fps.wait()に渡したfpsがリフレッシュレートより低いときは、そのfpsまで待つ)。
+
+    垂直同期が使えない(ソフトウェアレンダラなど)か、描画が間に合わずに垂直帰線を逃すフレームが続くときは、
+    垂直同期を切ってfps.wait()で待つ方式に戻る。そのときの目標のfpsは、
+    最近のフレームの処理時間が収まるリフレッシュレートの整数分の1(60Hzなら60、30、20...)にする。
+    処理が軽くなったらまた垂直同期に戻す。
+
+    SDL_RenderPresentで待った時間(present)と、それ以外の処理の時間(work)はget_stats()で別々に取得できる。
+"""
+
+import ctypes
+import math
+
+from sdl2 import *
+
+from . import _common as g
+from . import log
+
+DEFAULT_REFRESH_RATE = 60  # リフレッシュレートが分からないときの値
+_WINDOW = 60  # 垂直帰線を逃したかの判定に使うフレーム数
+_MISS_RATIO = 0.1  # _WINDOWのうちこれ以上逃したら垂直同期をやめる
+_RECOVER_RATIO = 0.8  # 処理時間が1フレームのこの割合以下に収まるようになったら垂直同期に戻す
+
+_requested = False  # 垂直同期を要求されているか
+_supported = False  # レンダラが垂直同期に対応しているか
+_fallback = False  # 間に合わないので垂直同期を切っているか
+_refresh_rate = 0
+_target_fps = 0  # 垂直同期を使わないときにfps.wait()で待つ目標(0ならfps.wait()の引数のまま)
+
+_pf = 0
+_prev_present_end = 0
+_waited = 0  # 前回の表示からfps.wait()で待った時間(カウンタの値)
+_frames = 0  # 以下は今の判定区間の集計
+_missed = 0
+_busy_total = 0  # present以外の処理の時間の合計(カウンタの値)
+# 平均(ミリ秒)
+_present_ms = 0.0
+_work_ms = 0.0
+_wait_ms = 0.0
+_missed_total = 0
+
+
+def enable(flag=True):
+    """
+    垂直同期を要求する
+
+    Note:
+        ウィンドウを作った後でも切り替えられる(SDL 2.0.18以降)。
+        ヘッドレスモードでは使えない。
+
+    Args:
+        flag (bool): True:使う False:使わない
+
+    Returns:
+        bool: True:垂直同期が効いている False:効いていない
+    """
+    global _requested, _fallback, _target_fps
+    _requested = bool(flag) and not g.headless
+    _fallback = False
+    _target_fps = 0
+    if g.main_window_renderer:
+        _set_renderer_vsync(_requested)
+        _update_state()
+    return is_active()
+
+
+def is_enabled():
+    """
+    垂直同期を要求しているか調べる
+
+    Returns:
+        bool: True:要求している False:していない
+    """
+    return _requested
+
+
+def is_active():
+    """
+    垂直同期で表示のタイミングを合わせているか調べる
+
+    Returns:
+        bool: True:垂直同期が効いている False:fps.wait()で待っている
+    """
+    return _requested and _supported and not _fallback
+
+
+def get_refresh_rate():
+    """
+    メインウィンドウのディスプレイのリフレッシュレートを取得する
+
+    Returns:
+        int: リフレッシュレート(Hz)。分からなければDEFAULT_REFRESH_RATE
+    """
+    return _refresh_rate or _query_refresh_rate() or DEFAULT_REFRESH_RATE
+
+
+def get_target_fps():
+    """
+    垂直同期を使えないときにfps.wait()で待つ目標のfpsを取得する
+
+    Returns:
+        int: fps。0ならfps.wait()の引数のまま
+    """
+    return _target_fps
+
+
+def get_stats():
+    """
+    表示の統計を取得する
+
+    Note:
+        present、work、waitは最近のフレームの平均(ミリ秒)。
+        presentはSDL_RenderPresentの時間(垂直同期ならほとんどが垂直帰線を待った時間)、
+        waitはfps.wait()で待った時間、workは表示の間のそれ以外の時間。
+
+    Returns:
+        dict: requested, supported, active, fallback, refresh_rate, target_fps, present, work, wait, missed_frames
+    """
+    return {
+        "requested": _requested,
+        "supported": _supported,
+        "active": is_active(),
+        "fallback": _fallback,
+        "refresh_rate": get_refresh_rate(),
+        "target_fps": _target_fps,
+        "present": _present_ms,
+        "work": _work_ms,
+        "wait": _wait_ms,
+        "missed_frames": _missed_total,
+    }
+
+
+def _on_create_renderer(renderer, requested):
+    """
+    レンダラを作った後に呼ばれる(create_window用)
+
+    Args:
+        renderer (SDL_Renderer): 作ったレンダラ
+        requested (bool): SDL_RENDERER_PRESENTVSYNCを指定したか
+    """
+    global _requested, _fallback, _target_fps, _refresh_rate, _pf, _prev_present_end
+    _requested = requested and not g.headless
+    _fallback = False
+    _target_fps = 0
+    _refresh_rate = _query_refresh_rate()
+    _pf = SDL_GetPerformanceFrequency()
+    _prev_present_end = SDL_GetPerformanceCounter()
+    _update_state()
+
+
+def _query_refresh_rate():
+    if not g.main_window:
+        return 0
+    mode = SDL_DisplayMode()
+    index = SDL_GetWindowDisplayIndex(g.main_window)
+    if index < 0 or SDL_GetCurrentDisplayMode(index, ctypes.byref(mode)) != 0:
+        return 0
+    return mode.refresh_rate
+
+
+def _update_state():
+    global _supported
+    info = SDL_RendererInfo()
+    if SDL_GetRendererInfo(g.main_window_renderer, ctypes.byref(info)) != 0:
+        _supported = False
+        return
+    _supported = bool(info.flags & SDL_RENDERER_PRESENTVSYNC)
+    if _requested and not _supported and not _fallback:
+        # 垂直同期が使えないのでリフレッシュレートを目標にfps.wait()で待つ
+        log.write("vsync is not supported by the renderer. fps.wait() paces frames instead.")
+
+
+def _set_renderer_vsync(flag):
+    try:
+        return SDL_RenderSetVSync(g.main_window_renderer, 1 if flag else 0) == 0
+    except (AttributeError, NameError):  # SDL 2.0.18未満
+        return False
+
+
+def _software_fps(fps):
+    """
+    fps.wait()で待つ目標のfpsを返す(fps.wait()から呼ばれる)
+
+    Args:
+        fps (int): fps.wait()の引数
+
+    Returns:
+        int: 待つ目標のfps。0なら待たない(垂直同期に任せる)
+    """
+    if not _requested:
+        return fps
+    refresh_rate = get_refresh_rate()
+    if is_active():
+        # リフレッシュレート以上は垂直同期で決まるので待たない
+        return 0 if fps <= 0 or fps >= refresh_rate * 0.95 else fps
+    target = _target_fps or refresh_rate
+    return target if fps <= 0 else min(fps, target)
+
+
+def _waited_ticks(ticks):
+    """
+    fps.wait()で待った時間を記録する(fps.wait()から呼ばれる)
+    """
+    global _waited
+    _waited += ticks
+
+
+def _present(renderer):
+    """
+    時間を計りながら表示する(update_screen()から呼ばれる)
+    """
+    global _prev_present_end, _waited, _frames, _missed, _busy_total
+    global _present_ms, _work_ms, _wait_ms, _missed_total
+    start = SDL_GetPerformanceCounter()
+    SDL_RenderPresent(renderer)
+    end = SDL_GetPerformanceCounter()
+    if not _pf:
+        _prev_present_end = end
+        return
+    interval = end - _prev_present_end
+    work = max(0, start - _prev_present_end - _waited)
+    to_ms = 1000.0 / _pf
+    rate = 0.1
+    _present_ms += rate * ((end - start) * to_ms - _present_ms)
+    _work_ms += rate * (work * to_ms - _work_ms)
+    _wait_ms += rate * (_waited * to_ms - _wait_ms)
+    _prev_present_end = end
+    _waited = 0
+
+    if not _requested or not _supported:
+        return
+    refresh_ticks = _pf / get_refresh_rate()
+    _frames += 1
+    _busy_total += work
+    if is_active() and interval > refresh_ticks * 1.5:
+        _missed += 1
+        _missed_total += 1
+    if _frames >= _WINDOW:
+        _adapt(refresh_ticks)
+        _frames = _missed = _busy_total = 0
+
+
+def _adapt(refresh_ticks):
+    """
+    最近のフレームの結果から垂直同期を使うかと目標のfpsを決める
+    """
+    global _fallback, _target_fps
+    busy = _busy_total / _frames
+    if not _fallback:
+        if _missed >= _WINDOW * _MISS_RATIO:
+            _fallback = True
+            _set_renderer_vsync(False)
+            _target_fps = _fit_fps(busy, refresh_ticks)
+    elif busy <= refresh_ticks * _RECOVER_RATIO:
+        _fallback = False
+        _target_fps = 0
+        _set_renderer_vsync(True)
+    else:
+        _target_fps = _fit_fps(busy, refresh_ticks)
+
+
+def _fit_fps(busy, refresh_ticks):
+    """
+    処理時間が収まるリフレッシュレートの整数分の1のfpsを返す
+    """
+    divisor = max(1, int(math.ceil(busy / refresh_ticks)))
+    return max(1, int(round(get_refresh_rate() / float(divisor))))
@@ -0,0 +1,40 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from sdl2 import *
+import easysdl2 as esdl
+
+WIDTH = 640
+HEIGHT = 480
+NUM = 3000
+
+esdl.init()
+esdl.create_window(width=WIDTH, height=HEIGHT)
+
+ta = esdl.TextureAtlas("./images/sprite.json")
+# "ship00", "ship01"の連番からclips["ship"]ができる
+clips = esdl.animation.clips_from_atlas(ta, 0.2)
+blink = esdl.animation.AnimationClip.from_names(ta, ["ship00", "ship01", "ship00"], [0.5, 0.05, 0.05])
+
+animator = esdl.animation.Animator()
+for i in range(NUM):
+    animator.add(clips["ship"] if i % 2 else blink, time=random.random(), speed=random.uniform(0.5, 2.0))
+xs = [random.uniform(0, WIDTH) for i in range(NUM)]
+ys = [random.uniform(0, HEIGHT) for i in range(NUM)]
+
+while esdl.process_events():
+    if esdl.check_key(SDLK_ESCAPE):
+        break
+    # 全部のアニメーションを1回で進める
+    animator.update()
+    esdl.clear_screen()
+    animator.draw(ta, xs, ys, 0.3, 0.3)
+    esdl.update_screen()
+    esdl.fps.wait()
+esdl.quit()
@@ -0,0 +1,69 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import asyncio
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 16)
+received = [0]
+
+
+# 画面の中を動き回るスプライト(毎フレーム再開される)
+async def sprite(y):
+    x = 0.0
+    while True:
+        dt = await async_loop.next_frame()
+        x = (x + 200 * dt) % WIDTH
+        tex.draw_ex(x, y, 0.3, 0.3, x)
+
+
+# エコーサーバーとクライアント(描画と同時に通信する)
+async def echo(reader, writer):
+    while True:
+        data = await reader.read(4096)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+
+
+async def client(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while True:
+        writer.write(b"x" * 1024)
+        await writer.drain()
+        received[0] += len(await reader.readexactly(1024))
+
+
+def update(dt):
+    if check_key(SDLK_ESCAPE):
+        return False
+    stats = async_loop.get_stats()
+    font.draw(0, 0, "FPS: {0:.1f} slack: {1:.2f}ms received: {2}KB".format(
+        fps.get_fps(), stats["slack"], received[0] // 1024))
+
+
+async def main():
+    server = await asyncio.start_server(echo, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    for i in range(10):
+        asyncio.ensure_future(sprite(40 + i * 40))
+    asyncio.ensure_future(client(port))
+    await async_loop.run(update, max_fps=60)
+    server.close()
+    print(async_loop.get_stats())
+
+
+asyncio.run(main())
+quit()
@@ -0,0 +1,48 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import tempfile
+import time
+from sdl2 import *
+import easysdl2 as esdl
+
+esdl.init()
+esdl.create_window()
+
+# jsonが更新されたときだけコンパイルする(images/sprite.atlasができる)
+atlas_file = esdl.atlas_compiler.compile_file("./images/sprite.json")
+
+start = time.perf_counter()
+ta_json = esdl.TextureAtlas("./images/sprite.json")
+print("json: {:.3f}ms".format((time.perf_counter() - start) * 1000))
+start = time.perf_counter()
+ta = esdl.TextureAtlas(atlas_file)
+print("compiled: {:.3f}ms".format((time.perf_counter() - start) * 1000))
+
+# スプライトシートもコンパイルできる
+ss = esdl.SpriteSheet()
+tex = ss.add_texture("images/test.png")
+ss.add_sprite("sprite1", tex, esdl.Rect(0, 0, 20, 20))
+ss.add_sprite("sprite2", tex, esdl.Rect(20, 0, 20, 20))
+sheet_file = os.path.join(tempfile.gettempdir(), "easysdl2_sheet.bin")
+esdl.atlas_compiler.compile_sprite_sheet(ss, sheet_file)
+ss2 = esdl.SpriteSheet()
+ss2.load(sheet_file)
+
+index = ta.get_index("ship01")
+sprite = ss2.get_index("sprite2")
+
+while esdl.process_events():
+    if esdl.check_key(SDLK_ESCAPE):
+        break
+    esdl.clear_screen()
+    ta.draw(index, 200, 200)
+    ss2.draw(sprite, 400, 200)
+    esdl.update_screen()
+    esdl.fps.wait()
+esdl.quit()
@@ -0,0 +1,26 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import tempfile
+import easysdl2 as esdl
+from easysdl2 import benchmark
+
+# 短いベンチマークを2回実行し、1回目をベースラインにして比べる
+names = ["texture_draw", "atlas_draw_batch", "draw_fill_rects", "process_events_flood"]
+baseline_file = os.path.join(tempfile.gettempdir(), "easysdl2_benchmark_baseline.json")
+
+baseline = benchmark.run(names, frames=30, warmup=5, progress=lambda name, res: print(benchmark.format_result(name, res)))
+benchmark.save(baseline, baseline_file)
+print("saved:", baseline_file)
+
+results = benchmark.run(names, frames=30, warmup=5)
+for name in names:
+    print(benchmark.format_result(name, results["scenarios"][name], baseline["scenarios"][name]))
+for name, metric, base, current in benchmark.compare(results, benchmark.load(baseline_file), threshold=0.5):
+    print("REGRESSION", name, metric, base, current)
+esdl.quit()
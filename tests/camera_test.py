@@ -0,0 +1,63 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+WORLD_W = 4000
+WORLD_H = 4000
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 16)
+
+# ワールド全体に散らばったスプライト(画面外のものは描画されない)
+xs = [random.uniform(0, WORLD_W) for i in range(5000)]
+ys = [random.uniform(0, WORLD_H) for i in range(5000)]
+
+cam = Camera()
+cam.set_bounds(0, 0, WORLD_W, WORLD_H)
+camera.set_camera(cam)
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    if check_key(SDLK_LEFT):
+        cam.move(-10, 0)
+    if check_key(SDLK_RIGHT):
+        cam.move(10, 0)
+    if check_key(SDLK_UP):
+        cam.move(0, -10)
+    if check_key(SDLK_DOWN):
+        cam.move(0, 10)
+    if check_key(SDLK_z):
+        cam.set_zoom(cam.get_zoom() * 1.02)
+    if check_key(SDLK_x):
+        cam.set_zoom(cam.get_zoom() / 1.02)
+
+    clear_screen()
+    tex.draw_batch(xs, ys, 0.2, 0.2)
+    # 画面の中央に並べたスプライト(全部画面内なのでカリングされない)
+    cx, cy = cam.to_world(WIDTH / 2, HEIGHT / 2)
+    near_xs = [cx + dx for dx in (-40, 0, 40)]
+    near_ys = [cy + dy for dy in (-40, 0, 40)]
+    visible_ok = tex.draw_batch(near_xs, near_ys, 0.3, 0.3)
+    # マウスの位置をワールド座標に変換して描画する
+    mx, my = cam.to_world(*get_mouse_position())
+    tex.draw_center(mx, my)
+    # HUDは画面座標で描画する
+    with camera.use(None):
+        stats = camera.get_stats()
+        font.draw(10, 10, "culled:{} submitted:{}".format(stats["culled"], stats["submitted"]))
+        font.draw(10, 30, "all visible batch: {}".format("OK" if visible_ok else "FAILED"))
+    update_screen()
+    fps.wait()
+quit()
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import numpy as np
+from easysdl2 import *
+from sdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+# numpy配列はコピーせずにそのまま描画される(float32ならSDL_RenderDrawPointsFなど)
+star_points = np.random.randint(0, WIDTH, (100000, 2)).astype(np.int32)
+star_points[:, 1] %= HEIGHT
+wave = np.empty((WIDTH, 2), dtype=np.float32)
+wave[:, 0] = np.arange(WIDTH)
+boxes = np.random.randint(0, 400, (1000, 4)).astype(np.int32)
+boxes[:, 2:] = 8
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+
+    clear_screen()
+
+    draw.color(64, 64, 64)
+    draw.points(star_points)
+    draw.color(0, 0, 255)
+    draw.rects(boxes)
+    wave[:, 1] = 450 + 20 * np.sin(wave[:, 0] / 40 + SDL_GetTicks() / 300)
+    draw.color(0, 255, 0)
+    draw.lines(wave)
+    update_screen()
+
+    fps.wait()
+quit()
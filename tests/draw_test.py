@@ -49,4 +49,7 @@ while process_events():
     update_screen()
 
     SDL_Delay(1)
+
+# 描画する数が変わらなければ配列は最初のフレームで確保したものを使い回す
+print(draw.get_buffer_stats())
 quit()
@@ -86,7 +86,16 @@ while process_events():
 
     font.draw(0, 0, "Actor: {0:3d}".format(len(actors)), (255, 0, 0), Font.SHADED)
     font.draw(0, 30, "FPS: {0:3.2f}".format(fps.get_fps()), (255, 0, 0), Font.SHADED)
+    stats = fps.get_stats()
+    font.draw(0, 60, "p99: {0:.2f}ms max: {1:.2f}ms jitter: {2:.2f}ms over: {3}".format(
+        stats["p99"], stats["max"], stats["jitter"], stats["over_budget"]), (255, 0, 0), Font.SHADED)
+    limiter = fps.get_limiter_stats()
+    font.draw(0, 90, "wait: {0:.2f}ms spin: {1:.2f}ms cpu: {2:.0%} margin: {3:.2f}ms".format(
+        limiter["wait"], limiter["spin"], limiter["cpu_ratio"], limiter["margin"]), (255, 0, 0), Font.SHADED)
 
     fps.wait()
     update_screen()
+print(fps.get_stats())
+print(fps.get_histogram())
+print(fps.get_limiter_stats())
 quit()
@@ -0,0 +1,38 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+import tempfile
+import time
+import easysdl2 as esdl
+
+WIDTH = 320
+HEIGHT = 240
+
+# ディスプレイがなくても動く(ウィンドウは表示されない)
+esdl.init(headless=True)
+esdl.create_window(width=WIDTH, height=HEIGHT)
+tex = esdl.Texture("./images/test.png")
+
+random.seed(0)
+xs = [random.uniform(0, WIDTH) for i in range(1000)]
+ys = [random.uniform(0, HEIGHT) for i in range(1000)]
+
+start = time.perf_counter()
+for frame in range(100):
+    esdl.clear_screen()
+    tex.draw_batch(xs, ys, 0.2, 0.2, frame * 3.0)
+    esdl.update_screen()
+print("{:.3f}ms/frame".format((time.perf_counter() - start) * 10))
+
+pixels = esdl.read_pixels()
+print("pixels:", pixels.shape if hasattr(pixels, "shape") else len(pixels))
+filename = os.path.join(tempfile.gettempdir(), "easysdl2_headless.png")
+esdl.save_screen(filename)
+print("saved:", filename)
+esdl.quit()
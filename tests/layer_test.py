@@ -0,0 +1,53 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+
+stars = [(random.uniform(0, WIDTH), random.uniform(0, HEIGHT), random.uniform(0.05, 0.2)) for i in range(500)]
+
+
+def draw_background(layer):
+    # 500個の描画はdirtyなときだけ行われる
+    for x, y, ex in stars:
+        tex.draw_ex(x, y, ex, ex)
+
+
+def draw_hud(layer):
+    # 10Hzで描き直す
+    draw.color(255, 255, 255)
+    draw.rect(10, 10, 200, 20)
+    draw.fill_rect(10, 10, int(fps.get_fps() * 200 / 60), 20)
+
+
+background = Layer(WIDTH, HEIGHT, draw_background)
+hud = Layer(WIDTH, 40, draw_hud, refresh_rate=10)
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    if check_key(SDLK_SPACE):
+        # 背景を変えたらdirtyにする
+        stars = [(random.uniform(0, WIDTH), random.uniform(0, HEIGHT), random.uniform(0.05, 0.2)) for i in range(500)]
+        background.mark_dirty()
+
+    clear_screen()
+    background.draw(0, 0)
+    x, y = get_mouse_position()
+    tex.draw_center(x, y)
+    hud.draw(0, 0)
+    update_screen()
+    fps.wait()
+quit()
@@ -0,0 +1,36 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+from easysdl2 import *
+
+init()
+create_window()
+
+# 読み込み中もウィンドウは反応する
+handles = [loader.load_texture("./images/test.png"),
+           loader.load_texture_atlas("./images/sprite.json"),
+           loader.load_sprite_sheet(["./images/test.png", "./images/sprite.png"])]
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+
+    clear_screen()
+    if loader.is_busy():
+        # ロード画面(進捗バー)
+        done, total = loader.get_progress()
+        draw.color(255, 255, 255)
+        draw.rect(120, 220, 400, 40)
+        draw.fill_rect(120, 220, 400 * done // max(total, 1), 40)
+    else:
+        texture, atlas, sheet = [h.get() for h in handles]
+        texture.draw(0, 0)
+        atlas.draw(0, 320, 240)
+    update_screen()
+    fps.wait()
+quit()
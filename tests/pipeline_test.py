@@ -0,0 +1,49 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import math
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+NUM = 2000
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 16)
+
+xs = [random.uniform(0, WIDTH) for i in range(NUM)]
+ys = [random.uniform(0, HEIGHT) for i in range(NUM)]
+angles = [random.uniform(0, 360) for i in range(NUM)]
+frame = [0]
+
+
+# ワーカースレッド: 更新と描画命令の記録だけを行う
+def update(dt):
+    if check_key(SDLK_ESCAPE):
+        return False
+    frame[0] += 1
+    for i in range(NUM):
+        angles[i] += 2
+        ys[i] = (ys[i] + math.sin(math.radians(angles[i]))) % HEIGHT
+    tex.draw_batch(xs, ys, 0.2, 0.2, angles)
+
+
+# メインスレッド: 文字の描画(テクスチャを作る)はこちらで行う
+def main():
+    stats = p.get_stats()
+    font.draw(0, 0, "FPS: {0:.1f} update: {1:.2f}ms replay: {2:.2f}ms sync: {3:.2f}ms overlap: {4:.0%}".format(
+        fps.get_fps(), stats["update"], stats["replay"], stats["sync"], stats["overlap"]))
+
+
+p = pipeline.Pipeline(update, main, max_fps=60)
+p.run()
+print(p.get_stats())
+quit()
@@ -0,0 +1,50 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 12)
+
+xs = [random.uniform(0, WIDTH) for i in range(500)]
+ys = [random.uniform(0, HEIGHT) for i in range(500)]
+
+# Pキーで計測のオンオフを切り替える
+profiler.enable()
+prev_p = False
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    p = check_key(SDLK_p)
+    if p and not prev_p:
+        profiler.enable(not profiler.is_enabled())
+    prev_p = p
+
+    with profiler.phase("update"):
+        for i in range(len(xs)):
+            xs[i] = (xs[i] + 1) % WIDTH
+
+    clear_screen()
+    with profiler.phase("draw"):
+        for x, y in zip(xs, ys):
+            tex.draw_ex(x, y, 0.3, 0.3, x)
+        draw.color(255, 0, 0)
+        draw.rect(10, 100, 100, 100)
+
+    profiler.draw_overlay(0, 0, font, 240)
+    update_screen()
+    fps.wait(60)
+
+print(profiler.get_average())
+quit()
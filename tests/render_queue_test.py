@@ -0,0 +1,45 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+ta = TextureAtlas("./images/sprite.json")
+render_queue.enable()
+
+positions = [(random.uniform(0, WIDTH), random.uniform(0, HEIGHT)) for i in range(1000)]
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+
+    clear_screen()
+
+    # テクスチャが交互になるように描画しても、同じレイヤー内ではまとめて描画される
+    render_queue.set_layer(0)
+    for i, (x, y) in enumerate(positions):
+        if i % 2:
+            tex.draw_ex(x, y, 0.2, 0.2, i)
+        else:
+            ta.draw(i % 3, x, y)
+
+    # 上に重ねるものはレイヤーを分ける
+    render_queue.set_layer(1)
+    draw.color(255, 0, 0)
+    draw.rect(10, 10, 200, 40)
+
+    fps.wait()
+    update_screen()
+    print(render_queue.get_stats(), end="\r")
+quit()
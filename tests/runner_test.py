@@ -0,0 +1,46 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import time
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 16)
+
+# 更新は30回/秒、描画はできるだけ多く(補間して滑らかに動く)
+# スペースキーを押している間は描画を重くする(更新の回数は変わらない)
+ball = {"x": 0.0, "y": 200.0, "prev_x": 0.0, "vx": 300.0}
+
+
+def update(dt):
+    if check_key(SDLK_ESCAPE):
+        runner.stop()
+    ball["prev_x"] = ball["x"]
+    ball["x"] += ball["vx"] * dt
+    if ball["x"] < 0 or ball["x"] > WIDTH:
+        ball["vx"] *= -1
+
+
+def render(alpha):
+    if check_key(SDLK_SPACE):
+        time.sleep(0.05)
+    x = ball["prev_x"] + (ball["x"] - ball["prev_x"]) * alpha
+    tex.draw_center(x, ball["y"])
+    stats = runner.get_current().get_stats()
+    font.draw(0, 0, "ticks/s: {0:.1f} renders/s: {1:.1f} skipped: {2} dropped: {3}".format(
+        stats["ticks_per_sec"], stats["renders_per_sec"], stats["skipped_renders"], stats["dropped_ticks"]))
+
+
+result = runner.run(update, render, tick_rate=30, max_fps=240)
+print(result.get_stats())
+quit()
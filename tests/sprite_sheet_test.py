@@ -60,6 +60,7 @@ while esdl.process_events():
     esdl.draw.line(0, 240, 640, 240)
     ss.draw(index, 320, 240)
     ss.draw_ex(index, 320, 240, ex_x, ex_y, angle, flip_h, flip_v)
+    ss.draw_batch([index1, index2, index3], [80, 120, 160], [400, 400, 400], ex_x, ex_y, angle, flip_h, flip_v)
     esdl.fps.wait(60)
     esdl.update_screen()
 esdl.quit()
@@ -54,6 +54,7 @@ while esdl.process_events():
     esdl.draw.line(0, 240, 640, 240)
     ta.draw(index, 320, 240)
     ta.draw_ex(index, 320, 240, ex_x, ex_y, angle, flip_h, flip_v)
+    ta.draw_batch([0, 1, 2], [80, 120, 160], [400, 400, 400], ex_x, ex_y, angle, flip_h, flip_v)
     esdl.fps.wait(60)
     esdl.update_screen()
 esdl.quit()
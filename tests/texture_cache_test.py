@@ -0,0 +1,32 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+from easysdl2 import *
+
+init()
+create_window()
+
+# 同じ画像のテクスチャは1枚だけ読み込まれて共有される
+textures = [Texture("./images/test.png") for i in range(10)]
+for i, t in enumerate(textures):
+    t.set_blend(SDL_BLENDMODE_BLEND, 255, 255 - i * 25, 255, 255 - i * 20)
+print(texture_cache.get_stats())
+
+# SPACEキーで全部開放して読み込み直す(予算内ならキャッシュから取得される)
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    if check_key(SDLK_SPACE):
+        textures = [Texture("./images/test.png") for i in range(10)]
+        print(texture_cache.get_stats())
+
+    clear_screen()
+    for i, t in enumerate(textures):
+        t.draw(i * 40, i * 30)
+    update_screen()
+quit()
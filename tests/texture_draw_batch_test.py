@@ -0,0 +1,52 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import numpy as np
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+MAX_ACTORS = 20000
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+act_tex = Texture("./images/test.png")
+act_tex.set_blend_alpha(32)
+act_tex.set_blend_mode(SDL_BLENDMODE_ADD)
+
+# Actorの状態を配列で持つ
+x = np.random.uniform(0, WIDTH, MAX_ACTORS)
+y = np.random.uniform(0, HEIGHT, MAX_ACTORS)
+vx = np.random.uniform(-5, 5, MAX_ACTORS)
+vy = np.random.uniform(-5, 5, MAX_ACTORS)
+angle = np.ones(MAX_ACTORS)
+count = 0
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+
+    if count < MAX_ACTORS:
+        count += 100
+
+    x += vx
+    y += vy
+    vx[(x < 0) | (x > WIDTH)] *= -1
+    vy[(y < 0) | (y > HEIGHT)] *= -1
+    np.clip(x, 0, WIDTH, out=x)
+    np.clip(y, 0, HEIGHT, out=y)
+    angle += 1
+    exrate = 1 + np.fabs(np.cos(np.radians(angle)) * 2)
+
+    clear_screen()
+    act_tex.draw_batch(x[:count], y[:count], exrate[:count], exrate[:count], angle[:count])
+
+    fps.wait()
+    update_screen()
+    print("Actor: {0:5d} FPS: {1:3.2f}".format(count, fps.get_fps()), end="\r")
+quit()
@@ -0,0 +1,51 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+import tempfile
+from sdl2 import *
+import easysdl2 as esdl
+
+WIDTH = 640
+HEIGHT = 480
+
+esdl.init()
+esdl.create_window(width=WIDTH, height=HEIGHT)
+
+# 2回目以降の起動では保存したページを読み込むだけになる
+files = ["images/test.png", "images/sprite.png"]
+cache_file = os.path.join(tempfile.gettempdir(), "easysdl2_packed.json")
+sheet = esdl.texture_packer.pack_files(files, cache_file)
+
+# サーフェスから作った画像も同じページに詰め込める
+packer = esdl.texture_packer.TexturePacker(max_size=512)
+for i in range(50):
+    surface = SDL_CreateRGBSurfaceWithFormat(0, random.randint(8, 48), random.randint(8, 48), 32,
+                                             SDL_PIXELFORMAT_ARGB8888)
+    SDL_FillRect(surface, None, 0xff000000 | random.randrange(0x1000000))
+    packer.add_surface("box{}".format(i), surface)
+    SDL_FreeSurface(surface)
+packer.pack()
+print("pages:", packer.get_page_sizes())
+boxes = packer.create_sprite_sheet()
+
+indices = [random.randrange(50) for i in range(500)]
+xs = [random.uniform(0, WIDTH) for i in range(500)]
+ys = [random.uniform(0, HEIGHT) for i in range(500)]
+
+while esdl.process_events():
+    if esdl.check_key(SDLK_ESCAPE):
+        break
+    esdl.clear_screen()
+    # 1ページにまとまっているのでSDL_RenderGeometry1回で描画される
+    boxes.draw_batch(indices, xs, ys)
+    sheet.draw(sheet.get_index("images/test.png"), 200, 200)
+    sheet.draw(sheet.get_index("images/sprite.png"), 400, 200)
+    esdl.update_screen()
+    esdl.fps.wait()
+esdl.quit()
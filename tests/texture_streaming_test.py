@@ -0,0 +1,38 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import numpy as np
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+
+# 書き換え可能なテクスチャ(ARGB8888)
+texture = Texture(w=WIDTH // 2, h=HEIGHT // 2)
+yy, xx = np.mgrid[0:HEIGHT // 2, 0:WIDTH // 2]
+t = 0
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+
+    # 毎フレームピクセルを直接書き換える(コピーしない)
+    with texture.lock() as (pixels, pitch):
+        r = ((np.sin(xx * 0.05 + t) + 1) * 127).astype(np.uint32)
+        b = ((np.cos(yy * 0.05 + t) + 1) * 127).astype(np.uint32)
+        pixels[:] = 0xFF000000 | (r << 16) | b
+    t += 0.1
+
+    clear_screen()
+    texture.draw_ex(WIDTH // 2, HEIGHT // 2, 2.0, 2.0)
+    update_screen()
+    fps.wait()
+quit()
@@ -0,0 +1,45 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import random
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+TILE = 32
+
+init()
+create_window(width=WIDTH, height=HEIGHT)
+atlas = TextureAtlas("./images/sprite.json")
+
+# 256x256タイルのマップ
+tilemap = TileMap(atlas, 256, 256, TILE, TILE)
+tilemap.set_tiles([[random.randrange(-1, 3) for x in range(256)] for y in range(256)])
+map_w, map_h = tilemap.get_pixel_size()
+camera_x = 0
+camera_y = 0
+
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    if check_key(SDLK_LEFT): camera_x = max(0, camera_x - 8)
+    if check_key(SDLK_RIGHT): camera_x = min(map_w - WIDTH, camera_x + 8)
+    if check_key(SDLK_UP): camera_y = max(0, camera_y - 8)
+    if check_key(SDLK_DOWN): camera_y = min(map_h - HEIGHT, camera_y + 8)
+
+    # クリックしたタイルを書き換える(そのチャンクだけ焼き直される)
+    if check_mouse_button(SDL_BUTTON_LEFT):
+        mx, my = get_mouse_position()
+        tilemap.set_tile((mx + camera_x) // TILE, (my + camera_y) // TILE, 0)
+
+    clear_screen()
+    tilemap.draw(camera_x, camera_y)
+    update_screen()
+    fps.wait()
+print(tilemap.get_stats())
+quit()
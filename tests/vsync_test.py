@@ -0,0 +1,45 @@
+# coding: utf-8
+
+import os
+import sys
+
+path = os.path.join(os.path.dirname(__file__), '../')
+sys.path.append(path)
+
+import time
+from easysdl2 import *
+
+WIDTH = 640
+HEIGHT = 480
+
+init()
+create_window(width=WIDTH, height=HEIGHT, vsync=True)
+tex = Texture("./images/test.png")
+font = Font("./fonts/VL-Gothic-Regular.ttf", 16)
+
+# Vキーで垂直同期を切り替える、スペースキーを押している間は処理を重くする
+x = 0
+prev_v = False
+while process_events():
+    if check_key(SDLK_ESCAPE):
+        break
+    v = check_key(SDLK_v)
+    if v and not prev_v:
+        vsync.enable(not vsync.is_enabled())
+    prev_v = v
+    if check_key(SDLK_SPACE):
+        time.sleep(0.025)
+
+    x = (x + 4) % WIDTH
+    clear_screen()
+    tex.draw_center(x, HEIGHT / 2)
+    stats = vsync.get_stats()
+    font.draw(0, 0, "refresh: {0}Hz vsync: {1} fallback: {2} target: {3}".format(
+        stats["refresh_rate"], stats["active"], stats["fallback"], stats["target_fps"]))
+    font.draw(0, 20, "work: {0:.2f}ms present: {1:.2f}ms wait: {2:.2f}ms missed: {3}".format(
+        stats["work"], stats["present"], stats["wait"], stats["missed_frames"]))
+    font.draw(0, 40, "FPS: {0:.1f}".format(fps.get_fps()))
+    update_screen()
+    fps.wait(60)
+print(vsync.get_stats())
+quit()